@@ -45,6 +45,18 @@ def test(c):
     c.run("pytest -n auto", pty=True)
 
 
+@task(iterable=["repos", "jobs"])
+def bench(c, repos=None, jobs=None, output="benchmark.json"):
+    print("Running benchmarks")
+    cmd = "python -m tsrc.test.benchmark"
+    if repos:
+        cmd += " --repos " + " ".join(repos)
+    if jobs:
+        cmd += " --jobs " + " ".join(jobs)
+    cmd += f" --output {output}"
+    c.run(cmd, pty=True)
+
+
 @task(
     pre=[
         call(black, check=True),
@@ -10,9 +10,11 @@ from typing import List, Optional
 
 import cli_ui as ui
 
+from tsrc.daemon_client import get_daemon_repos
 from tsrc.errors import Error
+from tsrc.executor import get_executor_backend
 from tsrc.groups_and_constraints_data import GroupsAndConstraints
-from tsrc.manifest import Manifest
+from tsrc.manifest import Manifest, RepoNotFound
 from tsrc.manifest_common_data import ManifestsTypeOfData
 from tsrc.repo import Repo
 from tsrc.workspace import Workspace
@@ -41,6 +43,13 @@ def add_num_jobs_arg(parser: argparse.ArgumentParser) -> None:
     )
 
 
+# Number of jobs used by default with the asyncio executor: jobs
+# mostly wait for git servers there, rather than for the CPUs.
+# Note: jobs talking to the same server are also limited by the
+# `host_limits` setting of the workspace (see tsrc.host_limits)
+ASYNCIO_AUTO_JOBS = 128
+
+
 def get_num_jobs(args: argparse.Namespace) -> int:
     from_command_line = args.num_jobs
     from_env = os.environ.get("TSRC_PARALLEL_JOBS")
@@ -49,6 +58,8 @@ def get_num_jobs(args: argparse.Namespace) -> int:
     else:
         value = from_env
     if value in [None, "auto"]:
+        if get_executor_backend() == "asyncio":
+            return max(ASYNCIO_AUTO_JOBS, cpu_count())
         return cpu_count()
     try:
         return int(value)
@@ -176,17 +187,34 @@ def resolve_repos(
     do_switch: bool = False,
     ignore_if_group_not_found: bool = False,
     ignore_group_item: bool = False,
+    manifest: Optional[Manifest] = None,
 ) -> List[Repo]:
     """
     Given a workspace with its config and its local manifest,
     and a collection of parsed command  line arguments,
     return the list of repositories to operate on.
+
+    `manifest` can be given when the local manifest was already loaded.
+    Otherwise, the selection is done by `tsrc daemon` when one is running
+    for the workspace (see tsrc.daemon), unless an option it does not
+    know about is used.
     """
+    if not manifest:
+        manifest = load_workspace_manifest(workspace, ignore_group_item)
+        ignore = ignore_if_group_not_found or ignore_group_item
+        if not (singular_remote or do_switch or ignore):
+            from_daemon = repos_from_daemon(
+                workspace,
+                manifest,
+                groups=groups,
+                all_cloned=all_cloned,
+                include_regex=include_regex,
+                exclude_regex=exclude_regex,
+            )
+            if from_daemon is not None:
+                return from_daemon
+
     # Handle --all-cloned and --groups
-    if ignore_group_item is True:
-        manifest = workspace.get_manifest_safe_mode(ManifestsTypeOfData.LOCAL)
-    else:
-        manifest = workspace.get_manifest()
     repos = []
 
     if groups:
@@ -203,6 +231,21 @@ def resolve_repos(
             manifest, workspace.config, silent=ignore_if_group_not_found
         )
 
+    return filter_repos(
+        repos,
+        singular_remote=singular_remote,
+        include_regex=include_regex,
+        exclude_regex=exclude_regex,
+    )
+
+
+def filter_repos(
+    repos: List[Repo],
+    *,
+    singular_remote: str,
+    include_regex: str,
+    exclude_regex: str,
+) -> List[Repo]:
     if singular_remote:
         filtered_repos = []
         for repo in repos:
@@ -221,11 +264,59 @@ def resolve_repos(
     if exclude_regex:
         repos = [repo for repo in repos if not re.search(exclude_regex, repo.dest)]
 
-    # At this point, nothing was requested on the command line, time to
-    # use the workspace configuration:
     return repos
 
 
+def repos_from_daemon(
+    workspace: Workspace,
+    manifest: Manifest,
+    *,
+    groups: Optional[List[str]],
+    all_cloned: bool,
+    include_regex: str,
+    exclude_regex: str,
+) -> Optional[List[Repo]]:
+    """
+    Ask the daemon of the workspace which repos to operate on.
+    Return None if no daemon is running, if it could not select
+    the repos, or if its manifest is not the same as `manifest`.
+    """
+    dests = get_daemon_repos(
+        workspace.root_path,
+        groups=groups,
+        all_cloned=all_cloned,
+        include_regex=include_regex,
+        exclude_regex=exclude_regex,
+    )
+    if dests is None:
+        return None
+    try:
+        res = [manifest.get_repo(x) for x in dests]
+    except RepoNotFound:
+        return None
+    if not groups and not all_cloned:
+        # Note: the daemon did use the workspace configuration
+        report_config_groups(workspace.config)
+    return res
+
+
+def report_config_groups(workspace_config: WorkspaceConfig) -> None:
+    if workspace_config.clone_all_repos or not workspace_config.repo_groups:
+        return
+    # fmt: off
+    ui.info(
+        ui.green, "*", ui.reset, "Using groups from workspace config:",
+        ", ".join(workspace_config.repo_groups),
+    )
+    # fmt: on
+
+
+def load_workspace_manifest(workspace: Workspace, ignore_group_item: bool) -> Manifest:
+    if ignore_group_item is True:
+        return workspace.get_manifest_safe_mode(ManifestsTypeOfData.LOCAL)
+    return workspace.get_manifest()
+
+
 def resolve_repos_without_workspace(
     manifest: Manifest,
     gac: GroupsAndConstraints,
@@ -330,13 +421,8 @@ def repos_from_config(
         return manifest.get_repos(all_=True)
     if repo_groups:
         # workspace config contains some groups, use that,
-        # fmt: off
         if silent is False:
-            ui.info(
-                ui.green, "*", ui.reset, "Using groups from workspace config:",
-                ", ".join(repo_groups),
-            )
-        # fmt: on
+            report_config_groups(workspace_config)
         return manifest.get_repos(groups=repo_groups, ignore_if_group_not_found=silent)
     else:
         # workspace config does not specify clone_all_repos nor
@@ -0,0 +1,41 @@
+""" Entry point for `tsrc daemon`. """
+
+import argparse
+
+import cli_ui as ui
+
+from tsrc.cli import add_num_jobs_arg, add_workspace_arg, get_num_jobs, get_workspace
+from tsrc.daemon import Daemon
+from tsrc.daemon_client import DaemonClient
+
+
+def configure_parser(subparser: argparse._SubParsersAction) -> None:
+    parser = subparser.add_parser(
+        "daemon",
+        description="Keep the manifest and the status of the repositories of the workspace in memory, and serve them to other tsrc commands over a Unix socket, until stopped.",  # noqa: E501
+    )
+    add_workspace_arg(parser)
+    add_num_jobs_arg(parser)
+    parser.add_argument(
+        "--stop",
+        action="store_true",
+        help="stop the daemon running for the workspace",
+        dest="stop",
+    )
+    parser.set_defaults(run=run)
+
+
+def run(args: argparse.Namespace) -> None:
+    workspace = get_workspace(args)
+    if args.stop:
+        client = DaemonClient.connect(workspace.root_path)
+        if client and client.stop():
+            ui.info_2("Daemon stopped")
+        else:
+            ui.info_2("No daemon running")
+        return
+    daemon = Daemon(workspace.root_path, num_jobs=get_num_jobs(args))
+    try:
+        daemon.serve()
+    except KeyboardInterrupt:
+        pass
@@ -101,7 +101,12 @@ def run(args: argparse.Namespace) -> None:
         if m_repos[0] and m_repos[0] in repos:
             repos.remove(m_repos[0])
     ui.info_1(f"Running `{description}` on {len(repos)} repos")
-    collection = process_items(repos, cmd_runner, num_jobs=num_jobs)
+    collection = process_items(
+        repos,
+        cmd_runner,
+        num_jobs=num_jobs,
+        durations=workspace.get_durations("foreach"),
+    )
     errors = collection.errors
     if errors:
         ui.error(f"Command failed for {len(errors)} repo(s)")
@@ -1,6 +1,7 @@
 """ Entry point for `tsrc init`. """
 
 import argparse
+import re
 from pathlib import Path
 
 import cli_ui as ui
@@ -13,7 +14,10 @@ from tsrc.cli import (
     repos_from_config,
 )
 from tsrc.errors import Error
+from tsrc.journal import Journal
 from tsrc.local_manifest import LocalManifest
+from tsrc.manifest import CLONE_FILTER_RE
+from tsrc.state_db import StateDB
 from tsrc.workspace import Workspace
 from tsrc.workspace_config import WorkspaceConfig
 
@@ -33,6 +37,16 @@ def configure_parser(subparser: argparse._SubParsersAction) -> None:
         help="use shallow clones",
         dest="shallow_clones",
     )
+    parser.add_argument(
+        "--clone-filter",
+        help="use partial clones, with this filter (for instance 'blob:none' or 'tree:0')",  # noqa: E501
+        dest="clone_filter",
+    )
+    parser.add_argument(
+        "--object-cache",
+        help="share git objects with other workspaces, using mirrors stored in this directory (for instance '~/.cache/tsrc/objects')",  # noqa: E501
+        dest="object_cache",
+    )
     parser.add_argument(
         "-r",
         "--singular-remote",
@@ -56,7 +70,30 @@ def run(args: argparse.Namespace) -> None:
     cfg_path = workspace_path / ".tsrc" / "config.yml"
 
     if cfg_path.exists():
-        raise Error(f"Workspace already configured. `{cfg_path}` already exists")
+        if not Journal.is_unfinished(StateDB.for_workspace(workspace_path), "init"):
+            raise Error(f"Workspace already configured. `{cfg_path}` already exists")
+        check_resumable(args, WorkspaceConfig.from_file(cfg_path))
+        ui.info_1("Resuming initialization of workspace in", ui.bold, workspace_path)
+    else:
+        configure(args, workspace_path)
+
+    workspace = Workspace(workspace_path)
+    manifest = workspace.get_manifest()
+    workspace.repos = repos_from_config(manifest, workspace.config)
+    workspace.start_journal("init", resume=True)
+    workspace.clone_missing(num_jobs=num_jobs)
+    workspace.set_remotes(num_jobs=num_jobs)
+    workspace.perform_filesystem_operations()
+    workspace.finish_journal()
+    ui.info_2("Workspace initialized")
+    ui.info_2("Configuration written in", ui.bold, workspace.cfg_path)
+
+
+def configure(args: argparse.Namespace, workspace_path: Path) -> None:
+    """Clone the manifest, and write the workspace configuration"""
+    clone_filter = args.clone_filter
+    if clone_filter and not re.match(CLONE_FILTER_RE, clone_filter):
+        raise Error(f"Invalid clone filter: '{clone_filter}'")
 
     ui.info_1("Configuring workspace in", ui.bold, workspace_path)
 
@@ -72,15 +109,40 @@ def run(args: argparse.Namespace) -> None:
         clone_all_repos=args.clone_all_repos,
         repo_groups=args.groups or [],
         shallow_clones=args.shallow_clones,
+        clone_filter=clone_filter,
+        object_cache=args.object_cache,
         singular_remote=args.singular_remote,
     )
-    workspace_config.save_to_file(cfg_path)
+    # Note: the initialization is recorded as unfinished before the
+    # configuration is written, so that running `tsrc init` again
+    # resumes it if it is interrupted
+    state_db = StateDB.for_workspace(workspace_path)
+    state_db.start_journal("init")
+    state_db.close()
+    workspace_config.save_to_file(cfg_path=workspace_path / ".tsrc" / "config.yml")
 
-    workspace = Workspace(workspace_path)
-    manifest = workspace.get_manifest()
-    workspace.repos = repos_from_config(manifest, workspace_config)
-    workspace.clone_missing(num_jobs=num_jobs)
-    workspace.set_remotes(num_jobs=num_jobs)
-    workspace.perform_filesystem_operations()
-    ui.info_2("Workspace initialized")
-    ui.info_2("Configuration written in", ui.bold, workspace.cfg_path)
+
+def check_resumable(
+    args: argparse.Namespace, workspace_config: WorkspaceConfig
+) -> None:
+    """Make sure the interrupted initialization used the same options"""
+    expected = {
+        "manifest_url": args.manifest_url,
+        "clone_all_repos": args.clone_all_repos,
+        "repo_groups": args.groups or [],
+        "shallow_clones": args.shallow_clones,
+        "clone_filter": args.clone_filter,
+        "object_cache": args.object_cache,
+        "singular_remote": args.singular_remote,
+    }
+    # Note: the branch of the manifest is only known once it is
+    # cloned, when it is not given on the command line
+    if args.manifest_branch:
+        expected["manifest_branch"] = args.manifest_branch
+    for name, value in expected.items():
+        previous = getattr(workspace_config, name)
+        if value != previous:
+            raise Error(
+                "Cannot resume the initialization of the workspace: "
+                f"it uses another {name} ({previous})"
+            )
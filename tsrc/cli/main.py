@@ -2,36 +2,45 @@
 
 import argparse
 import functools
+import importlib
 import os
 import sys
-from typing import Callable, Optional, Sequence
+from pathlib import Path
+from types import TracebackType
+from typing import Callable, Optional, Sequence, Type
 
 import cli_ui as ui
-import colored_traceback
 
 from tsrc import __version__
-from tsrc.cli import (
-    apply_manifest,
-    dump_manifest,
-    foreach,
-    init,
-    log,
-    manifest,
-    status,
-    sync,
-)
 from tsrc.errors import Error
+from tsrc.git_stats import STATS
+from tsrc.tracing import get_trace_path, start_tracing, stop_tracing
 
 ArgsList = Optional[Sequence[str]]
 MainFunc = Callable[..., None]
 
+# Name of each action, and the module implementing it. Modules are
+# only imported when their action is run, as some of them take a
+# while to import (see create_parser())
+ACTIONS = {
+    "apply-manifest": "tsrc.cli.apply_manifest",
+    "daemon": "tsrc.cli.daemon",
+    "dump-manifest": "tsrc.cli.dump_manifest",
+    "foreach": "tsrc.cli.foreach",
+    "init": "tsrc.cli.init",
+    "log": "tsrc.cli.log",
+    "manifest": "tsrc.cli.manifest",
+    "status": "tsrc.cli.status",
+    "sync": "tsrc.cli.sync",
+}
+
 
 def main_wrapper(main_func: MainFunc) -> MainFunc:
     """Wraps main() entry point to better deal with errors."""
 
     @functools.wraps(main_func)
     def wrapped(args: ArgsList = None) -> None:
-        colored_traceback.add_hook()
+        sys.excepthook = colored_excepthook
         try:
             main_func(args=args)
         except Error as e:
@@ -49,6 +58,24 @@ def main_wrapper(main_func: MainFunc) -> MainFunc:
     return wrapped
 
 
+def colored_excepthook(
+    exc_type: Type[BaseException],
+    exc_value: BaseException,
+    traceback: Optional[TracebackType],
+) -> None:
+    """Display unexpected exceptions with colored_traceback. It is only
+    imported when such an exception occurs, because it uses pygments,
+    which is slow to import.
+    """
+    import colored_traceback
+
+    colored_traceback.add_hook()
+    if sys.excepthook is colored_excepthook:
+        # Note: colored_traceback does nothing if stderr is not a tty
+        sys.excepthook = sys.__excepthook__
+    sys.excepthook(exc_type, exc_value, traceback)
+
+
 def setup_ui(args: argparse.Namespace) -> None:
     """Configure the cli_ui package using options
     set on the command line and environment variables.
@@ -77,6 +104,32 @@ def testable_main(args: ArgsList) -> None:
 
 
 def main_impl(args: ArgsList = None) -> None:
+    # Note: parse the command line once without any action module,
+    # just to know which one to import
+    namespace, _ = create_parser(action=None).parse_known_args(args=args)
+    parser = create_parser(action=namespace.action)
+    namespace = parser.parse_args(args=args)
+
+    setup_ui(namespace)
+    if not hasattr(namespace, "run"):
+        parser.print_help()
+        sys.exit(1)
+    trace_path = get_trace_path(namespace.trace)
+    if trace_path:
+        start_tracing()
+    try:
+        namespace.run(namespace)
+    finally:
+        if trace_path:
+            stop_tracing(trace_path)
+        if namespace.stats:
+            STATS.report()
+
+
+def create_parser(*, action: Optional[str]) -> argparse.ArgumentParser:
+    """Return the parser for the command line, where only the arguments
+    of the given action are known
+    """
     parser = argparse.ArgumentParser(prog="tsrc")
     parser.add_argument("--version", action="version", version="tsrc " + __version__)
 
@@ -89,25 +142,26 @@ def main_impl(args: ArgsList = None) -> None:
         choices=["auto", "always", "never"],
         help="whether to enable colored output",
     )
+    parser.add_argument(
+        "--stats",
+        help="display how many git commands were run, and how long they took",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--trace",
+        type=Path,
+        metavar="PATH",
+        help="write a trace of the git commands and of each processed repo to PATH, "
+        "in Chrome Trace Event format (also set by the TSRC_TRACE environment variable)",
+    )
 
     actions_parser = parser.add_subparsers(help="available actions", dest="action")
 
-    for module in (
-        apply_manifest,
-        dump_manifest,
-        foreach,
-        init,
-        log,
-        manifest,
-        status,
-        sync,
-    ):
-        module.configure_parser(actions_parser)
+    for name, module_name in ACTIONS.items():
+        if name == action:
+            module = importlib.import_module(module_name)
+            module.configure_parser(actions_parser)
+        else:
+            actions_parser.add_parser(name, add_help=False)
 
-    namespace = parser.parse_args(args=args)
-
-    setup_ui(namespace)
-    if not hasattr(namespace, "run"):
-        parser.print_help()
-        sys.exit(1)
-    namespace.run(namespace)
+    return parser
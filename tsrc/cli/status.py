@@ -1,8 +1,13 @@
 """ Entry point for tsrc status """
 
 import argparse
+import os
+import sys
+from collections import OrderedDict
 from copy import deepcopy
-from typing import Dict, List, Union, cast
+from typing import Dict, List, Optional, Union, cast
+
+import cli_ui as ui
 
 from tsrc.cli import (
     add_num_jobs_arg,
@@ -12,6 +17,7 @@ from tsrc.cli import (
     get_workspace_with_repos,
     simulate_get_workspace_with_repos,
 )
+from tsrc.daemon_client import get_daemon_statuses
 from tsrc.executor import process_items
 from tsrc.groups import GroupNotFound
 from tsrc.groups_to_find import GroupsToFind
@@ -23,6 +29,7 @@ from tsrc.local_tmp_bare_repos import (
 from tsrc.manifest_common_data import ManifestsTypeOfData
 from tsrc.pcs_repo import PCSRepo, get_deep_manifest_from_local_manifest_pcsrepo
 from tsrc.repo import Repo
+from tsrc.repo_watcher import RepoWatcher
 from tsrc.status_endpoint import (
     BareStatus,
     Status,
@@ -31,10 +38,16 @@ from tsrc.status_endpoint import (
 )
 from tsrc.status_header import StatusHeader, StatusHeaderDisplayMode
 from tsrc.utils import erase_last_line
+from tsrc.workspace import Workspace
 
 # from tsrc.status_header import header_manifest_branch
 from tsrc.workspace_repos_summary import WorkspaceReposSummary
 
+# Move the cursor to the top left corner, and clear the screen
+CLEAR_SCREEN = "\x1b[H\x1b[2J"
+
+StatusCollectors = Union[StatusCollector, StatusCollectorLocalOnly]
+
 
 def configure_parser(subparser: argparse._SubParsersAction) -> None:
     parser = subparser.add_parser(
@@ -80,6 +93,18 @@ def configure_parser(subparser: argparse._SubParsersAction) -> None:
         help="use buffered Future Manifest to speed-up execution",
         dest="use_same_future_manifest",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_false",
+        help="always run git, instead of using the status recorded by the previous run for repos that did not change on disk",  # noqa: E501
+        dest="use_cache",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="keep running, and refresh the status of repositories as soon as they change on disk (Linux only)",  # noqa: E501
+        dest="watch",
+    )
     parser.add_argument(
         "--strict",
         action="store_true",
@@ -152,15 +177,7 @@ def run(args: argparse.Namespace) -> None:
         [StatusHeaderDisplayMode.BRANCH],
     )
     status_header.display()
-    status_collector: Union[StatusCollector, StatusCollectorLocalOnly]
-    if args.local_git_only is True:
-        status_collector = StatusCollectorLocalOnly(
-            workspace, ignore_group_item=args.ignore_group_item
-        )
-    else:
-        status_collector = StatusCollector(
-            workspace, ignore_group_item=args.ignore_group_item
-        )
+    status_collector = get_status_collector(args, workspace)
 
     repos = deepcopy(workspace.repos)
     bare_fm_repos = wrs.get_bare_fm_repos()
@@ -178,6 +195,11 @@ def run(args: argparse.Namespace) -> None:
         leftovers_repos = wrs.obtain_leftovers_repos(repos)
         repos += leftovers_repos
 
+    # Note: start watching before computing the statuses,
+    # so that changes made in the meantime are not missed
+    watched_wrs = wrs
+    watcher = start_watching(workspace, repos) if args.watch else None
+
     if repos:
 
         # status_header.report_collecting(len(repos))
@@ -186,7 +208,13 @@ def run(args: argparse.Namespace) -> None:
         )
 
         num_jobs = get_num_jobs(args)
-        process_items(repos, status_collector, num_jobs=num_jobs)
+        with workspace.state_db.batch():
+            process_items(
+                repos,
+                status_collector,
+                num_jobs=num_jobs,
+                durations=workspace.get_durations("status"),
+            )
         erase_last_line()
 
         statuses = status_collector.statuses
@@ -197,6 +225,9 @@ def run(args: argparse.Namespace) -> None:
         )
         wrs.separate_statuses(bare_repos)
         wrs.calculate_fields_len()
+        if watcher:
+            # Note: displaying the summary consumes it
+            wrs = watched_wrs.copy_for_display()
 
         # only calculate summary when there are some Workspace repos
         if workspace.repos:
@@ -209,3 +240,102 @@ def run(args: argparse.Namespace) -> None:
     # check if we have found all Groups (if any provided)
     # and if not, throw exception ManifestGroupNotFound
     wrs.must_match_all_groups(ignore_if_group_not_found=args.ignore_if_group_not_found)
+
+    if watcher:
+        with watcher:
+            watch_workspace(
+                workspace,
+                watcher,
+                status_collector,
+                status_header,
+                watched_wrs,
+                repos=[x for x in repos if not x.is_bare],
+                num_jobs=get_num_jobs(args),
+            )
+
+
+def get_status_collector(
+    args: argparse.Namespace, workspace: Workspace
+) -> StatusCollectors:
+    res: StatusCollectors
+    if args.local_git_only is True:
+        res = StatusCollectorLocalOnly(
+            workspace,
+            ignore_group_item=args.ignore_group_item,
+            use_cache=args.use_cache,
+        )
+    else:
+        res = StatusCollector(
+            workspace,
+            ignore_group_item=args.ignore_group_item,
+            use_cache=args.use_cache,
+        )
+    if args.use_cache:
+        # Note: this is empty when no daemon is running
+        res.known_statuses = get_daemon_statuses(workspace.root_path)
+    return res
+
+
+def start_watching(workspace: Workspace, repos: List[Repo]) -> Optional[RepoWatcher]:
+    if not repos:
+        return None
+    # Note: do not let `git status` refresh the index, as this
+    # would trigger another refresh
+    os.environ["GIT_OPTIONAL_LOCKS"] = "0"
+    watcher = RepoWatcher()
+    for repo in repos:
+        if not repo.is_bare:
+            watcher.add_repo(repo.dest, workspace.root_path / repo.dest)
+    if watcher.incomplete:
+        ui.warning(
+            "Some directories cannot be watched,",
+            "consider increasing fs.inotify.max_user_watches",
+        )
+    return watcher
+
+
+def watch_workspace(
+    workspace: Workspace,
+    watcher: RepoWatcher,
+    status_collector: StatusCollectors,
+    status_header: StatusHeader,
+    wrs: WorkspaceReposSummary,
+    *,
+    repos: List[Repo],
+    num_jobs: int,
+) -> None:
+    """Compute again the statuses of the repos that changed,
+    and display the summary again, until interrupted
+    """
+    # Note: statuses must be computed again from now on
+    status_collector.known_statuses = {}
+    ui.info_2("Watching for changes, press Ctrl-C to stop")
+    try:
+        while True:
+            changed = watcher.wait_for_changes()
+            changed_repos = [x for x in repos if x.dest in changed]
+            if not changed_repos:
+                continue
+            # Note: the summary keeps a reference on the previous dict
+            status_collector.statuses = OrderedDict()
+            with status_collector.workspace.state_db.batch():
+                process_items(changed_repos, status_collector, num_jobs=num_jobs)
+            erase_last_line()
+            wrs.update_statuses(
+                cast(
+                    Dict[str, Union[Status, Exception, BareStatus, Exception]],
+                    status_collector.statuses,
+                )
+            )
+            if sys.stdout.isatty():
+                ui.info(CLEAR_SCREEN, end="")
+            status_header.display()
+            displayed = wrs.copy_for_display()
+            # Note: the copy comes with the widths of the first summary
+            displayed.calculate_fields_len()
+            if workspace.repos:
+                displayed.summary()
+            displayed.check_for_leftovers()
+            ui.info_2("Watching for changes, press Ctrl-C to stop")
+    except KeyboardInterrupt:
+        pass
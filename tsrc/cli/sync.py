@@ -1,7 +1,7 @@
 """ Entry point for `tsrc sync` """
 
 import argparse
-from typing import List, Union
+from typing import List, Optional, Union
 
 import cli_ui as ui
 
@@ -13,6 +13,8 @@ from tsrc.cli import (
     get_workspace,
     resolve_repos,
 )
+from tsrc.manifest_diff import ManifestDiff
+from tsrc.workspace import Workspace
 
 
 def configure_parser(subparser: argparse._SubParsersAction) -> None:
@@ -79,12 +81,41 @@ def configure_parser(subparser: argparse._SubParsersAction) -> None:
         "--singular-remote",
         help="only use this remote when cloning repositories",
     )
+    parser.add_argument(
+        "--skip-unchanged",
+        action="store_true",
+        dest="skip_unchanged",
+        help="use `git ls-remote` to find out which repos have changed upstream, and skip `git fetch` for the others",  # noqa: E501
+    )
+    parser.add_argument(
+        "--narrow-fetch",
+        action="store_true",
+        dest="narrow_fetch",
+        help="only fetch the branch, tag or sha1 configured in the manifest, instead of every branch and tag",  # noqa: E501
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        dest="incremental",
+        help="only synchronize repos whose manifest entry or upstream changed since they were last synchronized",  # noqa: E501
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        dest="pipeline",
+        help="clone, synchronize and clean each repo as soon as possible, instead of waiting for all the repos to finish each step",  # noqa: E501
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        dest="resume",
+        help="skip the repos that an interrupted sync already synchronized, if they did not change since",  # noqa: E501
+    )
     add_num_jobs_arg(parser)
     parser.set_defaults(run=run)
 
 
 def run(args: argparse.Namespace) -> None:
-    force = args.force
     update_manifest = args.update_manifest
     update_config_repo_groups = args.update_config_repo_groups
     groups = args.groups
@@ -92,12 +123,9 @@ def run(args: argparse.Namespace) -> None:
     singular_remote = args.singular_remote
     include_regex = args.include_regex
     exclude_regex = args.exclude_regex
-    correct_branch = args.correct_branch
     workspace = get_workspace(args)
     num_jobs = get_num_jobs(args)
     do_switch = args.do_switch
-    do_clean = args.do_clean
-    do_hard_clean = args.do_hard_clean
 
     ignore_if_group_not_found: bool = False
     report_update_repo_groups: Union[bool, None] = False
@@ -105,7 +133,7 @@ def run(args: argparse.Namespace) -> None:
     if update_manifest:
         repo_groups_0 = workspace.config.repo_groups.copy()
         ui.info_2("Updating manifest")
-        workspace.update_manifest()
+        report_manifest_diff(workspace.update_manifest())
 
         # check if groups needs to be updated on config
         found_groups: List[str] = []
@@ -158,14 +186,68 @@ def run(args: argparse.Namespace) -> None:
     if len(workspace.repos) == 0:
         ui.info_1("Nothing to synchronize, skipping")
         return
+    synchronize(workspace, args, num_jobs=num_jobs)
+    ui.info_1("Workspace synchronized")
+
+
+def synchronize(
+    workspace: Workspace, args: argparse.Namespace, *, num_jobs: int
+) -> None:
+    force = args.force
+    singular_remote = args.singular_remote
+    correct_branch = args.correct_branch
+    do_clean = args.do_clean
+    do_hard_clean = args.do_hard_clean
+    if args.incremental is True:
+        workspace.select_changed_repos(
+            singular_remote=singular_remote,
+            narrow_fetch=args.narrow_fetch,
+            ignore_group_item=args.ignore_group_item,
+            num_jobs=num_jobs,
+        )
+        if not workspace.repos:
+            ui.info_1("No repo changed since the last sync, skipping")
+            return
+    resumed = workspace.start_journal(
+        "sync", resume=args.resume, ignore_group_item=args.ignore_group_item
+    )
+    if resumed:
+        ui.info_2("Resuming the interrupted sync")
+    elif args.resume is True:
+        ui.info_2("No interrupted sync to resume")
+    if args.pipeline is True:
+        workspace.sync_pipelined(
+            force=force,
+            singular_remote=singular_remote,
+            correct_branch=correct_branch,
+            skip_unchanged=args.skip_unchanged,
+            narrow_fetch=args.narrow_fetch,
+            do_clean=do_clean,
+            do_hard_clean=do_hard_clean,
+            ignore_group_item=args.ignore_group_item,
+            num_jobs=num_jobs,
+        )
+        workspace.finish_journal()
+        return
     workspace.clone_missing(num_jobs=num_jobs)
     workspace.set_remotes(num_jobs=num_jobs)
     workspace.sync(
         force=force,
         singular_remote=singular_remote,
         correct_branch=correct_branch,
+        skip_unchanged=args.skip_unchanged,
+        narrow_fetch=args.narrow_fetch,
+        ignore_group_item=args.ignore_group_item,
         num_jobs=num_jobs,
     )
     workspace.clean(do_clean=do_clean, do_hard_clean=do_hard_clean, num_jobs=num_jobs)
     workspace.perform_filesystem_operations(ignore_group_item=args.ignore_group_item)
-    ui.info_1("Workspace synchronized")
+    workspace.finish_journal()
+
+
+def report_manifest_diff(diff: Optional[ManifestDiff]) -> None:
+    if not diff or diff.is_empty():
+        return
+    ui.info_2("Manifest changes:")
+    for line in diff.describe():
+        ui.info(ui.green, "*", ui.reset, line)
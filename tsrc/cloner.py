@@ -1,13 +1,16 @@
 import os
+import shutil
 import textwrap
 from pathlib import Path
-from typing import List, Optional
+from typing import Callable, List, Optional, Tuple
 
 import cli_ui as ui
 
 from tsrc.errors import Error
-from tsrc.executor import Outcome, Task
+from tsrc.executor import Call, GitCommand, Outcome, Steps, Task
 from tsrc.git import run_git_captured
+from tsrc.host_limits import get_url_host
+from tsrc.object_cache import ObjectCache
 from tsrc.repo import Remote, Repo
 
 
@@ -19,10 +22,14 @@ class Cloner(Task[Repo]):
         workspace_path: Path,
         *,
         shallow: bool = False,
+        clone_filter: Optional[str] = None,
+        object_cache: Optional[ObjectCache] = None,
         remote_name: Optional[str] = None,
     ) -> None:
         self.workspace_path = workspace_path
         self.shallow = shallow
+        self.clone_filter = clone_filter
+        self.object_cache = object_cache
         self.remote_name = remote_name
 
     def describe_process_start(self, item: Repo) -> List[ui.Token]:
@@ -34,13 +41,20 @@ class Cloner(Task[Repo]):
     def describe_item(self, item: Repo) -> str:
         return item.dest
 
+    def get_host(self, item: Repo) -> Optional[str]:
+        try:
+            remote = self._choose_remote(item)
+        except Error:
+            return None
+        return get_url_host(remote.url)
+
     def check_shallow_with_sha1(self, repo: Repo) -> None:
         if not repo.sha1:
             return
         if self.shallow:
             message = textwrap.dedent(
                 f"Cannot use --shallow with a fixed sha1 ({repo.sha1})\n"
-                "Consider using a tag instead"
+                "Consider using a tag or a clone filter instead"
             )
             raise Error(message)
 
@@ -56,8 +70,37 @@ class Cloner(Task[Repo]):
 
         return repo.remotes[0]
 
-    def clone_repo(self, repo: Repo) -> str:
-        """Clone a missing repo."""
+    def clone_steps(self, repo: Repo) -> Steps[str]:
+        """Clone a missing repo, and reset it to the configured sha1,
+        see Task.run_steps(). Return the summary.
+        """
+        self.check_shallow_with_sha1(repo)
+        # Note: preparing the clone may refresh the object cache
+        prepared: Tuple[Path, List[str], str] = yield Call(self.prepare_clone, (repo,))
+        parent, clone_args, summary = prepared
+        cleanup = self.get_clone_cleanup(repo)
+        yield GitCommand(parent, clone_args, with_retry=True, cleanup=cleanup)
+        reset_summary: str = yield Call(self.reset_repo, (repo,))
+        return summary + reset_summary
+
+    def get_clone_cleanup(self, repo: Repo) -> Callable[[], None]:
+        """Return a function removing what a failed `git clone`
+        left behind, before trying again
+        """
+        repo_path = self.workspace_path / repo.dest
+        existed = repo_path.exists()
+
+        def cleanup() -> None:
+            # Note: never remove a directory tsrc did not create
+            if not existed and repo_path.exists():
+                shutil.rmtree(repo_path)
+
+        return cleanup
+
+    def prepare_clone(self, repo: Repo) -> Tuple[Path, List[str], str]:
+        """Return the path to run `git clone` from, its arguments,
+        and the summary to display once the clone is done.
+        """
         # Note:
         # Must use the correct remote(s) and branch when cloning,
         # *and* must reset the repo to the correct state if `tag` or
@@ -79,16 +122,23 @@ class Cloner(Task[Repo]):
             clone_args.extend(["--branch", ref])
         if self.shallow:
             clone_args.extend(["--depth", "1"])
+        # Note: unlike shallow clones, partial clones contain every
+        # commit, so they can be reset to any sha1
+        clone_filter = repo.clone_filter or self.clone_filter
+        if clone_filter:
+            clone_args.append(f"--filter={clone_filter}")
+        if self.object_cache:
+            mirror_path = self.object_cache.refresh(remote_url)
+            if mirror_path:
+                clone_args.extend(["--reference-if-able", str(mirror_path)])
         if not repo.ignore_submodules:
             clone_args.append("--recurse-submodules")
         clone_args.append(name)
 
-        self.run_git(parent, *clone_args)
-
         summary = f"{repo.dest} cloned from {remote_url}"
         if ref:
             summary += f" (on {ref})"
-        return summary
+        return parent, clone_args, summary
 
     def reset_repo(self, repo: Repo) -> str:
         ref = repo.sha1
@@ -115,10 +165,11 @@ class Cloner(Task[Repo]):
         # `git reset` will be shown directly to the user, so we can use
         # an empty summary
         self.info_count(index, count, "Cloning", repo.dest)
-        self.check_shallow_with_sha1(repo)
-        summary: str = ""
-        summary += self.clone_repo(repo)
-        summary += self.reset_repo(repo)
+        summary = self.run_steps(self.clone_steps(repo))
+        return Outcome.from_summary(summary)
+
+    async def process_async(self, index: int, count: int, repo: Repo) -> Outcome:
+        summary = await self.run_steps_async(self.clone_steps(repo))
         return Outcome.from_summary(summary)
 
 
@@ -168,6 +219,13 @@ class BareCloner(Task[Repo]):
     def describe_item(self, item: Repo) -> str:
         return item.dest
 
+    def get_host(self, item: Repo) -> Optional[str]:
+        try:
+            remote = self._choose_remote(item)
+        except Error:
+            return None
+        return get_url_host(remote.url)
+
     def _choose_remote(self, repo: Repo) -> Remote:
         if self.remote_name:
             for remote in repo.remotes:
@@ -21,6 +21,13 @@ def parse_config(file_path: Path, *, schema: Schema) -> Config:
         contents = file_path.read_text()
     except OSError as os_error:
         raise InvalidConfigError(file_path, os_error)
+    return parse_config_contents(file_path, contents, schema=schema)
+
+
+def parse_config_contents(file_path: Path, contents: str, *, schema: Schema) -> Config:
+    """Same as parse_config(), when the contents of the file
+    have already been read.
+    """
     try:
         yaml = ruamel.yaml.YAML(typ="safe", pure=True)
         parsed = yaml.load(contents)
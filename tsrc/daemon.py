@@ -0,0 +1,313 @@
+"""
+Daemon
+
+`tsrc daemon` keeps the manifest of a workspace and the status of
+its repos in memory, and answers queries from other processes (tsrc
+itself, editors, shell prompts ...) over a Unix socket located at
+`<workspace>/.tsrc/daemon.sock` (see tsrc.daemon_client).
+
+The client sends one JSON object per line, and the daemon answers each
+of them with one JSON object on one line. Every answer has an "ok" key;
+when it is false, "error" tells why. Queries are:
+
+* {"query": "ping"}: answer contains "version" and "pid"
+* {"query": "status", "dests": [...]}: answer contains "statuses",
+  mapping dests to the values of tsrc.status_cache.dump_status(), and
+  "stale", the list of dests whose status is being refreshed.
+  Repos for which the status is not known yet are left out.
+  Without "dests", return the statuses of every known repo.
+* {"query": "repos", "groups": [...], "all_cloned": false,
+  "include_regex": "", "exclude_regex": ""}: answer contains "repos",
+  the list of dests selected the same way as with the command line
+  options of the same name
+* {"query": "manifest"}: answer contains "repos", mapping dests to
+  manifest entries, copies and symlinks included, as in tsrc.manifest_diff
+* {"query": "stop"}
+
+Statuses are kept up to date with tsrc.repo_watcher, by a worker thread,
+so that running git never delays an answer. Pending file system events
+are processed before answering: a repo changed before the query was sent
+is always listed as stale until its new status is known. The workspace
+configuration and the manifest are loaded again when they change.
+"""
+
+import json
+import os
+import select
+import socket
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import cli_ui as ui
+
+from tsrc import __version__
+from tsrc.cli import repos_from_config, resolve_repos
+from tsrc.daemon_client import DaemonClient, Request, Response, get_socket_path
+from tsrc.errors import Error
+from tsrc.executor import process_items
+from tsrc.manifest import Manifest, RepoNotFound
+from tsrc.manifest_diff import get_repo_entries
+from tsrc.repo import Repo
+from tsrc.repo_watcher import RepoWatcher
+from tsrc.status_cache import dump_status
+from tsrc.status_endpoint import Status, StatusCollector
+from tsrc.workspace import Workspace
+
+
+class DaemonError(Error):
+    pass
+
+
+class Daemon:
+    """Usage:
+
+    >>> daemon = Daemon(workspace_path, num_jobs=4)
+    >>> daemon.serve()  # until a "stop" query is received
+    """
+
+    def __init__(self, root_path: Path, *, num_jobs: int = 1) -> None:
+        self.root_path = root_path
+        self.socket_path = get_socket_path(root_path)
+        self.num_jobs = num_jobs
+        self.workspace = Workspace(root_path)
+        self.manifest: Optional[Manifest] = None
+        self.manifest_stamp: Optional[Tuple[Any, ...]] = None
+        self.watcher = RepoWatcher()
+        # dests of repos being watched, and of the ones that
+        # will be once cloned
+        self.watched: Set[str] = set()
+        self.not_cloned: Set[str] = set()
+        self.statuses: Dict[str, Dict[str, Any]] = {}
+        # Statuses are computed by a worker thread, so that queries are
+        # answered while git runs. `lock` protects the attributes below,
+        # as well as `statuses` and `manifest`
+        self.lock = threading.Lock()
+        self.worker: Optional[threading.Thread] = None
+        # dests of repos waiting for a refresh, and of the ones whose
+        # status is not up to date
+        self.pending: Set[str] = set()
+        self.stale: Set[str] = set()
+        self.running = False
+
+    def serve(self) -> None:
+        server = self._listen()
+        clients: Dict[socket.socket, bytes] = {}
+        # Note: otherwise `git status` refreshes the index,
+        # which triggers another refresh
+        os.environ["GIT_OPTIONAL_LOCKS"] = "0"
+        try:
+            self.running = True
+            self.refresh()
+            ui.info_2("Listening on", self.socket_path)
+            while self.running:
+                connections = {x.fileno(): x for x in clients}
+                readable, _, _ = select.select(
+                    [server.fileno(), self.watcher.fileno(), *connections], [], []
+                )
+                for fd in readable:
+                    if fd == server.fileno():
+                        connection, _ = server.accept()
+                        clients[connection] = b""
+                    elif fd == self.watcher.fileno():
+                        self.update_statuses(self.watcher.read_changes())
+                    else:
+                        self._read_requests(connections[fd], clients)
+        finally:
+            self.running = False
+            with self.lock:
+                worker = self.worker
+            if worker:
+                worker.join()
+            for connection in clients:
+                connection.close()
+            server.close()
+            self.watcher.inotify.close()
+            self.socket_path.unlink(missing_ok=True)
+
+    def refresh(self) -> None:
+        """Make sure the manifest is up to date, and that the statuses
+        of the repos that changed are being refreshed
+        """
+        self._load_manifest_if_changed()
+        cloned = {x for x in self.not_cloned if (self.root_path / x).exists()}
+        self._watch(cloned)
+        self.update_statuses(self.watcher.read_changes())
+
+    def update_statuses(self, dests: Set[str]) -> None:
+        """Refresh the statuses of the given repos in the worker thread.
+
+        Until this is done, their last known statuses are served as stale.
+        """
+        if not dests:
+            return
+        with self.lock:
+            self.pending |= dests
+            self.stale |= dests
+            if self.worker:
+                return
+            self.worker = threading.Thread(
+                target=self._refresh_pending, name="tsrc-daemon-refresh"
+            )
+            self.worker.start()
+
+    def _refresh_pending(self) -> None:
+        while True:
+            with self.lock:
+                dests = self.pending
+                self.pending = set()
+                if not dests or not self.manifest or not self.running:
+                    self.worker = None
+                    return
+                workspace = self.workspace
+                repos = [
+                    x for x in self.manifest.get_repos(all_=True) if x.dest in dests
+                ]
+            status_collector = StatusCollector(workspace)
+            process_items(repos, status_collector, num_jobs=self.num_jobs)
+            with self.lock:
+                for dest, status in status_collector.statuses.items():
+                    if isinstance(status, Status):
+                        self.statuses[dest] = dump_status(status.git, status.git_remote)
+                    else:
+                        self.statuses.pop(dest, None)
+                # Note: the repos that changed again in the meantime stay stale
+                self.stale -= dests - self.pending
+
+    def handle(self, request: Request) -> Response:
+        query = request.get("query")
+        if query == "ping":
+            return {"ok": True, "version": __version__, "pid": os.getpid()}
+        if query == "stop":
+            self.running = False
+            return {"ok": True}
+        self.refresh()
+        if query == "status":
+            dests = request.get("dests")
+            if dests is not None:
+                self._watch_new_dests(dests)
+            with self.lock:
+                if dests is None:
+                    dests = list(self.statuses)
+                statuses = {x: self.statuses[x] for x in dests if x in self.statuses}
+                stale = sorted(self.stale & set(statuses))
+            return {"ok": True, "statuses": statuses, "stale": stale}
+        if query == "repos":
+            return {"ok": True, "repos": [x.dest for x in self._select_repos(request)]}
+        if query == "manifest":
+            assert self.manifest
+            repos = self.manifest.get_repos(all_=True)
+            entries = get_repo_entries(repos, self.manifest.file_system_operations)
+            return {"ok": True, "repos": entries}
+        return {"ok": False, "error": f"unknown query: {query}"}
+
+    def _select_repos(self, request: Request) -> List[Repo]:
+        return resolve_repos(
+            self.workspace,
+            groups=request.get("groups"),
+            all_cloned=request.get("all_cloned", False),
+            include_regex=request.get("include_regex", ""),
+            exclude_regex=request.get("exclude_regex", ""),
+            manifest=self.manifest,
+        )
+
+    def _load_manifest_if_changed(self) -> None:
+        stamp = self._get_manifest_stamp()
+        if self.manifest and stamp == self.manifest_stamp:
+            return
+        workspace = Workspace(self.root_path)
+        manifest = workspace.get_manifest()
+        known = {x.dest for x in manifest.get_repos(all_=True)}
+        with self.lock:
+            self.workspace = workspace
+            self.manifest = manifest
+            for dest in list(self.statuses):
+                if dest not in known:
+                    del self.statuses[dest]
+        self.manifest_stamp = stamp
+        self.not_cloned &= known
+        self._watch_new_dests(
+            [x.dest for x in repos_from_config(self.manifest, self.workspace.config)]
+        )
+
+    def _get_manifest_stamp(self) -> Tuple[Any, ...]:
+        res: List[Any] = []
+        manifest_path = self.workspace.local_manifest.clone_path / "manifest.yml"
+        for path in (self.workspace.cfg_path, manifest_path):
+            try:
+                stat = path.stat()
+            except OSError:
+                res.append(None)
+                continue
+            res.append((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+        return tuple(res)
+
+    def _watch_new_dests(self, dests: List[str]) -> None:
+        assert self.manifest
+        new_dests = set(dests) - self.watched - self.not_cloned
+        known_dests = set()
+        for dest in new_dests:
+            try:
+                self.manifest.get_repo(dest)
+            except RepoNotFound:
+                continue
+            known_dests.add(dest)
+        self._watch(known_dests)
+
+    def _watch(self, dests: Set[str]) -> None:
+        watched = set()
+        for dest in sorted(dests):
+            repo_path = self.root_path / dest
+            if not repo_path.exists():
+                self.not_cloned.add(dest)
+                continue
+            self.not_cloned.discard(dest)
+            self.watcher.add_repo(dest, repo_path)
+            watched.add(dest)
+        self.watched |= watched
+        self.update_statuses(watched)
+
+    def _listen(self) -> socket.socket:
+        if DaemonClient.connect(self.root_path):
+            raise DaemonError("A daemon is already running for this workspace")
+        self.socket_path.unlink(missing_ok=True)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(str(self.socket_path))
+            server.listen()
+        except OSError as e:
+            server.close()
+            raise DaemonError(f"Could not listen on {self.socket_path}: {e}")
+        return server
+
+    def _read_requests(
+        self, connection: socket.socket, clients: Dict[socket.socket, bytes]
+    ) -> None:
+        try:
+            data = connection.recv(64 * 1024)
+        except OSError:
+            data = b""
+        if not data:
+            connection.close()
+            del clients[connection]
+            return
+        buffer = clients[connection] + data
+        *lines, clients[connection] = buffer.split(b"\n")
+        for line in lines:
+            response = self._handle_line(line)
+            try:
+                connection.sendall(json.dumps(response).encode() + b"\n")
+            except OSError:
+                pass
+
+    def _handle_line(self, line: bytes) -> Response:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"ok": False, "error": "invalid request"}
+        if not isinstance(request, dict):
+            return {"ok": False, "error": "invalid request"}
+        try:
+            return self.handle(request)
+        except Error as e:
+            return {"ok": False, "error": e.message}
@@ -0,0 +1,172 @@
+"""
+Daemon client
+
+Talk to the `tsrc daemon` of a workspace, if one is running
+(see tsrc.daemon for the list of queries).
+
+Any failure to talk to the daemon is treated as if there was
+no daemon at all, so that callers can fall back to doing the
+work themselves.
+"""
+
+import json
+import socket
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from tsrc import __version__
+
+# How long clients wait for an answer, in seconds
+CLIENT_TIMEOUT = 2.0
+
+Request = Dict[str, Any]
+Response = Dict[str, Any]
+
+
+def get_socket_path(root_path: Path) -> Path:
+    return root_path / ".tsrc" / "daemon.sock"
+
+
+class DaemonClient:
+    """Usage:
+
+    >>> client = DaemonClient.connect(workspace_path)
+    >>> if client:
+    ...     statuses = client.get_statuses(["foo", "bar"])
+
+    Any failure to talk to the daemon is treated as if there was
+    no daemon at all: queries then return None.
+    """
+
+    def __init__(self, connection: socket.socket) -> None:
+        self.connection = connection
+        self._buffer = b""
+
+    @classmethod
+    def connect(cls, root_path: Path) -> Optional["DaemonClient"]:
+        """Return a client connected to the daemon of the workspace,
+        or None if there is no daemon, or if it runs another version of tsrc.
+        """
+        socket_path = get_socket_path(root_path)
+        if not socket_path.exists():
+            return None
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(CLIENT_TIMEOUT)
+        try:
+            connection.connect(str(socket_path))
+        except OSError:
+            connection.close()
+            return None
+        res = cls(connection)
+        response = res.query({"query": "ping"})
+        if not response or response.get("version") != __version__:
+            res.close()
+            return None
+        return res
+
+    def query(self, request: Request) -> Optional[Response]:
+        try:
+            self.connection.sendall(json.dumps(request).encode() + b"\n")
+            while b"\n" not in self._buffer:
+                data = self.connection.recv(64 * 1024)
+                if not data:
+                    return None
+                self._buffer += data
+        except OSError:
+            return None
+        line, _, self._buffer = self._buffer.partition(b"\n")
+        try:
+            response = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(response, dict) or not response.get("ok"):
+            return None
+        return response
+
+    def get_statuses(
+        self, dests: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Return the statuses known by the daemon.
+
+        Stale ones (the daemon is still refreshing them) are left out,
+        so that callers compute them by themselves.
+        """
+        request: Request = {"query": "status"}
+        if dests is not None:
+            request["dests"] = dests
+        response = self.query(request)
+        if not response:
+            return {}
+        statuses: Dict[str, Dict[str, Any]] = response.get("statuses", {})
+        for dest in response.get("stale", []):
+            statuses.pop(dest, None)
+        return statuses
+
+    def get_repos(
+        self,
+        *,
+        groups: Optional[List[str]],
+        all_cloned: bool,
+        include_regex: str,
+        exclude_regex: str,
+    ) -> Optional[List[str]]:
+        response = self.query(
+            {
+                "query": "repos",
+                "groups": groups,
+                "all_cloned": all_cloned,
+                "include_regex": include_regex,
+                "exclude_regex": exclude_regex,
+            }
+        )
+        if not response:
+            return None
+        repos: List[str] = response.get("repos", [])
+        return repos
+
+    def stop(self) -> bool:
+        return self.query({"query": "stop"}) is not None
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def get_daemon_statuses(
+    root_path: Path, dests: Optional[List[str]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """Return the statuses known by the daemon of the workspace,
+    if one is running
+    """
+    client = DaemonClient.connect(root_path)
+    if not client:
+        return {}
+    try:
+        return client.get_statuses(dests)
+    finally:
+        client.close()
+
+
+def get_daemon_repos(
+    root_path: Path,
+    *,
+    groups: Optional[List[str]],
+    all_cloned: bool,
+    include_regex: str = "",
+    exclude_regex: str = "",
+) -> Optional[List[str]]:
+    """Return the dests of the repos selected by the daemon of the
+    workspace, or None if no daemon is running, or if it could not
+    select them (for instance because a group does not exist)
+    """
+    client = DaemonClient.connect(root_path)
+    if not client:
+        return None
+    try:
+        return client.get_repos(
+            groups=groups,
+            all_cloned=all_cloned,
+            include_regex=include_regex,
+            exclude_regex=exclude_regex,
+        )
+    finally:
+        client.close()
@@ -0,0 +1,102 @@
+"""
+Job durations
+
+Remember how long each repo took to be processed by a given kind
+of task (like 'clone', 'fetch', 'status' or 'foreach'), in the
+timings table of the workspace state database (see tsrc.state_db).
+
+When running tasks in parallel, the executor uses this to start
+the jobs expected to take the longest first, so that a huge repo
+that happens to be last in the manifest does not make the whole
+run take longer.
+
+Setting the `TSRC_JOB_ORDER` environment variable to 'manifest'
+disables this, and repos are processed in the manifest order.
+"""
+
+import os
+from threading import Lock
+from typing import Callable, Dict, List, Optional, TypeVar
+
+from tsrc.errors import Error
+from tsrc.state_db import StateDB
+
+T = TypeVar("T")
+
+# Weight of the last measured duration, compared to
+# the previous ones, so that one slow run (because of
+# a busy server for instance) does not matter too much
+SMOOTHING = 0.5
+
+
+class InvalidJobOrder(Error):
+    def __init__(self, value: str) -> None:
+        super().__init__(
+            f"Invalid TSRC_JOB_ORDER value: '{value}' "
+            "(expected 'duration' or 'manifest')"
+        )
+
+
+def get_job_order() -> str:
+    """Return how to order jobs: 'duration' (the default),
+    or 'manifest'
+    """
+    value = os.environ.get("TSRC_JOB_ORDER", "duration")
+    if value not in ("duration", "manifest"):
+        raise InvalidJobOrder(value)
+    return value
+
+
+class JobDurations:
+    """Expected and measured durations, in seconds, for one kind of task.
+
+    Keys are the descriptions of the processed items (see
+    Task.describe_item()), which are the repos 'dest' most of
+    the time.
+    """
+
+    def __init__(self, state_db: StateDB, kind: str) -> None:
+        self.state_db = state_db
+        self.kind = kind
+        self.expected = state_db.get_timings(kind)
+        self.measured: Dict[str, float] = {}
+        self.lock = Lock()
+
+    @classmethod
+    def from_state_db(cls, state_db: StateDB, kind: str) -> Optional["JobDurations"]:
+        """Return None when ordering by duration is disabled"""
+        if get_job_order() == "manifest":
+            return None
+        return cls(state_db, kind)
+
+    def sort(self, items: List[T], describe: Callable[[T], str]) -> List[T]:
+        """Return the items, longest expected first.
+
+        Items for which nothing is known yet (like repos that were just
+        added to the manifest) go first, in their original order.
+        """
+
+        def key(item: T) -> float:
+            return -self.expected.get(describe(item), float("inf"))
+
+        # Note: sorted() is stable, so items with the same
+        # expected duration keep their original order
+        return sorted(items, key=key)
+
+    def record(self, item_desc: str, seconds: float) -> None:
+        with self.lock:
+            self.measured[item_desc] = seconds
+
+    def save(self) -> None:
+        if not self.measured:
+            return
+        # Note: read the timings again, in case an other tsrc process
+        # recorded some in the mean time
+        previous = self.state_db.get_timings(self.kind)
+        to_record = {}
+        for item_desc, seconds in self.measured.items():
+            previous_seconds = previous.get(item_desc)
+            if previous_seconds is not None:
+                seconds = SMOOTHING * seconds + (1 - SMOOTHING) * previous_seconds
+            to_record[item_desc] = round(seconds, 3)
+        self.state_db.record_timings(self.kind, to_record)
@@ -24,6 +24,19 @@ the Task[T] interface
 * Both the SequentialExecutor and the ParallelExecutor will call
   Task.process() for each item, but the SequentialExecutor will do
   it in a simple loop, and ParallelExecutor will use a ThreadPoolExecutor
+* When the TSRC_EXECUTOR environment variable is set to 'asyncio',
+  the AsyncioExecutor is used instead of the ParallelExecutor. It
+  calls Task.process_async() for each item from an event loop, with
+  at most num_jobs items being processed at the same time. Tasks
+  which spend most of their time waiting for the network can override
+  process_async() to run git with `asyncio.create_subprocess_exec`,
+  so that no thread is held while git is running. The default
+  implementation just runs Task.process() in a worker thread.
+
+Tasks implementing both process() and process_async() can write the
+steps they perform once, as a generator yielding GitCommand and Call
+instances, and run it with Task.run_steps() and Task.run_steps_async():
+only the way git commands and blocking calls are run then differs.
 
 ## Displaying output when the tasks at running
 
@@ -73,6 +86,38 @@ saw the git output when processing items sequentially.
 Finally, the summary may contain an `error` instance, either set by the
 Task itself, or set by the Executor when an exception occurred.
 
+## Chaining tasks
+
+When several tasks must be run on the same items (for instance cloning,
+then configuring remotes, then synchronizing repositories), calling
+process_items() once per task means every item has to wait for the
+slowest one before going to the next step.
+
+Instead, a TaskChain can be used: it is a Task that runs every step on an
+item one after the other, so each item goes through all the steps at its
+own pace. Items that must be processed once a given item is done (like
+filesystem operations) can be put in a FollowUpQueue: they are processed
+as soon as the item they depend on is done, in the order they were given.
+
+## Ordering jobs
+
+process_items() can be given a JobDurations instance (see tsrc.durations),
+in which case the time spent processing each item is recorded, and the
+parallel executors start with the items that took the longest last time.
+
+## Limiting jobs by host
+
+process_items() can be given a HostLimits instance (see tsrc.host_limits),
+in which case the parallel executors only start an item when the host
+returned by Task.get_host() has room for it. Items whose host is busy
+wait, without holding a job, while items of other hosts keep going.
+An item only takes a slot of its host when it actually starts.
+
+## Tracing
+
+Each call to Task.process() (or Task.process_async()) is recorded as a
+span when tracing is enabled (see tsrc.tracing).
+
 ## Processing collected outcomes
 
 As explained above, each invocation of Task.process_item produces an Outcome
@@ -84,19 +129,48 @@ to print the summary, or an error message when relevant.
 """
 
 import abc
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import collections
+import contextlib
+import contextvars
+import functools
+import heapq
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from dataclasses import dataclass
 from pathlib import Path
 from threading import Lock
-from typing import Any, Dict, Generic, List, Optional, TypeVar
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Deque,
+    Dict,
+    Generator,
+    Generic,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+    cast,
+)
 
 import cli_ui as ui
 
+from tsrc.durations import JobDurations
 from tsrc.errors import Error
-from tsrc.git import run_git
+from tsrc.git import GitCommandError, run_git, run_git_async, run_git_captured
+from tsrc.host_limits import HostLimits
+from tsrc.retry import retry, retry_async
+from tsrc.tracing import set_track, span
 from tsrc.utils import erase_last_line
 
 T = TypeVar("T")
+U = TypeVar("U")
 
 
 class ExecutorFailed(Error):
@@ -157,6 +231,40 @@ class OutcomeCollection:
             ui.info(ui.red, "*", ui.reset, item, ":", error)
 
 
+@dataclass(frozen=True)
+class GitCommand:
+    """A git command run by a step of a task (see Task.run_steps()).
+
+    Commands run with retries raise GitCommandError when they fail
+    (see Task.run_git_with_retry()), and the step gets None back. Other
+    ones are run with check=False, and the step gets a tuple
+    (returncode, output) back.
+    """
+
+    working_path: Path
+    args: List[str]
+    with_retry: bool = False
+    # Called before each new attempt, see retry()
+    cleanup: Optional[Callable[[], None]] = None
+
+
+@dataclass(frozen=True)
+class Call:
+    """A blocking function called by a step of a task: the step
+    gets its return value back
+    """
+
+    func: Callable[..., Any]
+    args: Tuple[Any, ...] = ()
+
+
+Step = Union[GitCommand, Call]
+
+# Steps of a task, yielding what to run and getting the result back,
+# and returning a value of type U
+Steps = Generator[Step, Any, U]
+
+
 class Task(Generic[T], metaclass=abc.ABCMeta):
     """Represent an action to be performed."""
 
@@ -204,6 +312,93 @@ class Task(Generic[T], metaclass=abc.ABCMeta):
         else:
             run_git(working_path, *args)
 
+    def run_git_with_retry(
+        self,
+        working_path: Path,
+        *args: str,
+        cleanup: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """Same as run_git(), except the command is run again if it fails
+        because of a transient error, like a dropped connection (see
+        tsrc.retry). `cleanup` is called before each new attempt.
+
+        Only meant for commands accepting `--progress` (`git fetch`
+        and `git clone`), which is needed to keep displaying progress
+        while the error output is inspected.
+        """
+        if not self.parallel and sys.stderr.isatty():
+            subcommand, *rest = args
+            args = (subcommand, "--progress", *rest)
+
+        def run() -> None:
+            if self.parallel:
+                run_git(working_path, *args, show_output=False, show_cmd=False)
+            else:
+                run_git(working_path, *args, keep_error=True)
+
+        retry(run, on_retry=self.on_retry, cleanup=cleanup)
+
+    def run_steps(self, steps: Steps[U]) -> U:
+        """Run the given steps, and return their value"""
+        runner = StepsRunner(steps)
+        step = runner.start()
+        while step:
+            try:
+                value = self.run_step(step)
+            except Error as e:
+                step = runner.throw(e)
+            else:
+                step = runner.send(value)
+        return runner.get_value()
+
+    async def run_steps_async(self, steps: Steps[U]) -> U:
+        """Same as run_steps(), without blocking the event loop"""
+        runner = StepsRunner(steps)
+        step = runner.start()
+        while step:
+            try:
+                value = await self.run_step_async(step)
+            except Error as e:
+                step = runner.throw(e)
+            else:
+                step = runner.send(value)
+        return runner.get_value()
+
+    def run_step(self, step: Step) -> Any:
+        if isinstance(step, Call):
+            return step.func(*step.args)
+        if step.with_retry:
+            self.run_git_with_retry(step.working_path, *step.args, cleanup=step.cleanup)
+            return None
+        return run_git_captured(step.working_path, *step.args, check=False)
+
+    async def run_step_async(self, step: Step) -> Any:
+        if isinstance(step, Call):
+            return await run_in_thread(step.func, *step.args)
+        if step.with_retry:
+            await retry_async(
+                functools.partial(run_git_async, step.working_path, *step.args),
+                on_retry=self.on_retry,
+                cleanup=step.cleanup,
+            )
+            return None
+        return await run_git_async(step.working_path, *step.args, check=False)
+
+    def on_retry(self, error: GitCommandError, delay: float) -> None:
+        ui.debug(error)
+        self.info_3("Transient error, trying again in", f"{delay:.1f}s")
+
+    def get_host(self, item: T) -> Optional[str]:
+        """Return the host of the git server the item talks to,
+        if any, so that jobs can be limited by host (see tsrc.host_limits)
+        """
+        return None
+
+    @property
+    def trace_category(self) -> str:
+        """Category of the spans recorded for each item (see tsrc.tracing)"""
+        return type(self).__name__
+
     @abc.abstractmethod
     def describe_item(self, item: T) -> str:
         """Return a short description of the item"""
@@ -233,25 +428,326 @@ class Task(Generic[T], metaclass=abc.ABCMeta):
         """
         pass
 
+    async def process_async(self, index: int, count: int, item: T) -> Outcome:
+        """Same as process(), but called by the AsyncioExecutor.
+
+        Daughter classes may override this method to run long git
+        commands with `tsrc.git.run_git_async()`. Note that
+        self.parallel is always True when this method is called.
+        """
+        return await run_in_thread(self.process, index, count, item)
+
+
+class StepsRunner(Generic[U]):
+    """Send the result of each step back into the generator (or raise
+    its error there), and keep the value it returns in the end
+    """
+
+    def __init__(self, steps: Steps[U]) -> None:
+        self.steps = steps
+        self.done = False
+        self.value: Optional[U] = None
+
+    def start(self) -> Optional[Step]:
+        return self.send(None)
+
+    def send(self, result: Any) -> Optional[Step]:
+        """Return the next step, or None once the steps are done"""
+        try:
+            return self.steps.send(result)
+        except StopIteration as stop:
+            self.done = True
+            self.value = stop.value
+            return None
+
+    def throw(self, error: Error) -> Optional[Step]:
+        try:
+            return self.steps.throw(error)
+        except StopIteration as stop:
+            self.done = True
+            self.value = stop.value
+            return None
+
+    def get_value(self) -> U:
+        assert self.done
+        return cast(U, self.value)
+
+
+async def run_in_thread(func: Callable[..., U], *args: Any) -> U:
+    """Run `func` in a worker thread, without blocking the event loop.
+
+    Same as asyncio.to_thread(), which is not available in Python 3.8:
+    the current context is kept, so that spans are recorded on the
+    track of the item being processed (see tsrc.tracing)
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(context.run, func, *args))
+
+
+class FollowUpQueue(Generic[U]):
+    """Process items with `task` as soon as the item they
+    depend on is done, in the order they were given.
+
+    `follow_ups` is a list of (dependency, item) tuples, where
+    `dependency` is the description of the item that must be processed
+    first. Items whose dependency failed are skipped.
+    """
+
+    def __init__(self, task: Task[U], follow_ups: List[Tuple[str, U]]) -> None:
+        self.task = task
+        self.follow_ups = follow_ups
+        self.outcomes: Dict[str, Outcome] = {}
+        self.done: Dict[str, bool] = {}
+        self.next_index = 0
+        # Note: items are processed outside of the lock, by one thread
+        # at a time, so that they are still processed in order. While
+        # this happens, other threads only record their dependency
+        self.processing = False
+        self.lock = Lock()
+
+    def item_done(self, dependency: str, *, success: bool) -> None:
+        ready = self.record(dependency, success=success)
+        while ready:
+            self.process_ready(ready)
+            ready = self.pop_ready()
+
+    async def item_done_async(self, dependency: str, *, success: bool) -> None:
+        """Same as item_done(), except the items are processed in a worker
+        thread, so that the event loop is not blocked
+        """
+        ready = self.record(dependency, success=success)
+        while ready:
+            await run_in_thread(self.process_ready, ready)
+            ready = self.pop_ready()
+
+    def record(self, dependency: str, *, success: bool) -> List[Tuple[int, U]]:
+        """Record that `dependency` is done, and return the items the
+        caller must process, if any
+        """
+        with self.lock:
+            self.done[dependency] = success
+            if self.processing:
+                return []
+            return self._pop_ready()
+
+    def pop_ready(self) -> List[Tuple[int, U]]:
+        """Called once the items returned by record() (or by a previous
+        call) are processed: return the ones that became ready meanwhile
+        """
+        with self.lock:
+            return self._pop_ready()
+
+    def _pop_ready(self) -> List[Tuple[int, U]]:
+        res = []
+        while self.next_index < len(self.follow_ups):
+            dependency, item = self.follow_ups[self.next_index]
+            if dependency not in self.done:
+                break
+            if self.done[dependency]:
+                res.append((self.next_index, item))
+            self.next_index += 1
+        self.processing = bool(res)
+        return res
+
+    def process_ready(self, ready: List[Tuple[int, U]]) -> None:
+        count = len(self.follow_ups)
+        for index, item in ready:
+            item_desc = self.task.describe_item(item)
+            try:
+                outcome = self.task.process(index, count, item)
+            except Error as e:
+                outcome = Outcome.from_error(e)
+            self.outcomes[item_desc] = outcome
+
+
+class TaskChain(Task[T]):
+    """Run several tasks on each item, one after the other, stopping
+    at the first failure.
+
+    `get_steps` returns the tasks to run for a given item, so that
+    some steps can be skipped for some items.
+    """
+
+    def __init__(
+        self,
+        get_steps: Callable[[T], List[Task[T]]],
+        *,
+        description: str,
+        follow_ups: Optional[FollowUpQueue[Any]] = None,
+    ) -> None:
+        self.get_steps = get_steps
+        self.description = description
+        self.follow_ups = follow_ups
+
+    def describe_item(self, item: T) -> str:
+        return self.get_steps(item)[0].describe_item(item)
+
+    def get_host(self, item: T) -> Optional[str]:
+        for step in self.get_steps(item):
+            host = step.get_host(item)
+            if host:
+                return host
+        return None
+
+    def describe_process_start(self, item: T) -> List[ui.Token]:
+        return [self.description, self.describe_item(item)]
+
+    def describe_process_end(self, item: T) -> List[ui.Token]:
+        return [ui.green, "ok", ui.reset, self.describe_item(item)]
+
+    def process(self, index: int, count: int, item: T) -> Outcome:
+        summaries: List[str] = []
+        error = None
+        try:
+            for step in self.get_steps(item):
+                step.parallel = self.parallel
+                outcome = step.process(index, count, item)
+                error = self.collect(outcome, summaries)
+                if error:
+                    break
+        except Error as e:
+            error = e
+        self.item_done(item, success=error is None)
+        return Outcome(error=error, summary="\n".join(summaries) or None)
+
+    async def process_async(self, index: int, count: int, item: T) -> Outcome:
+        summaries: List[str] = []
+        error = None
+        try:
+            for step in self.get_steps(item):
+                step.parallel = self.parallel
+                outcome = await step.process_async(index, count, item)
+                error = self.collect(outcome, summaries)
+                if error:
+                    break
+        except Error as e:
+            error = e
+        await self.item_done_async(item, success=error is None)
+        return Outcome(error=error, summary="\n".join(summaries) or None)
+
+    @staticmethod
+    def collect(outcome: Outcome, summaries: List[str]) -> Optional[Error]:
+        if outcome.summary:
+            summaries.append(outcome.summary)
+        return outcome.error
+
+    def item_done(self, item: T, *, success: bool) -> None:
+        if self.follow_ups:
+            self.follow_ups.task.parallel = self.parallel
+            self.follow_ups.item_done(self.describe_item(item), success=success)
+
+    async def item_done_async(self, item: T, *, success: bool) -> None:
+        if self.follow_ups:
+            self.follow_ups.task.parallel = self.parallel
+            await self.follow_ups.item_done_async(
+                self.describe_item(item), success=success
+            )
+
+
+class HostScheduler(Generic[T]):
+    """Tell which items can be started, so that no host gets more items
+    at the same time than its limit (see tsrc.host_limits).
+
+    Without host limits, every item can be started right away.
+    """
+
+    def __init__(
+        self,
+        task: Task[T],
+        items: List[T],
+        *,
+        num_jobs: int,
+        host_limits: Optional[HostLimits] = None,
+    ) -> None:
+        self.num_jobs = num_jobs
+        self.host_limits = host_limits
+        # number of items not started yet
+        self.pending = len(items)
+        # host -> (index, item) tuples, in the order items should be started
+        self.queues: Dict[Optional[str], Deque[Tuple[int, T]]] = {}
+        for index, item in enumerate(items):
+            host = task.get_host(item) if host_limits else None
+            self.queues.setdefault(host, collections.deque()).append((index, item))
+        # (index of the first item, host) for the hosts that may have room,
+        # so that the items of different hosts are still started in order
+        self.ready = [(queue[0][0], host) for (host, queue) in self.queues.items()]
+        heapq.heapify(self.ready)
+        # hosts that had no room, and the ones that got some back since
+        # Note: release() is called from the worker threads, and
+        # deque.append() is thread-safe
+        self.full: Set[Optional[str]] = set()
+        self.released: Deque[Optional[str]] = collections.deque()
+
+    def pop_ready(self, max_count: int) -> List[Tuple[int, T, Optional[str]]]:
+        """Return at most `max_count` items that can be started now, and take
+        a slot of their host for each of them. Slots must be given back
+        with release() once the items are processed.
+
+        Only the hosts that got a slot back since the last call are looked
+        at again, so callers should only ask for items they start right away.
+        """
+        while self.released:
+            host = self.released.popleft()
+            if host in self.full:
+                self.full.remove(host)
+                heapq.heappush(self.ready, (self.queues[host][0][0], host))
+        res: List[Tuple[int, T, Optional[str]]] = []
+        while self.ready and len(res) < max_count:
+            _, host = heapq.heappop(self.ready)
+            if not self.try_acquire(host):
+                self.full.add(host)
+                continue
+            queue = self.queues[host]
+            index, item = queue.popleft()
+            res.append((index, item, host))
+            if queue:
+                heapq.heappush(self.ready, (queue[0][0], host))
+        self.pending -= len(res)
+        return res
+
+    def try_acquire(self, host: Optional[str]) -> bool:
+        if not self.host_limits or not host:
+            return True
+        return self.host_limits.try_acquire(host, num_jobs=self.num_jobs)
+
+    def use(self, host: Optional[str]) -> ContextManager[None]:
+        if not self.host_limits or not host:
+            return contextlib.nullcontext()
+        return self.host_limits.use(host)
+
+    def release(self, host: Optional[str], seconds: float, *, success: bool) -> None:
+        if self.host_limits and host:
+            self.host_limits.release(host, seconds, success=success)
+            self.released.append(host)
+
 
 class SequentialExecutor(Generic[T]):
     """Run the task on all items one at a time, while collecting errors that
     occur in the process.
     """
 
-    def __init__(self, task: Task[T]) -> None:
+    def __init__(
+        self, task: Task[T], *, durations: Optional[JobDurations] = None
+    ) -> None:
         self.task = task
+        self.durations = durations
 
     def process(self, items: List[T]) -> Dict[str, Outcome]:
         result = {}
         count = len(items)
         for index, item in enumerate(items):
             item_desc = self.task.describe_item(item)
-            try:
-                outcome = self.task.process(index, count, item)
-            except Error as e:
-                ui.error(e)
-                outcome = Outcome.from_error(e)
+            start = time.monotonic()
+            with trace_item(self.task, item_desc) as trace_args:
+                try:
+                    outcome = self.task.process(index, count, item)
+                except Error as e:
+                    ui.error(e)
+                    outcome = Outcome.from_error(e)
+                trace_outcome(trace_args, outcome)
+            if self.durations:
+                self.durations.record(item_desc, time.monotonic() - start)
             result[item_desc] = outcome
         return result
 
@@ -261,34 +757,64 @@ class ParallelExecutor(Generic[T]):
     occur in the process.
     """
 
-    def __init__(self, task: Task[T], num_jobs: int) -> None:
+    def __init__(
+        self,
+        task: Task[T],
+        num_jobs: int,
+        *,
+        durations: Optional[JobDurations] = None,
+        host_limits: Optional[HostLimits] = None,
+    ) -> None:
         self.task = task
         self.num_jobs = num_jobs
+        self.durations = durations
+        self.host_limits = host_limits
         self.done_count = 0
         self.lock = Lock()
 
     def process(self, items: List[T]) -> Dict[str, Outcome]:
         if not items:
             return {}
+        if self.durations:
+            items = self.durations.sort(items, self.task.describe_item)
+        scheduler = HostScheduler(
+            self.task, items, num_jobs=self.num_jobs, host_limits=self.host_limits
+        )
         result = {}
         with ThreadPoolExecutor(max_workers=self.num_jobs) as executor:
             count = len(items)
-            futures_to_item = {
-                executor.submit(self.process_item, index, count, item): item
-                for (index, item) in enumerate(items)
-            }
-            for future in as_completed(futures_to_item):
-                item = futures_to_item[future]
-                item_desc = self.task.describe_item(item)
-                try:
-                    outcome = future.result()
-                except Error as e:
-                    outcome = Outcome.from_error(e)
-                result[item_desc] = outcome
+            futures_to_item: "Dict[Future[Outcome], T]" = {}
+            while scheduler.pending or futures_to_item:
+                # Note: items are only submitted when a worker is free to
+                # start them, so that they do not hold a slot of their host
+                # while waiting in the queue of the pool. Items whose host is
+                # busy wait for an item of the same host to be done
+                max_count = self.num_jobs - len(futures_to_item)
+                for index, item, host in scheduler.pop_ready(max_count):
+                    future = executor.submit(
+                        self.process_item, scheduler, index, count, item, host
+                    )
+                    futures_to_item[future] = item
+                done, _ = wait(futures_to_item, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = futures_to_item.pop(future)
+                    item_desc = self.task.describe_item(item)
+                    try:
+                        outcome = future.result()
+                    except Error as e:
+                        outcome = Outcome.from_error(e)
+                    result[item_desc] = outcome
         erase_last_line()
         return result
 
-    def process_item(self, index: int, count: int, item: T) -> Outcome:
+    def process_item(
+        self,
+        scheduler: HostScheduler[T],
+        index: int,
+        count: int,
+        item: T,
+        host: Optional[str],
+    ) -> Outcome:
         # We want to keep all output when processing items it parallel on just
         # one line (like ninja-build)
         #
@@ -300,7 +826,19 @@ class ParallelExecutor(Generic[T]):
                 erase_last_line()
                 ui.info_count(index, count, *tokens, end="\r")
 
-        result = self.task.process(index, count, item)
+        start = time.monotonic()
+        item_desc = self.task.describe_item(item)
+        success = False
+        try:
+            with trace_item(self.task, item_desc, host) as trace_args:
+                with scheduler.use(host):
+                    result = self.task.process(index, count, item)
+                trace_outcome(trace_args, result)
+            success = result.success()
+        finally:
+            scheduler.release(host, time.monotonic() - start, success=success)
+        if self.durations:
+            self.durations.record(item_desc, time.monotonic() - start)
 
         # Note: we don't know if tasks will be finished in the same order
         # they were started, so to keep the output relevant, we need a
@@ -318,25 +856,177 @@ class ParallelExecutor(Generic[T]):
         return result
 
 
+class AsyncioExecutor(Generic[T]):
+    """Run the tasks from an event loop, with at most `n` tasks
+    being processed at the same time, while collecting errors that
+    occur in the process.
+    """
+
+    def __init__(
+        self,
+        task: Task[T],
+        num_jobs: int,
+        *,
+        durations: Optional[JobDurations] = None,
+        host_limits: Optional[HostLimits] = None,
+    ) -> None:
+        self.task = task
+        self.num_jobs = num_jobs
+        self.durations = durations
+        self.host_limits = host_limits
+        self.done_count = 0
+        # Note: only used to display items processed at the same
+        # time on different tracks (see tsrc.tracing)
+        self.free_slots = list(range(num_jobs, 0, -1))
+
+    def process(self, items: List[T]) -> Dict[str, Outcome]:
+        if not items:
+            return {}
+        if self.durations:
+            items = self.durations.sort(items, self.task.describe_item)
+        result = asyncio.run(self.process_all(items))
+        erase_last_line()
+        return result
+
+    async def process_all(self, items: List[T]) -> Dict[str, Outcome]:
+        # Note: worker threads are only used by the tasks (or the parts
+        # of the tasks) that do not implement process_async(), and they
+        # are only started when needed
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.num_jobs))
+        scheduler = HostScheduler(
+            self.task, items, num_jobs=self.num_jobs, host_limits=self.host_limits
+        )
+        count = len(items)
+        running: "Dict[asyncio.Future[Tuple[str, Outcome]], int]" = {}
+        results: Dict[int, Tuple[str, Outcome]] = {}
+        while scheduler.pending or running:
+            # Note: at most `num_jobs` items are processed at the same time
+            max_count = self.num_jobs - len(running)
+            for index, item, host in scheduler.pop_ready(max_count):
+                coroutine = self.process_item(scheduler, index, count, item, host)
+                running[asyncio.ensure_future(coroutine)] = index
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                results[running.pop(future)] = future.result()
+        # Note: keep the order of the items
+        return dict(results[index] for index in sorted(results))
+
+    async def process_item(
+        self,
+        scheduler: HostScheduler[T],
+        index: int,
+        count: int,
+        item: T,
+        host: Optional[str],
+    ) -> Tuple[str, Outcome]:
+        # Note: everything but Task.process_async() runs in the thread of the
+        # event loop, so no lock is needed to keep the output on one line
+        tokens = self.task.describe_process_start(item)
+        if tokens:
+            erase_last_line()
+            ui.info_count(index, count, *tokens, end="\r")
+
+        start = time.monotonic()
+        item_desc = self.task.describe_item(item)
+        slot = self.free_slots.pop()
+        with set_track(f"slot {slot}"):
+            with trace_item(self.task, item_desc, host) as trace_args:
+                try:
+                    with scheduler.use(host):
+                        outcome = await self.task.process_async(index, count, item)
+                except Error as e:
+                    outcome = Outcome.from_error(e)
+                trace_outcome(trace_args, outcome)
+        self.free_slots.append(slot)
+        scheduler.release(host, time.monotonic() - start, success=outcome.success())
+        if self.durations:
+            self.durations.record(item_desc, time.monotonic() - start)
+
+        self.done_count += 1
+        tokens = self.task.describe_process_end(item)
+        if tokens:
+            erase_last_line()
+            ui.info_count(self.done_count - 1, count, *tokens, end="\r")
+            if self.done_count == count:
+                ui.info()
+
+        return self.task.describe_item(item), outcome
+
+
+def trace_item(
+    task: Task[Any], item_desc: str, host: Optional[str] = None
+) -> ContextManager[Dict[str, Any]]:
+    if host:
+        return span(item_desc, category=task.trace_category, host=host)
+    return span(item_desc, category=task.trace_category)
+
+
+def trace_outcome(trace_args: Dict[str, Any], outcome: Outcome) -> None:
+    if outcome.error:
+        trace_args["error"] = str(outcome.error)
+
+
+def get_executor_backend() -> str:
+    """Return the name of the executor to use when running
+    tasks in parallel: 'threads' (the default) or 'asyncio'.
+    """
+    value = os.environ.get("TSRC_EXECUTOR", "threads")
+    if value not in ("threads", "asyncio"):
+        raise ExecutorFailed(
+            f"Invalid TSRC_EXECUTOR value: '{value}' (expected 'threads' or 'asyncio')"
+        )
+    return value
+
+
 def process_items(
-    items: List[T], task: Task[T], *, num_jobs: int = 1
+    items: List[T],
+    task: Task[T],
+    *,
+    num_jobs: int = 1,
+    durations: Optional[JobDurations] = None,
+    host_limits: Optional[HostLimits] = None,
 ) -> OutcomeCollection:
-    if num_jobs > 1:
-        res = process_items_parallel(items, task, num_jobs=num_jobs)
-    else:
-        res = process_items_sequence(items, task)
+    with span(type(task).__name__, category="process_items", num_jobs=num_jobs):
+        if num_jobs > 1:
+            res = process_items_parallel(
+                items,
+                task,
+                num_jobs=num_jobs,
+                durations=durations,
+                host_limits=host_limits,
+            )
+        else:
+            res = process_items_sequence(items, task, durations=durations)
+    if durations:
+        durations.save()
     return OutcomeCollection(res)
 
 
 def process_items_parallel(
-    items: List[T], task: Task[T], *, num_jobs: int
+    items: List[T],
+    task: Task[T],
+    *,
+    num_jobs: int,
+    durations: Optional[JobDurations] = None,
+    host_limits: Optional[HostLimits] = None,
 ) -> Dict[str, Outcome]:
     task.parallel = True
-    executor = ParallelExecutor(task, num_jobs=num_jobs)
+    executor: Union[ParallelExecutor[T], AsyncioExecutor[T]]
+    if get_executor_backend() == "asyncio":
+        executor = AsyncioExecutor(
+            task, num_jobs=num_jobs, durations=durations, host_limits=host_limits
+        )
+    else:
+        executor = ParallelExecutor(
+            task, num_jobs=num_jobs, durations=durations, host_limits=host_limits
+        )
     return executor.process(items)
 
 
-def process_items_sequence(items: List[T], task: Task[T]) -> Dict[str, Outcome]:
+def process_items_sequence(
+    items: List[T], task: Task[T], *, durations: Optional[JobDurations] = None
+) -> Dict[str, Outcome]:
     task.parallel = False
-    executor = SequentialExecutor(task)
+    executor = SequentialExecutor(task, durations=durations)
     return executor.process(items)
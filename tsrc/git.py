@@ -1,13 +1,21 @@
 """ git tools """
 
+import asyncio
+import codecs
+import contextlib
 import os
 import subprocess
+import sys
+import time
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 
 import cli_ui as ui
 
 from tsrc.errors import Error
+from tsrc.git_stats import STATS, get_command_name
+from tsrc.gitfs import GitDir, is_sha1
+from tsrc.tracing import span
 
 UP = ui.Symbol("↑", "+").as_string
 DOWN = ui.Symbol("↓", "-").as_string
@@ -25,10 +33,13 @@ class GitCommandError(GitError):
         *,
         output: Optional[str] = None,
         error: Optional[str] = None,
+        returncode: Optional[int] = None,
     ) -> None:
         self.cmd = cmd
         self.working_path = working_path
         self.output = output
+        self.error = error
+        self.returncode = returncode
         cmd_str = " ".join(cmd)
         message = f"`git {cmd_str}` from {working_path} failed"
         if output:
@@ -222,31 +233,76 @@ class GitStatus:
         self.dirty = False
         self.tag: Optional[str] = None
         self.branch: Optional[str] = None
+        self.upstream: Optional[str] = None
         self.sha1: Optional[str] = None
         self.sha1_full: Optional[str] = None
 
-    def update(self) -> None:
-        # Try and gather as many information about the git repository as
-        # possible.
-        try:
-            self.update_sha1()
-        except GitCommandError:
+    def update(self, *, with_tag: bool = True) -> None:
+        # Gather branch, HEAD, upstream position and worktree state
+        # using a single `git status` call. Looking for tags requires
+        # another process, so only do it when asked to.
+        rc, out = run_git_captured(
+            self.working_path,
+            "status",
+            "--porcelain=v2",
+            "--branch",
+            "-z",
+            check=False,
+        )
+        if rc != 0:
             self.empty = True
             return
-        self.update_branch()
-        self.update_tag()
-        self.update_remote_status()
-        self.update_worktree_status()
-
-    def update_sha1(self) -> None:
-        self.sha1_full = get_sha1(self.working_path, short=False)
-        self.sha1 = self.sha1_full[:7]
+        self.update_from_porcelain(out)
+        if self.empty:
+            return
+        self.disambiguate_branch()
+        if with_tag:
+            self.update_tag()
+
+    def update_from_porcelain(self, output: str) -> None:
+        """Parse the output of `git status --porcelain=v2 --branch -z`"""
+        records = iter(output.split("\0"))
+        for record in records:
+            if record.startswith("# "):
+                self._update_from_header(record[2:])
+            elif record.startswith("2 "):
+                # renamed and copied entries are followed by the original path
+                next(records, None)
+                self._update_from_entry(record[2:4])
+            elif record.startswith(("1 ", "u ")):
+                self._update_from_entry(record[2:4])
+            elif record.startswith("? "):
+                self.untracked += 1
+                self.dirty = True
 
-    def update_branch(self) -> None:
-        try:
-            self.branch = get_current_branch(self.working_path)
-        except GitError:
-            pass
+    def _update_from_header(self, header: str) -> None:
+        key, _, value = header.partition(" ")
+        if key == "branch.oid":
+            if value == "(initial)":
+                self.empty = True
+            else:
+                self.sha1_full = value
+                self.sha1 = value[:7]
+        elif key == "branch.head":
+            if value != "(detached)":
+                self.branch = value
+        elif key == "branch.upstream":
+            self.upstream = value
+        elif key == "branch.ab":
+            ahead, behind = value.split()
+            self.ahead = int(ahead[1:])
+            self.behind = int(behind[1:])
+
+    def _update_from_entry(self, xy: str) -> None:
+        index_state = xy[0]
+        worktree_state = xy[1]
+        if index_state == "A":
+            self.added += 1
+        elif index_state != ".":
+            self.staged += 1
+        if worktree_state != ".":
+            self.not_staged += 1
+        self.dirty = True
 
     def update_tag(self) -> None:
         try:
@@ -254,35 +310,23 @@ class GitStatus:
         except GitError:
             pass
 
-    def update_remote_status(self) -> None:
-        rc, ahead_rev = run_git_captured(
-            self.working_path, "rev-list", "@{upstream}..HEAD", check=False
-        )
-        if rc == 0:
-            self.ahead = len(ahead_rev.splitlines())
-
-        rc, behind_rev = run_git_captured(
-            self.working_path, "rev-list", "HEAD..@{upstream}", check=False
-        )
-        if rc == 0:
-            self.behind = len(behind_rev.splitlines())
-
-    def update_worktree_status(self) -> None:
-        _, out = run_git_captured(self.working_path, "status", "--porcelain")
-
-        for line in out.splitlines():
-            if line.startswith("??"):
-                self.untracked += 1
-                self.dirty = True
-            if line.startswith(" M"):
-                self.staged += 1
-                self.dirty = True
-            if line.startswith(" .M"):
-                self.not_staged += 1
-                self.dirty = True
-            if line.startswith("A "):
-                self.added += 1
-                self.dirty = True
+    def disambiguate_branch(self) -> None:
+        # Note: `git rev-parse --abbrev-ref HEAD` refers to a branch that
+        # has the same name as a tag by 'heads/<branch>', and other parts
+        # of tsrc rely on that
+        if not self.branch:
+            return
+        git_dir = GitDir.find(self.working_path)
+        short_name = None
+        if git_dir:
+            short_name = git_dir.shorten_ref(f"refs/heads/{self.branch}")
+        if short_name:
+            self.branch = short_name
+        else:
+            try:
+                self.branch = get_current_branch(self.working_path)
+            except GitError:
+                pass
 
     def describe(self) -> List[ui.Token]:
         """Return a list of tokens suitable for ui.info."""
@@ -372,33 +416,93 @@ def get_git_cmd(*args: str) -> List[str]:
     return git_cmd
 
 
+@contextlib.contextmanager
+def record_git_call(working_path: Path, cmd: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    """Record the git command run in the `with` block, for `--stats`
+    (see tsrc.git_stats) and `--trace` (see tsrc.tracing).
+
+    Yield the arguments of the trace span, where the caller
+    should set "returncode".
+    """
+    cmd = list(cmd)
+    start = time.perf_counter()
+    with span(
+        f"git {get_command_name(cmd)}",
+        category="git",
+        cmd=" ".join(cmd),
+        working_path=str(working_path),
+    ) as args:
+        try:
+            yield args
+        finally:
+            STATS.record(working_path, cmd, time.perf_counter() - start)
+
+
 def run_git(
     working_path: Path,
     *cmd: str,
     check: bool = True,
     show_output: bool = True,
     show_cmd: bool = True,
+    keep_error: bool = False,
 ) -> None:
     """Run git `cmd` in given `working_path`.
 
     Raise GitCommandError if return code is non-zero and `check` is True.
+
+    When `show_output` and `keep_error` are True, the error output is
+    still displayed, but also kept in the GitCommandError, so that
+    it can be looked at (see tsrc.retry)
     """
     git_cmd = get_git_cmd(*cmd)
 
     if show_cmd:
         ui.info(ui.blue, "$", ui.reset, *git_cmd)
-    if show_output:
-        process = subprocess.run(git_cmd, cwd=working_path, universal_newlines=True)
-    else:
-        process = subprocess.run(
-            git_cmd,
-            cwd=working_path,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-        )
+    error = None
+    process: "subprocess.CompletedProcess[str]"
+    with record_git_call(working_path, cmd) as trace_args:
+        if show_output and keep_error:
+            with subprocess.Popen(
+                git_cmd, cwd=working_path, stderr=subprocess.PIPE
+            ) as popen:
+                assert popen.stderr
+                error = tee(popen.stderr, sys.stderr)
+            process = subprocess.CompletedProcess(git_cmd, popen.returncode)
+        elif show_output:
+            process = subprocess.run(git_cmd, cwd=working_path, universal_newlines=True)
+        else:
+            process = subprocess.run(
+                git_cmd,
+                cwd=working_path,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+            )
+        trace_args["returncode"] = process.returncode
     if process.returncode != 0 and check:
-        raise GitCommandError(working_path, cmd, output=process.stdout)
+        raise GitCommandError(
+            working_path,
+            cmd,
+            output=process.stdout,
+            error=error,
+            returncode=process.returncode,
+        )
+
+
+def tee(stream: IO[bytes], destination: TextIO) -> str:
+    """Copy everything read from `stream` to `destination` as it comes,
+    and return it
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    res = []
+    while True:
+        chunk = os.read(stream.fileno(), 4096)
+        text = decoder.decode(chunk, final=not chunk)
+        destination.write(text)
+        destination.flush()
+        res.append(text)
+        if not chunk:
+            return "".join(res)
 
 
 def run_git_captured(
@@ -419,18 +523,59 @@ def run_git_captured(
     options["text"] = True
 
     ui.debug(ui.lightgray, working_path, "$", ui.reset, *git_cmd)
-    process = subprocess.Popen(git_cmd, cwd=working_path, **options)
-    out, err = process.communicate()
+    with record_git_call(working_path, cmd) as trace_args:
+        process = subprocess.Popen(git_cmd, cwd=working_path, **options)
+        out, err = process.communicate()
+        trace_args["returncode"] = process.returncode
     if out.endswith("\n"):
         out = out.strip("\n")
     returncode = process.returncode
     ui.debug(ui.lightgray, "[", returncode, "]", ui.reset, out)
     if check and returncode != 0:
-        raise GitCommandError(working_path, cmd, output=out, error=err)
+        raise GitCommandError(
+            working_path, cmd, output=out, error=err, returncode=returncode
+        )
+    return returncode, out
+
+
+async def run_git_async(
+    working_path: Path, *cmd: str, check: bool = True
+) -> Tuple[int, str]:
+    """Same as run_git_captured, but without blocking the event loop
+    while git is running.
+
+    Standard error is merged into the output, which is what
+    tasks running in parallel expect.
+    """
+    assert_working_path(working_path)
+    git_cmd = get_git_cmd(*cmd)
+
+    ui.debug(ui.lightgray, working_path, "$", ui.reset, *git_cmd)
+    with record_git_call(working_path, cmd) as trace_args:
+        process = await asyncio.create_subprocess_exec(
+            *git_cmd,
+            cwd=working_path,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+        out_bytes, _ = await process.communicate()
+        trace_args["returncode"] = process.returncode
+    out = out_bytes.decode(errors="replace").strip("\n")
+    returncode = process.returncode
+    assert returncode is not None
+    ui.debug(ui.lightgray, "[", returncode, "]", ui.reset, out)
+    if check and returncode != 0:
+        raise GitCommandError(working_path, cmd, output=out, returncode=returncode)
     return returncode, out
 
 
 def get_sha1(working_path: Path, short: bool = False, ref: str = "HEAD") -> str:
+    if ref == "HEAD" and not short:
+        git_dir = GitDir.find(working_path)
+        if git_dir:
+            sha1 = git_dir.resolve_ref("HEAD")
+            if sha1:
+                return sha1
     cmd = ["rev-parse"]
     if short:
         cmd.append("--short")
@@ -440,6 +585,17 @@ def get_sha1(working_path: Path, short: bool = False, ref: str = "HEAD") -> str:
 
 
 def get_current_branch(working_path: Path) -> str:
+    git_dir = GitDir.find(working_path)
+    if git_dir:
+        head = git_dir.read_head()
+        head_branch = git_dir.head_branch()
+        if head_branch and head_branch.startswith("refs/heads/"):
+            if git_dir.ref_exists(head_branch):
+                short_name = git_dir.shorten_ref(head_branch)
+                if short_name:
+                    return short_name
+        elif head and is_sha1(head):
+            raise GitError("Not an any branch")
     cmd = ("rev-parse", "--abbrev-ref", "HEAD")
     _, output = run_git_captured(working_path, *cmd)
     if output == "HEAD":
@@ -479,9 +635,9 @@ def git_reset(repo: Path, ref: str) -> None:
     run_git(repo, "reset", "--hard", ref)
 
 
-def get_git_status(working_path: Path) -> GitStatus:
+def get_git_status(working_path: Path, *, with_tag: bool = True) -> GitStatus:
     status = GitStatus(working_path)
-    status.update()
+    status.update(with_tag=with_tag)
     return status
 
 
@@ -496,11 +652,18 @@ def get_git_bare_status(
 def is_git_repository(working_path: Path) -> bool:
     if not working_path.is_dir():
         return False
+    if GitDir.find(working_path):
+        return True
     rc, _ = run_git_captured(working_path, "rev-parse", "--git-dir", check=False)
     return rc == 0
 
 
 def get_tracking_ref(working_path: Path) -> Optional[str]:
+    git_dir = GitDir.find(working_path)
+    if git_dir:
+        tracking_ref = git_dir.tracking_ref()
+        if tracking_ref:
+            return tracking_ref
     # fmt: off
     rc, out = run_git_captured(
         working_path,
@@ -516,6 +679,17 @@ def get_tracking_ref(working_path: Path) -> Optional[str]:
 
 
 def is_shallow(working_path: Path) -> bool:
+    git_dir = GitDir.find(working_path)
+    if git_dir:
+        return git_dir.is_shallow()
     root = get_repo_root(working_path)
     res = (root / ".git/shallow").exists()
     return res
+
+
+def has_commit(working_path: Path, sha1: str) -> bool:
+    """Return True if the commit is present in the repository"""
+    rc, _ = run_git_captured(
+        working_path, "cat-file", "-e", f"{sha1}^{{commit}}", check=False
+    )
+    return rc == 0
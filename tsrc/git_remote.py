@@ -9,12 +9,14 @@ This is pariculary useful for Manifest-related
 checks.
 """
 
+import os
 from pathlib import Path
 from sys import platform
-from typing import List, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 from urllib.parse import quote, urlparse
 
 from tsrc.git import run_git_captured
+from tsrc.gitfs import GitConfig, GitDir, get_config_value, map_refspecs
 from tsrc.repo import Remote
 
 
@@ -34,12 +36,9 @@ class GitRemote:
         # obtain information about configured 'remotes'
         # in 'GitStatus' obtaining such information
         # is not useful as remotes are stored in Manifest
-        _, out = run_git_captured(self.working_path, "remote")
-        for line in out.splitlines():
-            _, url = run_git_captured(self.working_path, "remote", "get-url", line)
-            if line and url:
-                tmp_r = Remote(name=line, url=url)
-                self.remotes.append(tmp_r)
+        for name, url in get_remote_urls(self.working_path).items():
+            if name and url:
+                self.remotes.append(Remote(name=name, url=url))
 
     def update_upstreamed(self) -> None:
         use_branch = self.branch
@@ -51,17 +50,124 @@ class GitRemote:
             # skip check if upstreamed when there is no branch
             return
 
-        rc, _ = run_git_captured(
-            self.working_path,
-            "config",
-            "--get",
-            f"branch.{use_branch}.remote",
-            check=False,
-        )
+        key = f"branch.{use_branch}.remote"
+        git_dir = GitDir.find(self.working_path)
+        if git_dir:
+            config = git_dir.read_config()
+            if config and get_config_value(config, key):
+                self.upstreamed = True
+                return
+
+        rc, _ = run_git_captured(self.working_path, "config", "--get", key, check=False)
         if rc == 0:
             self.upstreamed = True
 
 
+def get_remote_urls(working_path: Path) -> Dict[str, str]:
+    """Return the URL of every remote of the repo, by name,
+    in the order they are configured.
+
+    Read `.git/config` directly when possible, or run a single
+    `git config` command otherwise.
+
+    Note: like the config file, the URLs are not rewritten
+    according to `url.<base>.insteadOf` settings.
+    """
+    git_dir = GitDir.find(working_path)
+    if git_dir:
+        config = git_dir.read_config()
+        if config is not None:
+            return _get_remote_urls_from_config(config)
+    rc, out = run_git_captured(
+        working_path, "config", "--get-regexp", r"^remote\..*\.url$", check=False
+    )
+    res: Dict[str, str] = {}
+    if rc != 0:
+        return res
+    for line in out.splitlines():
+        key, _, url = line.partition(" ")
+        res[key[len("remote.") : -len(".url")]] = url
+    return res
+
+
+def _get_remote_urls_from_config(config: GitConfig) -> Dict[str, str]:
+    res: Dict[str, str] = {}
+    for key in config:
+        if key.startswith("remote.") and key.endswith(".url"):
+            url = get_config_value(config, key)
+            if url:
+                res[key[len("remote.") : -len(".url")]] = url
+    return res
+
+
+def add_remotes_to_config(working_path: Path, remotes: List[Remote]) -> bool:
+    """Add several remotes at once, the same way `git remote add` does,
+    by appending to `.git/config`.
+
+    Return False if this could not be done (for instance because another
+    git process is writing the config), in which case the caller should
+    use `git remote add` instead.
+    """
+    git_dir = GitDir.find(working_path)
+    if not git_dir:
+        return False
+    config = git_dir.read_config()
+    if config is None:
+        return False
+    contents = _format_remotes(config, remotes)
+    if contents is None:
+        return False
+    return _append_to_config(git_dir, contents)
+
+
+def _format_remotes(config: GitConfig, remotes: List[Remote]) -> Optional[str]:
+    res = ""
+    for remote in remotes:
+        if not _is_plain_config_value(remote.name) or not remote.name:
+            return None
+        # Note: let `git remote add` deal with leftovers of removed remotes
+        if any(x.startswith(f"remote.{remote.name}.") for x in config):
+            return None
+        res += f'[remote "{remote.name}"]\n'
+        res += f"\turl = {_quote_config_value(remote.url)}\n"
+        res += f"\tfetch = +refs/heads/*:refs/remotes/{remote.name}/*\n"
+    return res
+
+
+def _append_to_config(git_dir: GitDir, contents: str) -> bool:
+    config_path = git_dir.common_path / "config"
+    # Note: use the same lock file as git does, so that we never
+    # overwrite changes made concurrently by git
+    lock_path = git_dir.common_path / "config.lock"
+    try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+    except OSError:
+        return False
+    try:
+        with os.fdopen(fd, "w") as lock:
+            previous = config_path.read_text()
+            if previous and not previous.endswith("\n"):
+                previous += "\n"
+            lock.write(previous + contents)
+        os.replace(lock_path, config_path)
+    except OSError:
+        lock_path.unlink(missing_ok=True)
+        return False
+    return True
+
+
+def _is_plain_config_value(value: str) -> bool:
+    return not any(x in value for x in ('"', "\\", "\n"))
+
+
+def _quote_config_value(value: str) -> str:
+    if not _is_plain_config_value(value) or any(x in value for x in "#; \t"):
+        escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+        escaped = escaped.replace("\n", "\\n")
+        return f'"{escaped}"'
+    return value
+
+
 def remote_urls_are_same(url_1: str, url_2: str) -> bool:
     """
     return True if provided URLs are the same
@@ -124,6 +230,77 @@ def remote_branch_exist(url: str, branch: str) -> int:
     return rc
 
 
+def parse_ls_remote(output: str) -> Dict[str, str]:
+    """Return the refs listed by `git ls-remote`, and their sha1.
+    Peeled tags ('<tag>^{}' lines) are skipped.
+    """
+    res: Dict[str, str] = {}
+    for line in output.splitlines():
+        sha1, _, ref_name = line.partition("\t")
+        if not ref_name or ref_name.endswith("^{}"):
+            continue
+        res[ref_name] = sha1
+    return res
+
+
+def remote_refs_are_fetched(
+    working_path: Path,
+    remote_name: str,
+    remote_refs: Dict[str, str],
+    *,
+    prune: bool = True,
+) -> bool:
+    """Return True if `git fetch --tags --prune <remote_name>` would
+    not change anything, given the refs the remote has (as returned by
+    parse_ls_remote()).
+
+    This means that every branch and tag of the remote is already known
+    locally with the same sha1, and (if `prune` is True) that there
+    is no remote-tracking branch left to prune.
+
+    When in doubt, return False.
+    """
+    git_dir = GitDir.find(working_path)
+    if not git_dir:
+        return False
+    config = git_dir.read_config()
+    if not config:
+        return False
+    refspecs = config.get(f"remote.{remote_name}.fetch", [])
+    if not refspecs:
+        return False
+
+    expected = _get_fetched_refs(refspecs, remote_refs)
+    for local_ref, sha1 in expected.items():
+        if git_dir.resolve_ref(local_ref) != sha1:
+            return False
+
+    if not prune:
+        return True
+    # Note: HEAD of the remote is a symbolic ref that `git fetch --prune`
+    # leaves alone
+    prefix = f"refs/remotes/{remote_name}/"
+    for local_ref in git_dir.list_refs(prefix):
+        if local_ref not in expected and local_ref != f"{prefix}HEAD":
+            return False
+    return True
+
+
+def _get_fetched_refs(
+    refspecs: List[str], remote_refs: Dict[str, str]
+) -> Dict[str, str]:
+    """Return the local refs `git fetch --tags` stores the remote refs to"""
+    res: Dict[str, str] = {}
+    for ref_name, sha1 in remote_refs.items():
+        if ref_name.startswith("refs/tags/"):
+            res[ref_name] = sha1
+            continue
+        local_ref = map_refspecs(refspecs, ref_name)
+        if local_ref:
+            res[local_ref] = sha1
+    return res
+
+
 def get_git_remotes(working_path: Path, cur_branch: str) -> GitRemote:
     remotes = GitRemote(working_path, cur_branch)
     remotes.update()
@@ -0,0 +1,128 @@
+"""
+Git statistics
+
+Every git process spawned by tsrc.git is recorded here, along with
+the repo it ran in and how long it took, so that `tsrc --stats` can
+tell how many git processes a command spawned, and where the time
+went.
+
+Tests use this too, to make sure commands do not spawn more git
+processes per repo than they used to (see tsrc.test.helpers.git_calls).
+"""
+
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Dict, Sequence, Tuple
+
+import cli_ui as ui
+
+# Options of the `git` command itself that take a value
+GIT_OPTIONS_WITH_VALUE = ["-c", "-C"]
+
+# Number of calls, and total duration in seconds
+Totals = Tuple[int, float]
+
+
+def get_command_name(cmd: Sequence[str]) -> str:
+    """Return the git sub-command (like 'fetch' or 'status') of
+    the given arguments
+    """
+    args = iter(cmd)
+    for arg in args:
+        if arg in GIT_OPTIONS_WITH_VALUE:
+            next(args, None)
+        elif not arg.startswith("-"):
+            return arg
+    return "git"
+
+
+class GitStats:
+    """Usage:
+
+    >>> STATS.clear()
+    >>> run_git(repo_path, "fetch")  # recorded in STATS
+    >>> STATS.by_repo()
+    {PosixPath('/path/to/repo'): (1, 0.42)}
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        # Note: only totals are kept, as `tsrc daemon` runs git
+        # for as long as it is running
+        self.totals: Dict[Tuple[Path, str], Totals] = {}
+
+    def clear(self) -> None:
+        with self.lock:
+            self.totals = {}
+
+    def record(self, working_path: Path, cmd: Sequence[str], seconds: float) -> None:
+        key = (working_path, get_command_name(cmd))
+        with self.lock:
+            count, total = self.totals.get(key, (0, 0.0))
+            self.totals[key] = (count + 1, total + seconds)
+
+    def by_command(self) -> Dict[str, Totals]:
+        return self._group(lambda working_path, command: command)
+
+    def by_repo(self) -> Dict[Path, Totals]:
+        return self._group(lambda working_path, command: working_path)
+
+    def _group(self, get_key: Callable[[Path, str], Any]) -> Dict[Any, Totals]:
+        res: Dict[Any, Totals] = {}
+        with self.lock:
+            totals = list(self.totals.items())
+        for (working_path, command), (count, seconds) in totals:
+            key = get_key(working_path, command)
+            previous_count, previous_seconds = res.get(key, (0, 0.0))
+            res[key] = (previous_count + count, previous_seconds + seconds)
+        return res
+
+    def report(self) -> None:
+        """Display the number of calls and the time spent in git,
+        by command and by repo, slowest first
+        """
+        by_command = self.by_command()
+        ui.info_1(
+            "Git statistics:",
+            ui.bold,
+            sum(count for (count, _) in by_command.values()),
+            "call(s),",
+            format_seconds(sum(seconds for (_, seconds) in by_command.values())),
+        )
+        if not by_command:
+            return
+        ui.info_2("By command")
+        display_totals(by_command)
+        ui.info_2("By repo")
+        display_totals({display_path(k): v for (k, v) in self.by_repo().items()})
+
+
+def format_seconds(seconds: float) -> str:
+    return f"{seconds:.3f}s"
+
+
+def display_path(path: Path) -> str:
+    try:
+        relative = os.path.relpath(path)
+    except ValueError:
+        # Note: paths on different drives, on Windows
+        return str(path)
+    return str(path) if relative.startswith("..") else relative
+
+
+def display_totals(totals: Dict[str, Totals]) -> None:
+    width = max(len(x) for x in totals)
+    for name, (count, seconds) in sorted(totals.items(), key=lambda x: -x[1][1]):
+        ui.info(
+            ui.green,
+            "*",
+            ui.reset,
+            name.ljust(width),
+            str(count).rjust(5),
+            "call(s)",
+            format_seconds(seconds).rjust(9),
+        )
+
+
+STATS = GitStats()
@@ -0,0 +1,431 @@
+"""
+Git FS
+
+In-process reader for the few files under `.git` that
+hot queries need: HEAD, loose refs, `packed-refs`, the
+repository's `config` and the list of paths in the index.
+
+Reading those files is much faster than forking a git
+process, especially on network file systems. However,
+this reader only knows about the common cases: whenever
+it returns None, the answer is unknown and the caller
+should fall back to running git.
+"""
+
+import os
+import re
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+SHA1_RE = re.compile(r"^([0-9a-f]{40}|[0-9a-f]{64})$")
+
+# Maximum number of symbolic refs to follow, same as git
+MAX_SYMREF_DEPTH = 5
+
+GitConfig = Dict[str, List[str]]
+
+# (path, mode) of an entry of the index
+IndexEntry = Tuple[str, int]
+
+# Mode of the index entries for submodules
+GITLINK_MODE = 0o160000
+
+
+def is_sha1(value: str) -> bool:
+    return SHA1_RE.match(value) is not None
+
+
+class GitDir:
+    """Represent the `.git` directory of a working tree.
+
+    `path` is where HEAD is stored, `common_path` is where refs,
+    `packed-refs` and `config` are stored. They are different
+    for worktrees created with `git worktree add`.
+
+    Usage:
+    >>> git_dir = GitDir.find(repo_path)
+    >>> if git_dir:
+    ...    sha1 = git_dir.resolve_ref("HEAD")
+    """
+
+    def __init__(self, path: Path, common_path: Path) -> None:
+        self.path = path
+        self.common_path = common_path
+
+    @classmethod
+    def find(cls, working_path: Path) -> Optional["GitDir"]:
+        """Return the GitDir of a working tree, following `gitdir:`
+        indirections used by worktrees and submodules.
+        """
+        dot_git = working_path / ".git"
+        try:
+            if dot_git.is_dir():
+                git_path = dot_git
+            elif dot_git.is_file():
+                contents = dot_git.read_text().strip()
+                if not contents.startswith("gitdir:"):
+                    return None
+                git_path = working_path / contents[len("gitdir:") :].strip()
+            else:
+                return None
+            common_path = git_path
+            commondir_path = git_path / "commondir"
+            if commondir_path.is_file():
+                common_path = git_path / commondir_path.read_text().strip()
+            if not (git_path / "HEAD").is_file():
+                return None
+        except OSError:
+            return None
+        if (common_path / "reftable").is_dir():
+            # refs are stored in a binary format we do not know how to read
+            return None
+        return cls(git_path, common_path)
+
+    def read_head(self) -> Optional[str]:
+        """Return the contents of HEAD: either a sha1, or
+        'ref: <refname>' when a branch is checked out.
+        """
+        return _read_stripped(self.path / "HEAD")
+
+    def head_branch(self) -> Optional[str]:
+        """Return the full name of the branch HEAD points to, if any"""
+        head = self.read_head()
+        if head and head.startswith("ref: "):
+            return head[len("ref: ") :]
+        return None
+
+    def resolve_ref(self, ref_name: str) -> Optional[str]:
+        """Return the sha1 a full ref name (or HEAD) points to,
+        following symbolic refs.
+        """
+        for _ in range(MAX_SYMREF_DEPTH):
+            value = self._read_ref(ref_name)
+            if value is None:
+                return None
+            if not value.startswith("ref: "):
+                if is_sha1(value):
+                    return value
+                return None
+            ref_name = value[len("ref: ") :]
+        return None
+
+    def ref_exists(self, ref_name: str) -> bool:
+        return self._read_ref(ref_name) is not None
+
+    def _read_ref(self, ref_name: str) -> Optional[str]:
+        if ref_name == "HEAD":
+            return self.read_head()
+        loose_path = self.common_path / ref_name
+        if loose_path.is_file():
+            return _read_stripped(loose_path)
+        return self.packed_refs().get(ref_name)
+
+    def packed_refs(self) -> Dict[str, str]:
+        res: Dict[str, str] = {}
+        contents = _read_text(self.common_path / "packed-refs")
+        if not contents:
+            return res
+        for line in contents.splitlines():
+            # Note: skip the header and the '^<sha1>' lines
+            # used for peeled tags
+            if not line or line[0] in ("#", "^"):
+                continue
+            sha1, _, ref_name = line.partition(" ")
+            res[ref_name] = sha1
+        return res
+
+    def list_refs(self, prefix: str) -> Dict[str, str]:
+        """Return the refs whose name starts with `prefix` (like
+        'refs/remotes/origin/'), and what they point to.
+        """
+        res = {k: v for (k, v) in self.packed_refs().items() if k.startswith(prefix)}
+        loose_path = self.common_path / prefix
+        if loose_path.is_dir():
+            for path in loose_path.rglob("*"):
+                if not path.is_file():
+                    continue
+                value = _read_stripped(path)
+                if value:
+                    ref_name = path.relative_to(self.common_path).as_posix()
+                    res[ref_name] = value
+        return res
+
+    def shorten_ref(self, ref_name: str) -> Optional[str]:
+        """Shorten a branch or remote-tracking branch name the same
+        way as `git rev-parse --abbrev-ref` does: keep the 'heads/' or
+        'remotes/' prefix when the short name alone would be ambiguous.
+        """
+        for prefix in ("refs/heads/", "refs/remotes/"):
+            if ref_name.startswith(prefix):
+                break
+        else:
+            return None
+        short_name = ref_name[len(prefix) :]
+        candidates = [
+            f"refs/{short_name}",
+            f"refs/tags/{short_name}",
+            f"refs/heads/{short_name}",
+            f"refs/remotes/{short_name}",
+            f"refs/remotes/{short_name}/HEAD",
+        ]
+        candidates.remove(ref_name)
+        ambiguous = (self.path / short_name).is_file() or any(
+            self.ref_exists(x) for x in candidates
+        )
+        if ambiguous:
+            return prefix[len("refs/") :] + short_name
+        return short_name
+
+    def tracking_ref(self) -> Optional[str]:
+        """Return the short name of the upstream of the current
+        branch, like `git rev-parse --abbrev-ref @{upstream}` does.
+        """
+        upstream = self.upstream_ref()
+        if not upstream:
+            return None
+        return self.shorten_ref(upstream)
+
+    def upstream_ref(self) -> Optional[str]:
+        """Return the full name of the upstream of the current
+        branch, if it exists.
+        """
+        head_branch = self.head_branch()
+        config = self.read_config()
+        if not head_branch or not head_branch.startswith("refs/heads/"):
+            return None
+        if config is None:
+            return None
+        branch = head_branch[len("refs/heads/") :]
+        remote = get_config_value(config, f"branch.{branch}.remote")
+        merge = get_config_value(config, f"branch.{branch}.merge")
+        if not remote or not merge:
+            return None
+        if remote == ".":
+            upstream: Optional[str] = merge
+        else:
+            refspecs = config.get(f"remote.{remote}.fetch", [])
+            upstream = map_refspecs(refspecs, merge)
+        if not upstream or not self.ref_exists(upstream):
+            return None
+        return upstream
+
+    def read_config(self) -> Optional[GitConfig]:
+        """Return the repository config, or None if it uses
+        features this reader does not support (such as includes)
+        """
+        contents = _read_text(self.common_path / "config")
+        if contents is None:
+            return None
+        return parse_git_config(contents)
+
+    def is_shallow(self) -> bool:
+        return (self.common_path / "shallow").exists()
+
+    def read_index_entries(self) -> Optional[List[IndexEntry]]:
+        """Return the path and mode of every entry in the index, or None
+        if it uses features this reader does not support (such as split
+        or sparse indexes, or sha256 object names)
+        """
+        config = self.read_config()
+        if config is None:
+            return None
+        if get_config_value(config, "extensions.objectformat") not in (None, "sha1"):
+            return None
+        try:
+            contents = (self.path / "index").read_bytes()
+        except FileNotFoundError:
+            # Note: there is no index until something is staged
+            return []
+        except OSError:
+            return None
+        return parse_index(contents)
+
+
+def get_config_value(config: GitConfig, key: str) -> Optional[str]:
+    """Return the last value set for the key, as `git config --get` does"""
+    values = config.get(key)
+    if values:
+        return values[-1]
+    return None
+
+
+def parse_index(contents: bytes) -> Optional[List[IndexEntry]]:
+    """Parse the contents of a `.git/index` file (versions 2 to 4),
+    see gitformat-index(5)
+    """
+    if len(contents) < 32 or contents[:4] != b"DIRC":
+        return None
+    version, count = struct.unpack_from(">II", contents, 4)
+    if version not in (2, 3, 4):
+        return None
+    res: List[IndexEntry] = []
+    offset = 12
+    path = b""
+    try:
+        for _ in range(count):
+            path, mode, offset = _parse_index_entry(contents, offset, version, path)
+            res.append((os.fsdecode(path), mode))
+        # Note: the last 20 bytes are the checksum of the file
+        while offset + 8 <= len(contents) - 20:
+            signature = contents[offset : offset + 4]
+            if signature in (b"link", b"sdir"):
+                return None
+            (size,) = struct.unpack_from(">I", contents, offset + 4)
+            offset += 8 + size
+    except (struct.error, ValueError, IndexError):
+        return None
+    return res
+
+
+def _parse_index_entry(
+    contents: bytes, offset: int, version: int, previous_path: bytes
+) -> Tuple[bytes, int, int]:
+    """Return path, mode and offset of the next entry"""
+    (mode,) = struct.unpack_from(">I", contents, offset + 24)
+    (flags,) = struct.unpack_from(">H", contents, offset + 60)
+    start = offset + 62
+    if version >= 3 and flags & 0x4000:
+        # extended flags
+        start += 2
+    if version == 4:
+        # Note: paths are prefix-compressed, and entries not padded
+        strip, start = _parse_offset_varint(contents, start)
+        if strip > len(previous_path):
+            raise ValueError("invalid path prefix")
+        end = contents.index(b"\0", start)
+        path = previous_path[: len(previous_path) - strip] + contents[start:end]
+        return path, mode, end + 1
+    end = contents.index(b"\0", start)
+    # Note: entries are padded with 1 to 8 NUL bytes
+    return contents[start:end], mode, offset + ((end - offset + 8) & ~7)
+
+
+def _parse_offset_varint(contents: bytes, offset: int) -> Tuple[int, int]:
+    # Note: this is the variable-length encoding from git's varint.c,
+    # not the one used in pack files
+    byte = contents[offset]
+    offset += 1
+    value = byte & 0x7F
+    while byte & 0x80:
+        byte = contents[offset]
+        offset += 1
+        value = ((value + 1) << 7) | (byte & 0x7F)
+    return value, offset
+
+
+def map_refspecs(refspecs: List[str], ref_name: str) -> Optional[str]:
+    """Return the local ref `ref_name` is fetched to, given
+    the values of `remote.<name>.fetch`
+    """
+    for refspec in refspecs:
+        src, _, dst = refspec.lstrip("+").partition(":")
+        if "*" in src:
+            src_prefix, _, src_suffix = src.partition("*")
+            if not (ref_name.startswith(src_prefix) and ref_name.endswith(src_suffix)):
+                continue
+            matched = ref_name[len(src_prefix) : len(ref_name) - len(src_suffix)]
+            return dst.replace("*", matched, 1)
+        if src == ref_name and dst:
+            return dst
+    return None
+
+
+def parse_git_config(contents: str) -> Optional[GitConfig]:
+    """Parse the contents of a git config file.
+
+    Return a dict where keys look like 'section.subsection.key'
+    (with section and key lower-cased, as git does) and values are
+    the list of values for this key, in order.
+    """
+    res: GitConfig = {}
+    section = ""
+    lines = iter(contents.splitlines())
+    for line in lines:
+        # handle line continuation
+        while line.endswith("\\") and not line.endswith("\\\\"):
+            line = line[:-1] + next(lines, "")
+        stripped = line.strip()
+        if not stripped or stripped[0] in ("#", ";"):
+            continue
+        if stripped.startswith("["):
+            parsed_section = _parse_section(stripped)
+            if parsed_section is None:
+                return None
+            section, rest = parsed_section
+            if section in ("include", "includeif") or section.startswith("includeif."):
+                return None
+            stripped = rest.strip()
+            if not stripped or stripped[0] in ("#", ";"):
+                continue
+        if not section:
+            return None
+        key, sep, raw_value = stripped.partition("=")
+        key = key.strip().lower()
+        if sep:
+            value = _parse_value(raw_value)
+        else:
+            # Note: a key without value means 'true'
+            key = _strip_comment(key).strip()
+            value = "true"
+        res.setdefault(f"{section}.{key}", []).append(value)
+    return res
+
+
+def _parse_section(line: str) -> Optional[Tuple[str, str]]:
+    end = line.rfind("]")
+    if end == -1:
+        return None
+    header = line[1:end].strip()
+    rest = line[end + 1 :]
+    if '"' in header:
+        name, _, subsection = header.partition(" ")
+        subsection = subsection.strip()
+        if not (subsection.startswith('"') and subsection.endswith('"')):
+            return None
+        subsection = subsection[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+        return f"{name.lower()}.{subsection}", rest
+    if "." in header:
+        # deprecated [section.subsection] syntax
+        name, _, subsection = header.partition(".")
+        return f"{name.lower()}.{subsection.lower()}", rest
+    return header.lower(), rest
+
+
+def _parse_value(raw_value: str) -> str:
+    res = ""
+    in_quotes = False
+    escaped = False
+    for char in raw_value.strip():
+        if escaped:
+            res += {"n": "\n", "t": "\t", "b": "\b"}.get(char, char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == '"':
+            in_quotes = not in_quotes
+        elif char in ("#", ";") and not in_quotes:
+            break
+        else:
+            res += char
+    return res.strip()
+
+
+def _strip_comment(value: str) -> str:
+    for marker in ("#", ";"):
+        value = value.split(marker, 1)[0]
+    return value
+
+
+def _read_text(path: Path) -> Optional[str]:
+    try:
+        return path.read_text()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def _read_stripped(path: Path) -> Optional[str]:
+    contents = _read_text(path)
+    if contents is None:
+        return None
+    return contents.strip()
@@ -2,7 +2,7 @@
 
 # Note that groups are allowed to include other groups.
 
-from typing import Any, Dict, Generic, List, Optional, TypeVar
+from typing import Any, Dict, Generic, List, Optional, Set, TypeVar
 
 import cli_ui as ui
 
@@ -47,6 +47,22 @@ class UnknownGroupElement(GroupError):
         super().__init__(message)
 
 
+class _Traversal(Generic[T]):
+    """State of a walk through some groups and their includes"""
+
+    def __init__(self) -> None:
+        # Groups processed, in order
+        self.groups_seen: List[str] = []
+        self.seen: Set[str] = set()
+        # Every group name looked at, processed or not
+        self.checked: Set[str] = set()
+        # Note: we need to keep the result free of duplicates *and*
+        # in the correct order.
+        # There's no OrderedSet in the stdlib, so we use a dict instead
+        # where keys don't matter
+        self.elements: Dict[T, bool] = {}
+
+
 class GroupList(Generic[T]):
     """Usage:
 
@@ -61,8 +77,12 @@ class GroupList(Generic[T]):
     def __init__(self, *, elements: List[T]) -> None:
         self.groups: Dict[str, Group[T]] = {}
         self.all_elements = elements
+        self._all_elements_set = set(elements)
         self._groups_seen: List[str] = []
         self.missing_elements: List[Dict[str, T]] = []
+        # Result of walking each group and its includes on its own,
+        # or None if this failed
+        self._closures: Dict[str, Optional[_Traversal[T]]] = {}
 
     def get_groups_seen(self) -> List[str]:
         return self._groups_seen
@@ -77,7 +97,7 @@ class GroupList(Generic[T]):
         can_add: bool = True
         ignored_elements: List[T] = []
         for element in elements:
-            if element not in self.all_elements:
+            if element not in self._all_elements_set:
                 if ignore_on_mtod:
                     can_add = False
                     if ignore_on_mtod != ManifestsTypeOfData.DEEP_ON_UPDATE:
@@ -90,8 +110,9 @@ class GroupList(Generic[T]):
                 else:
                     raise UnknownGroupElement(name, element)
         if can_add is False:
-            elements = list(set(elements).difference(ignored_elements))
+            elements = [x for x in dict.fromkeys(elements) if x not in ignored_elements]
         self.groups[name] = Group(name, elements, includes=includes)
+        self._closures = {}
 
     def get_group(self, name: str) -> Optional[Group[T]]:
         return self.groups.get(name)
@@ -107,37 +128,55 @@ class GroupList(Generic[T]):
         #
         # This algorithms allows to have groups that include each other
         # without creating infinite loops.
-        self._groups_seen = []
-        # Note: we need to keep the result free of duplicates *and*
-        # in the correct order.
-        # There's no OrderedSet in the stdlib, so we use a dict instead
-        # where keys don't matter
-        res: Dict[T, bool] = {}
-        self._rec_get_elements(
-            res,
-            groups,
-            parent_group=None,
-            ignore_if_group_not_found=ignore_if_group_not_found,
-        )
-        return list(res.keys())
+        traversal: _Traversal[T] = _Traversal()
+        for group_name in groups:
+            if group_name in traversal.seen:
+                break
+            if group_name not in self.groups:
+                if ignore_if_group_not_found is True:
+                    continue
+                raise GroupNotFound(group_name)
+            closure = self._get_closure(group_name)
+            # Note: the walk through a group depends on the groups
+            # already seen, so the closure can only be used if it
+            # does not go through any of them
+            if closure and closure.checked.isdisjoint(traversal.seen):
+                traversal.groups_seen.extend(closure.groups_seen)
+                traversal.seen.update(closure.seen)
+                traversal.elements.update(closure.elements)
+            else:
+                self._rec_get_elements(traversal, [group_name], parent_group=None)
+        self._groups_seen = traversal.groups_seen
+        return list(traversal.elements.keys())
+
+    def _get_closure(self, group_name: str) -> Optional[_Traversal[T]]:
+        if group_name in self._closures:
+            return self._closures[group_name]
+        traversal: _Traversal[T] = _Traversal()
+        closure: Optional[_Traversal[T]] = traversal
+        try:
+            self._rec_get_elements(traversal, [group_name], parent_group=None)
+        except GroupNotFound:
+            closure = None
+        self._closures[group_name] = closure
+        return closure
 
     def _rec_get_elements(
         self,
-        res: Dict[T, bool],
+        traversal: _Traversal[T],
         group_names: List[str],
         *,
         parent_group: Optional[Group[T]],
-        ignore_if_group_not_found: bool = False,
     ) -> None:
         for group_name in group_names:
-            if group_name in self._groups_seen:
+            traversal.checked.add(group_name)
+            if group_name in traversal.seen:
                 return
             if group_name not in self.groups:
-                if ignore_if_group_not_found is True:
-                    continue
                 raise GroupNotFound(group_name, parent_group=parent_group)
             group = self.groups[group_name]
-            self._groups_seen.append(group.name)
-            self._rec_get_elements(res, group.includes, parent_group=group)
+            traversal.groups_seen.append(group.name)
+            traversal.seen.add(group.name)
+            self._rec_get_elements(traversal, group.includes, parent_group=group)
             for element in group.elements:
-                res[element] = True
+                traversal.elements[element] = True
@@ -0,0 +1,195 @@
+"""
+Host limits
+
+Limit how many repos are processed at the same time for each git
+server, so that a high `-j` value does not overload a slow server
+while repos hosted on faster ones keep all the jobs busy.
+
+Each item processed by a task is associated to the host of the
+remote it talks to (see Task.get_host()), and the parallel executors
+only start an item when its host has room for it (see tsrc.executor).
+Limits are set by host in the workspace configuration:
+
+    host_limits:
+      gitlab.example.com: 4
+
+Hosts without a limit can use all the jobs.
+
+With `adaptive_jobs: true`, the limit of each host is also adjusted
+while tsrc runs, starting from the configured one (or from the number
+of jobs):
+
+* it is halved when a git command fails because of a transient error,
+  that is a network or server issue (see tsrc.retry) - other failures,
+  such as a dirty repo or a missing branch, say nothing about the server,
+* it is decreased by one when items take more than SLOW_FACTOR times
+  as long as they used to for this host,
+* and it is increased by one after a whole round of items (as many
+  as the current limit) went well, up to the initial limit.
+"""
+
+import contextlib
+import contextvars
+import re
+import urllib.parse
+from threading import Lock
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import cli_ui as ui
+
+from tsrc.errors import Error
+
+# Ratio between the average duration of items and the lowest one
+# seen for the same host above which the host is considered overloaded
+SLOW_FACTOR = 2.0
+
+# Weight of the last duration in the average
+AVERAGE_WEIGHT = 0.2
+
+# Limit of the host the current item talks to, if any
+_CURRENT: contextvars.ContextVar[Optional[Tuple["HostLimits", "HostLimit"]]] = (
+    contextvars.ContextVar("tsrc_host_limit", default=None)
+)
+
+# [user@]host:path - but not a Windows drive like C:\path
+SCP_LIKE_URL = re.compile(r"^(?:[^@/:]+@)?([^@/:]{2,}):")
+
+
+class InvalidHostLimit(Error):
+    def __init__(self, host: str, value: Any) -> None:
+        super().__init__(f"Invalid limit for host '{host}': '{value}'")
+
+
+def get_url_host(url: str) -> Optional[str]:
+    """Return the host of a git URL, or None for local repos"""
+    if "://" in url:
+        return urllib.parse.urlsplit(url).hostname or None
+    match = SCP_LIKE_URL.match(url)
+    if match:
+        return match.group(1).lower()
+    return None
+
+
+class HostLimit:
+    """How many items can be processed at the same time for a host"""
+
+    def __init__(self, host: str, max_jobs: int, *, adaptive: bool) -> None:
+        self.host = host
+        self.max_jobs = max_jobs
+        self.adaptive = adaptive
+        self.limit = max_jobs
+        self.active = 0
+        # items done since the limit last changed
+        self.done_in_round = 0
+        self.average: Optional[float] = None
+        self.best_average: Optional[float] = None
+
+    def has_room(self) -> bool:
+        return self.active < self.limit
+
+    def record(self, seconds: float, *, success: bool) -> None:
+        if not self.adaptive:
+            return
+        if not success:
+            # Note: transient errors have already been reported,
+            # see report_transient_error()
+            return
+        if self.average is None:
+            self.average = seconds
+        else:
+            self.average += (seconds - self.average) * AVERAGE_WEIGHT
+        if self.best_average is None or self.average < self.best_average:
+            self.best_average = self.average
+        self.done_in_round += 1
+        if self.done_in_round < self.limit:
+            return
+        if self.average > self.best_average * SLOW_FACTOR:
+            self.decrease(self.limit - 1)
+        elif self.limit < self.max_jobs:
+            self.set_limit(self.limit + 1)
+        else:
+            self.done_in_round = 0
+
+    def decrease(self, limit: int) -> None:
+        self.set_limit(max(limit, 1))
+
+    def set_limit(self, limit: int) -> None:
+        self.done_in_round = 0
+        if limit != self.limit:
+            ui.debug("Using", limit, "job(s) for", self.host)
+        self.limit = limit
+
+
+class HostLimits:
+    """Usage:
+
+    >>> host_limits = HostLimits({"gitlab.example.com": 4}, adaptive=False)
+    >>> host_limits.try_acquire("gitlab.example.com", num_jobs=8)
+    True
+    >>> host_limits.release("gitlab.example.com", 1.5, success=True)
+
+    Can be used from several threads at once.
+    """
+
+    def __init__(self, max_jobs: Dict[str, int], *, adaptive: bool) -> None:
+        if not isinstance(max_jobs, dict):
+            raise Error("host_limits should be a mapping of host names to numbers")
+        for host, value in max_jobs.items():
+            if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+                raise InvalidHostLimit(host, value)
+        self.max_jobs = {k.lower(): v for (k, v) in max_jobs.items()}
+        self.adaptive = adaptive
+        self.lock = Lock()
+        self.limits: Dict[str, HostLimit] = {}
+
+    def get_limit(self, host: str, *, num_jobs: int) -> HostLimit:
+        # Note: must be called while holding self.lock
+        res = self.limits.get(host)
+        if not res:
+            max_jobs = min(self.max_jobs.get(host, num_jobs), num_jobs)
+            res = HostLimit(host, max_jobs, adaptive=self.adaptive)
+            self.limits[host] = res
+        return res
+
+    def try_acquire(self, host: str, *, num_jobs: int) -> bool:
+        """Take a slot of the host, if it has room for one more item"""
+        with self.lock:
+            limit = self.get_limit(host, num_jobs=num_jobs)
+            if not limit.has_room():
+                return False
+            limit.active += 1
+            return True
+
+    def release(self, host: str, seconds: float, *, success: bool) -> None:
+        with self.lock:
+            limit = self.limits[host]
+            limit.active -= 1
+            limit.record(seconds, success=success)
+
+    def report_transient_error(self, limit: HostLimit) -> None:
+        with self.lock:
+            if limit.adaptive:
+                limit.decrease(limit.limit // 2)
+
+    @contextlib.contextmanager
+    def use(self, host: str) -> Iterator[None]:
+        """Mark the code in the `with` block as talking to the host,
+        so that transient errors can be reported (see report_transient_error())
+        """
+        with self.lock:
+            limit = self.limits[host]
+        token = _CURRENT.set((self, limit))
+        try:
+            yield
+        finally:
+            _CURRENT.reset(token)
+
+
+def report_transient_error() -> None:
+    """Called by tsrc.retry before running a git command again,
+    to lower the limit of the host the current item talks to
+    """
+    current = _CURRENT.get()
+    if current:
+        host_limits, limit = current
+        host_limits.report_transient_error(limit)
@@ -0,0 +1,208 @@
+"""
+Journal
+
+Record the progress of `tsrc init` and `tsrc sync`, repo by repo,
+so that an interrupted run can be resumed without doing the same
+work again: see `tsrc sync --resume`, and running `tsrc init` again
+in a workspace whose initialization did not finish.
+
+For each repo, and each step ('clone', 'remotes', 'sync'), the
+journal records when the step starts, and when it is done, along
+with the manifest entry of the repo and its HEAD at that time.
+It is stored in the workspace state database (see tsrc.state_db).
+Steps are recorded in memory, and written in one transaction at
+most every FLUSH_INTERVAL seconds, and when the task is done.
+
+When resuming, a step is only skipped if it is done *and verified*:
+the manifest entry of the repo did not change since, and its HEAD
+is still the recorded one. A clone that started but was never done
+may have left a partial directory behind: it is removed before
+cloning again, even if the run is not resumed.
+
+The journal is cleared once the command succeeds.
+"""
+
+import shutil
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+import cli_ui as ui
+
+from tsrc.executor import Outcome, Task, run_in_thread
+from tsrc.manifest_diff import RepoEntry
+from tsrc.repo import Repo
+from tsrc.state_db import JournalStep, StateDB, read_head_state
+
+# How long recorded steps can stay in memory before being written
+FLUSH_INTERVAL = 1.0
+
+
+class Journal:
+    """Usage:
+
+    >>> journal = Journal.start(workspace_path, state_db, "sync", entries)
+    >>> task = journal.wrap(syncer, "sync")  # records each repo synced
+    >>> journal.flush()  # once the task is done
+    >>> journal.finish()
+
+    `entries` are the manifest entries of the repos, by dest
+    (see tsrc.manifest_diff.get_repo_entries)
+    """
+
+    def __init__(
+        self,
+        workspace_path: Path,
+        state_db: StateDB,
+        command: str,
+        entries: Dict[str, RepoEntry],
+    ) -> None:
+        self.workspace_path = workspace_path
+        self.state_db = state_db
+        self.command = command
+        self.entries = entries
+        # Note: what the previous run did - steps recorded by
+        # this run must not change what is skipped
+        self.previous_steps = state_db.get_journal_steps(command)
+        self.pending: Dict[Tuple[str, str], JournalStep] = {}
+        self.lock = Lock()
+        self.last_flush = time.monotonic()
+
+    @classmethod
+    def start(
+        cls,
+        workspace_path: Path,
+        state_db: StateDB,
+        command: str,
+        entries: Dict[str, RepoEntry],
+    ) -> "Journal":
+        """Start a new run, forgetting what the previous one did"""
+        state_db.start_journal(command)
+        return cls(workspace_path, state_db, command, entries)
+
+    @classmethod
+    def resume(
+        cls,
+        workspace_path: Path,
+        state_db: StateDB,
+        command: str,
+        entries: Dict[str, RepoEntry],
+    ) -> Optional["Journal"]:
+        """Return the journal of the unfinished run of the command,
+        or None if there is nothing to resume
+        """
+        if state_db.get_journal_start(command) is None:
+            return None
+        return cls(workspace_path, state_db, command, entries)
+
+    @staticmethod
+    def is_unfinished(state_db: StateDB, command: str) -> bool:
+        return state_db.get_journal_start(command) is not None
+
+    def is_done(self, dest: str, step: str) -> bool:
+        """Whether the step was done by the previous run, and
+        the repo has not changed since
+        """
+        previous = self.previous_steps.get((dest, step))
+        if not previous or not previous.done:
+            return False
+        if previous.entry != self.entries.get(dest):
+            return False
+        head, _, _ = read_head_state(self.workspace_path / dest)
+        return head is not None and head == previous.head
+
+    def record_started(self, dest: str, step: str) -> None:
+        self.record(dest, step, JournalStep(done=False))
+
+    def record_done(self, dest: str, step: str) -> None:
+        head, _, _ = read_head_state(self.workspace_path / dest)
+        value = JournalStep(done=True, entry=self.entries.get(dest, {}), head=head)
+        self.record(dest, step, value)
+
+    def record(self, dest: str, step: str, value: JournalStep) -> None:
+        with self.lock:
+            self.pending[(dest, step)] = value
+            if time.monotonic() - self.last_flush < FLUSH_INTERVAL:
+                return
+        self.flush()
+
+    def flush(self) -> None:
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+            self.last_flush = time.monotonic()
+        self.state_db.record_steps(self.command, pending)
+
+    def wrap(self, task: Task[Repo], step: str) -> "JournaledTask":
+        return JournaledTask(self, task, step)
+
+    def finish(self) -> None:
+        with self.lock:
+            self.pending = {}
+        self.state_db.clear_journal(self.command)
+
+
+def remove_partial_clones(
+    workspace_path: Path, state_db: StateDB, repos: List[Repo]
+) -> List[str]:
+    """Remove what clones started by a previous run of any command, but
+    never done, left behind. Return the dests of the repos that were removed
+    """
+    unfinished = set(state_db.get_unfinished_clones())
+    res = []
+    for repo in repos:
+        if repo.dest not in unfinished:
+            continue
+        repo_path = workspace_path / repo.dest
+        # Note: `git clone` fails without touching a directory that
+        # already exists, so one without a `.git` was not created by it
+        if (repo_path / ".git").exists():
+            ui.info_2("Removing partial clone of", ui.bold, repo.dest)
+            shutil.rmtree(repo_path)
+            res.append(repo.dest)
+    state_db.forget_unfinished_clones([x.dest for x in repos if x.dest in unfinished])
+    return res
+
+
+class JournaledTask(Task[Repo]):
+    """Same as `task`, except each repo is recorded in the journal
+    before and after being processed
+    """
+
+    def __init__(self, journal: Journal, task: Task[Repo], step: str) -> None:
+        self.journal = journal
+        self.task = task
+        self.step = step
+
+    @property
+    def trace_category(self) -> str:
+        return self.task.trace_category
+
+    def describe_item(self, item: Repo) -> str:
+        return self.task.describe_item(item)
+
+    def get_host(self, item: Repo) -> Optional[str]:
+        return self.task.get_host(item)
+
+    def describe_process_start(self, item: Repo) -> List[ui.Token]:
+        return self.task.describe_process_start(item)
+
+    def describe_process_end(self, item: Repo) -> List[ui.Token]:
+        return self.task.describe_process_end(item)
+
+    def process(self, index: int, count: int, item: Repo) -> Outcome:
+        self.task.parallel = self.parallel
+        self.journal.record_started(item.dest, self.step)
+        outcome = self.task.process(index, count, item)
+        if outcome.success():
+            self.journal.record_done(item.dest, self.step)
+        return outcome
+
+    async def process_async(self, index: int, count: int, item: Repo) -> Outcome:
+        self.task.parallel = self.parallel
+        await run_in_thread(self.journal.record_started, item.dest, self.step)
+        outcome = await self.task.process_async(index, count, item)
+        if outcome.success():
+            await run_in_thread(self.journal.record_done, item.dest, self.step)
+        return outcome
@@ -3,6 +3,7 @@ from typing import Optional
 
 from tsrc.git import get_current_branch, run_git
 from tsrc.manifest import Manifest, load_manifest, load_manifest_safe_mode
+from tsrc.manifest_cache import get_blob_sha
 from tsrc.manifest_common_data import ManifestsTypeOfData
 
 
@@ -23,8 +24,11 @@ class LocalManifest:
 
     """
 
-    def __init__(self, clone_path: Path) -> None:
+    def __init__(self, clone_path: Path, *, cache_path: Optional[Path] = None) -> None:
         self.clone_path = clone_path
+        # Where to store the compiled manifest, if anywhere
+        # (see tsrc.manifest_cache)
+        self.cache_path = cache_path
 
     def current_branch(self) -> str:
         return get_current_branch(self.clone_path)
@@ -49,7 +53,18 @@ class LocalManifest:
         )
 
     def get_manifest(self) -> Manifest:
-        return load_manifest(self.clone_path / "manifest.yml")
+        return load_manifest(
+            self.clone_path / "manifest.yml", cache_path=self.cache_path
+        )
+
+    def get_manifest_sha(self) -> Optional[str]:
+        """Return the blob sha of the `manifest.yml` file,
+        or None if it cannot be read
+        """
+        try:
+            return get_blob_sha((self.clone_path / "manifest.yml").read_bytes())
+        except OSError:
+            return None
 
     def get_manifest_safe_mode(self, mtod: ManifestsTypeOfData) -> Manifest:
         return load_manifest_safe_mode(self.clone_path / "manifest.yml", mtod)
@@ -80,7 +80,9 @@ def process_bare_repos(
     # TODO: possibly add 'config' -> 'remote_name=self.config.singular_remote'
     bare_cloner = BareCloner(workspace.root_path)
 
-    process_items(c_repos, bare_cloner, num_jobs=num_jobs)
+    process_items(
+        c_repos, bare_cloner, num_jobs=num_jobs, host_limits=workspace.host_limits
+    )
     erase_last_line()
 
     return c_repos
@@ -3,11 +3,12 @@
 # TODO: check for absolute paths in _handle_copies, _handle_links
 
 from pathlib import Path
-from typing import Any, List, Optional
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
 
 import schema
 
-from tsrc.config import parse_config
+from tsrc.config import Config, parse_config_contents
 from tsrc.errors import (
     Error,
     InvalidConfigError,
@@ -16,6 +17,11 @@ from tsrc.errors import (
 )
 from tsrc.file_system import Copy, FileSystemOperation, Link
 from tsrc.groups import GroupList
+from tsrc.manifest_cache import (
+    get_blob_sha,
+    read_compiled_manifest,
+    write_compiled_manifest,
+)
 from tsrc.manifest_common_data import ManifestsTypeOfData, mtod_can_ignore_remotes
 from tsrc.repo import Remote, Repo
 from tsrc.switch import Switch
@@ -30,10 +36,16 @@ class Manifest:
     """Contains a list of `Repo` instances, and optionally
     a group list.
 
+    Note: manifests returned by load_manifest() are shared by all the
+    callers loading the same file, so they must not be changed. get_repos()
+    returns a new list each time, so that callers may filter it in place.
     """
 
     def __init__(self) -> None:
-        self._repos: List[Repo] = []
+        # Note: only apply_config() changes the repos, so the index
+        # used by get_repo() is built there, once
+        self._repos: Tuple[Repo, ...] = ()
+        self._repos_by_dest: Dict[str, Repo] = {}
         self.group_list: Optional[GroupList[str]] = None
         self._switch: Optional[Switch] = None
 
@@ -49,10 +61,13 @@ class Manifest:
         self.file_system_operations: List[FileSystemOperation] = []
         self.symlinks: List[Link] = []
         repos_config = config["repos"]
+        repos = []
         for repo_config in repos_config:
-            self._handle_repo(repo_config)
+            repos.append(self._handle_repo(repo_config))
             self._handle_copies(repo_config)
             self._handle_links(repo_config)
+        self._repos += tuple(repos)
+        self._index_repos()
 
         groups_config = config.get("groups")
         self._handle_groups(
@@ -63,19 +78,20 @@ class Manifest:
         switch_config = config.get("switch")
         self._handle_switch(switch_config)
 
-    def _handle_repo(self, repo_config: Any) -> None:
+    def _handle_repo(self, repo_config: Any) -> Repo:
         dest = repo_config["dest"]
         branch = orig_branch = repo_config.get("branch")
         tag = repo_config.get("tag")
         sha1 = repo_config.get("sha1")
         url = repo_config.get("url")
         ignore_submodules = repo_config.get("ignore_submodules", False)
+        clone_filter = repo_config.get("clone_filter")
         if url:
             origin = Remote(name="origin", url=url)
             remotes = [origin]
         else:
             remotes = self._handle_remotes(repo_config)
-        repo = Repo(
+        return Repo(
             dest=dest,
             branch=branch,
             orig_branch=orig_branch,
@@ -83,8 +99,8 @@ class Manifest:
             tag=tag,
             remotes=remotes,
             ignore_submodules=ignore_submodules,
+            clone_filter=clone_filter,
         )
-        self._repos.append(repo)
 
     def _handle_remotes(self, repo_config: Any) -> List[Remote]:
         remotes_config = repo_config.get("remotes")
@@ -154,7 +170,7 @@ class Manifest:
         ignore_if_group_not_found: bool = False,
     ) -> List[Repo]:
         if all_:
-            return self._repos
+            return list(self._repos)
 
         if do_switch is True:
             return self._get_repos_on_switch(groups)
@@ -163,7 +179,7 @@ class Manifest:
             if self._has_default_group():
                 return self._get_repos_in_groups(["default"])
             else:
-                return self._repos
+                return list(self._repos)
 
         return self._get_repos_in_groups(groups, ignore_if_group_not_found)
 
@@ -176,7 +192,7 @@ class Manifest:
             if self._switch._groups:
                 matched_groups = list(self._switch._groups)
                 return self._get_repos_in_groups(matched_groups)
-        return self._repos  # all repos
+        return list(self._repos)  # all repos
 
     def _get_repos_in_groups(
         self,
@@ -193,10 +209,21 @@ class Manifest:
         return res
 
     def get_repo(self, dest: str) -> Repo:
+        repo = self._repos_by_dest.get(dest)
+        if not repo:
+            raise RepoNotFound(dest)
+        return repo
+
+    def _index_repos(self) -> None:
+        self._repos_by_dest = {}
         for repo in self._repos:
-            if repo.dest == dest:
-                return repo
-        raise RepoNotFound(dest)
+            # Note: keep the first repo when several have the same dest
+            self._repos_by_dest.setdefault(repo.dest, repo)
+
+
+# Filters supported by `git clone --filter`, except the ones
+# that need a blob on the server ('sparse:oid=')
+CLONE_FILTER_RE = r"^(blob:none|blob:limit=\d+[kmg]?|tree:\d+)$"
 
 
 def validate_repo(data: Any) -> None:
@@ -212,6 +239,7 @@ def validate_repo(data: Any) -> None:
             schema.Optional("sha1"): str,
             schema.Optional("tag"): str,
             schema.Optional("ignore_submodules"): bool,
+            schema.Optional("clone_filter"): schema.Regex(CLONE_FILTER_RE),
             schema.Optional("remotes"): [remote_schema],
             schema.Optional("url"): str,
         }
@@ -242,6 +270,7 @@ def validate_repo_no_remote_required(data: Any) -> None:
             schema.Optional("sha1"): str,
             schema.Optional("tag"): str,
             schema.Optional("ignore_submodules"): bool,
+            schema.Optional("clone_filter"): schema.Regex(CLONE_FILTER_RE),
             schema.Optional("remotes"): [remote_schema],
             schema.Optional("url"): str,
         }
@@ -270,10 +299,14 @@ def validate_switch(data: Any) -> None:
     switch_schema.validate(data)
 
 
-def load_manifest(manifest_path: Path) -> Manifest:
+def load_manifest(
+    manifest_path: Path, *, cache_path: Optional[Path] = None
+) -> Manifest:
     """Main entry point: return a manifest instance by parsing
     a `manifest.yml` file.
 
+    If `cache_path` is set, it is used to store the compiled
+    manifest (see tsrc.manifest_cache).
     """
     remote_git_server_schema = {"url": str}
     repo_schema = schema.Use(validate_repo)
@@ -290,10 +323,9 @@ def load_manifest(manifest_path: Path) -> Manifest:
             schema.Optional("switch"): on_switch_schema,
         }
     )
-    parsed = parse_config(manifest_path, schema=manifest_schema)
-    res = Manifest()
-    res.apply_config(parsed)
-    return res
+    return parse_manifest(
+        manifest_path, manifest_schema, validation="strict", cache_path=cache_path
+    )
 
 
 def load_manifest_safe_mode(manifest_path: Path, mtod: ManifestsTypeOfData) -> Manifest:
@@ -309,8 +341,10 @@ def load_manifest_safe_mode(manifest_path: Path, mtod: ManifestsTypeOfData) -> M
     remote_git_server_schema = {"url": str}
     if mtod in mtod_can_ignore_remotes():
         repo_schema = schema.Use(validate_repo_no_remote_required)
+        validation = "no-remote-required"
     else:
         repo_schema = schema.Use(validate_repo)
+        validation = "strict"
     group_schema = {"repos": [str], schema.Optional("includes"): [str]}
     # Note: gitlab and github_enterprise_url keys are ignored,
     # and kept here only for backward compatibility reasons
@@ -325,11 +359,84 @@ def load_manifest_safe_mode(manifest_path: Path, mtod: ManifestsTypeOfData) -> M
         }
     )
     try:
-        parsed = parse_config(manifest_path, schema=manifest_schema)
+        return parse_manifest(
+            manifest_path, manifest_schema, validation=validation, ignore_on_mtod=mtod
+        )
     except InvalidConfigError:
         raise LoadManifestSchemaError(mtod)
 
-    parsed = parse_config(manifest_path, schema=manifest_schema)
+
+# Note: the manifest is loaded several times during a single command,
+# so keep the last Manifest built from each manifest file, by path,
+# kind of validation and type of data, along with the blob sha of the contents.
+_PARSED_MANIFESTS: Dict[
+    Tuple[Path, str, Optional[ManifestsTypeOfData]], Tuple[str, Manifest]
+] = {}
+_PARSED_MANIFESTS_LOCK = Lock()
+
+
+def parse_manifest(
+    manifest_path: Path,
+    manifest_schema: schema.Schema,
+    *,
+    validation: str,
+    cache_path: Optional[Path] = None,
+    ignore_on_mtod: Optional[ManifestsTypeOfData] = None,
+) -> Manifest:
+    """Parse the manifest file and return a Manifest built from it,
+    as in Manifest.apply_config(). The Manifest is cached until the
+    contents of the file change, and must not be changed by callers.
+
+    `validation` must be different for each schema used for the same file.
+
+    If `cache_path` is set, the validated config is also stored there,
+    so that other tsrc processes can skip parsing and validation
+    (see tsrc.manifest_cache).
+    """
+    try:
+        data = manifest_path.read_bytes()
+        contents = data.decode()
+    except (OSError, UnicodeDecodeError) as error:
+        raise InvalidConfigError(manifest_path, error)
+    key = (manifest_path.resolve(), validation, ignore_on_mtod)
+    blob_sha = get_blob_sha(data)
+    with _PARSED_MANIFESTS_LOCK:
+        cached = _PARSED_MANIFESTS.get(key)
+    if cached and cached[0] == blob_sha:
+        return cached[1]
+    parsed = _parse_manifest_contents(
+        manifest_path,
+        contents,
+        manifest_schema,
+        blob_sha=blob_sha,
+        validation=validation,
+        cache_path=cache_path,
+    )
     res = Manifest()
-    res.apply_config(parsed, ignore_on_mtod=mtod)
+    res.apply_config(parsed, ignore_on_mtod=ignore_on_mtod)
+    with _PARSED_MANIFESTS_LOCK:
+        _PARSED_MANIFESTS[key] = (blob_sha, res)
     return res
+
+
+def _parse_manifest_contents(
+    manifest_path: Path,
+    contents: str,
+    manifest_schema: schema.Schema,
+    *,
+    blob_sha: str,
+    validation: str,
+    cache_path: Optional[Path],
+) -> Config:
+    if cache_path:
+        compiled = read_compiled_manifest(
+            cache_path, blob_sha=blob_sha, validation=validation
+        )
+        if compiled is not None:
+            return compiled
+    parsed = parse_config_contents(manifest_path, contents, schema=manifest_schema)
+    if cache_path:
+        write_compiled_manifest(
+            cache_path, parsed, blob_sha=blob_sha, validation=validation
+        )
+    return parsed
@@ -0,0 +1,86 @@
+"""
+Compiled manifest cache
+
+Keep the validated contents of the workspace manifest in
+`<workspace>/.tsrc/manifest.cache`, as JSON, along with the git
+blob sha of the `manifest.yml` file it comes from.
+
+As long as the blob sha does not change, loading the manifest
+only has to read this file: YAML parsing and schema validation
+are skipped.
+
+The cache is also tied to the tsrc version, since the manifest
+schema may change from one version to the next.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from tsrc import __version__
+from tsrc.config import Config
+
+# Bump this when the format of the cache file changes
+CACHE_VERSION = 1
+
+
+def get_blob_sha(contents: bytes) -> str:
+    """Return the sha1 git would use for a file with the given
+    contents (same as `git hash-object`)
+    """
+    header = f"blob {len(contents)}\0".encode()
+    return hashlib.sha1(header + contents).hexdigest()
+
+
+def read_compiled_manifest(
+    cache_path: Path, *, blob_sha: str, validation: str
+) -> Optional[Config]:
+    """Return the cached config, or None if it is missing or stale"""
+    try:
+        cached: Any = json.loads(cache_path.read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict):
+        return None
+    key = get_cache_key(blob_sha=blob_sha, validation=validation)
+    if any(cached.get(k) != v for (k, v) in key.items()):
+        return None
+    config = cached.get("config")
+    if not isinstance(config, dict):
+        return None
+    return Config(config)
+
+
+def write_compiled_manifest(
+    cache_path: Path, config: Config, *, blob_sha: str, validation: str
+) -> None:
+    try:
+        serialized = json.dumps(config)
+    except (TypeError, ValueError):
+        return
+    # Note: JSON silently turns some YAML values into something else
+    # (non-string keys for instance), so only keep configs that come
+    # back unchanged
+    if json.loads(serialized) != config:
+        return
+    to_write = get_cache_key(blob_sha=blob_sha, validation=validation)
+    to_write["config"] = config
+    tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.tmp")
+    try:
+        tmp_path.write_text(json.dumps(to_write))
+        tmp_path.replace(cache_path)
+    except OSError:
+        # Note: the cache is only there to speed things up,
+        # failing to write it is not worth an error
+        pass
+
+
+def get_cache_key(*, blob_sha: str, validation: str) -> Dict[str, Any]:
+    return {
+        "cache_version": CACHE_VERSION,
+        "tsrc_version": __version__,
+        "validation": validation,
+        "blob_sha": blob_sha,
+    }
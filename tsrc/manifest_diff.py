@@ -0,0 +1,95 @@
+"""
+Manifest diff
+
+Compare two versions of the manifest, repo by repo: which repos
+were added or removed, and which settings changed for the others
+(branch, tag, sha1, remotes, copies, symlinks ...).
+
+Each repo is described by a plain dict (see get_repo_entry()), so
+that the entries can also be stored, and compared with the entries
+of the last successful sync (see tsrc.state_db).
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from tsrc.file_system import Copy, FileSystemOperation, Link
+from tsrc.manifest import Manifest
+from tsrc.repo import Repo
+
+RepoEntry = Dict[str, Any]
+
+
+@dataclass
+class ManifestDiff:
+    added: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    # dest -> names of the settings that changed
+    changed: Dict[str, List[str]] = field(default_factory=dict)
+
+    def is_empty(self) -> bool:
+        return not self.added and not self.removed and not self.changed
+
+    def describe(self) -> List[str]:
+        res = [f"{dest} (added)" for dest in self.added]
+        res += [f"{dest} (removed)" for dest in self.removed]
+        for dest, keys in self.changed.items():
+            res.append(f"{dest} ({', '.join(keys)} changed)")
+        return res
+
+
+def get_repo_entry(repo: Repo, operations: List[FileSystemOperation]) -> RepoEntry:
+    """Return the settings of the given repo in the manifest.
+
+    `operations` are the file system operations of this repo.
+    """
+    return {
+        "branch": repo.branch,
+        "tag": repo.tag,
+        "sha1": repo.sha1,
+        "remotes": [[x.name, x.url] for x in repo.remotes],
+        "ignore_submodules": repo.ignore_submodules,
+        "clone_filter": repo.clone_filter,
+        "copy": [[x.src, x.dest] for x in operations if isinstance(x, Copy)],
+        "symlink": [[x.source, x.target] for x in operations if isinstance(x, Link)],
+    }
+
+
+def get_repo_entries(
+    repos: List[Repo], operations: List[FileSystemOperation]
+) -> Dict[str, RepoEntry]:
+    operations_by_repo: Dict[str, List[FileSystemOperation]] = {}
+    for operation in operations:
+        operations_by_repo.setdefault(operation.get_repo(), []).append(operation)
+    return {
+        repo.dest: get_repo_entry(repo, operations_by_repo.get(repo.dest, []))
+        for repo in repos
+    }
+
+
+def diff_entries(old: Dict[str, RepoEntry], new: Dict[str, RepoEntry]) -> ManifestDiff:
+    res = ManifestDiff()
+    for dest, new_entry in new.items():
+        old_entry = old.get(dest)
+        if old_entry is None:
+            res.added.append(dest)
+            continue
+        keys = sorted(set(old_entry) | set(new_entry))
+        changed = [k for k in keys if old_entry.get(k) != new_entry.get(k)]
+        if changed:
+            res.changed[dest] = changed
+    res.removed = [dest for dest in old if dest not in new]
+    return res
+
+
+def diff_manifests(old: Optional[Manifest], new: Manifest) -> ManifestDiff:
+    """Compare every repo of two manifests. When there is no
+    old manifest, every repo is considered added.
+    """
+    old_entries = {}
+    if old:
+        old_entries = get_repo_entries(
+            old.get_repos(all_=True), old.file_system_operations
+        )
+    new_entries = get_repo_entries(new.get_repos(all_=True), new.file_system_operations)
+    return diff_entries(old_entries, new_entries)
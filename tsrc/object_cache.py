@@ -0,0 +1,117 @@
+"""
+Object cache
+
+A directory shared by several workspaces (for instance
+`~/.cache/tsrc/objects`), holding one bare mirror per
+remote URL, in `<cache>/<url-hash>`.
+
+New clones borrow objects from those mirrors with
+`git clone --reference-if-able`, so only the objects that
+are not already in the cache are downloaded.
+
+Since the workspace repos then depend on the objects of the
+mirrors, the mirrors are configured to never prune anything.
+
+Mirrors are refreshed before being used, while holding a lock,
+so that several tsrc processes can share the same cache.
+"""
+
+import hashlib
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock
+from typing import IO, Any, Iterator, Optional, Set
+
+from tsrc.errors import Error
+from tsrc.git import run_git_captured
+from tsrc.gitfs import GitDir
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+class ObjectCache:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        # URLs whose mirror has already been refreshed by this process
+        self.refreshed: Set[str] = set()
+        self.lock = Lock()
+
+    def get_mirror_path(self, url: str) -> Path:
+        url_hash = hashlib.sha256(url.encode()).hexdigest()[:32]
+        return self.path / url_hash
+
+    def refresh(self, url: str) -> Optional[Path]:
+        """Create or update the mirror of the given URL, and return its path.
+
+        Return None if this failed: the cache is only there to speed things
+        up, so the caller should carry on without it.
+        """
+        mirror_path = self.get_mirror_path(url)
+        with self.lock:
+            if url in self.refreshed:
+                return mirror_path
+        try:
+            with file_lock(mirror_path.with_name(mirror_path.name + ".lock")):
+                if (mirror_path / "HEAD").exists():
+                    run_git_captured(mirror_path, "fetch", "--prune", "origin")
+                else:
+                    self.create_mirror(url, mirror_path)
+        except (Error, OSError):
+            return None
+        with self.lock:
+            self.refreshed.add(url)
+        return mirror_path
+
+    def create_mirror(self, url: str, mirror_path: Path) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        run_git_captured(self.path, "clone", "--mirror", url, mirror_path.name)
+        # Note: workspace repos borrow objects from the mirror, so
+        # garbage collection in the mirror must never remove any
+        # object, even if no ref points to it any longer
+        for key, value in [("gc.pruneExpire", "never"), ("gc.reflogExpire", "never")]:
+            run_git_captured(mirror_path, "config", key, value)
+
+    def is_used_by(self, repo_path: Path, url: str) -> bool:
+        """Return True if the repo borrows objects from the mirror of the URL"""
+        git_dir = GitDir.find(repo_path)
+        if not git_dir:
+            return False
+        alternates_path = git_dir.common_path / "objects/info/alternates"
+        try:
+            alternates = alternates_path.read_text().splitlines()
+        except OSError:
+            return False
+        mirror_objects = (self.get_mirror_path(url) / "objects").resolve()
+        return any(Path(x).resolve() == mirror_objects for x in alternates if x)
+
+
+@contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Hold an exclusive lock on the given file, waiting for
+    other processes to release it if needed.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("a") as fp:
+        _lock(fp)
+        try:
+            yield
+        finally:
+            _unlock(fp)
+
+
+def _lock(fp: IO[Any]) -> None:
+    if sys.platform == "win32":
+        msvcrt.locking(fp.fileno(), msvcrt.LK_LOCK, 1)
+    else:
+        fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock(fp: IO[Any]) -> None:
+    if sys.platform == "win32":
+        msvcrt.locking(fp.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
@@ -1,11 +1,15 @@
 from pathlib import Path
-from typing import List, Optional
+from typing import List
 
 import cli_ui as ui
 
 from tsrc.executor import Outcome, Task
-from tsrc.git import run_git, run_git_captured
-from tsrc.git_remote import remote_urls_are_same
+from tsrc.git import run_git
+from tsrc.git_remote import (
+    add_remotes_to_config,
+    get_remote_urls,
+    remote_urls_are_same,
+)
 from tsrc.repo import Remote, Repo
 
 
@@ -36,29 +40,26 @@ class RemoteSetter(Task[Repo]):
         #   When self.parallel is True we need to return a string describing
         #   all the changes, otherwise, we can just call cli_ui.info() directly
         summary_lines = []
+        full_path = self.workspace_path / repo.dest
+        existing_urls = get_remote_urls(full_path)
+        to_add = []
         for remote in repo.remotes:
-            existing_remote = self.get_remote(repo, remote.name)
-            if existing_remote:
-                if remote_urls_are_same(existing_remote.url, remote.url) is False:
+            existing_url = existing_urls.get(remote.name)
+            if existing_url is not None:
+                if remote_urls_are_same(existing_url, remote.url) is False:
                     self.set_remote(repo, remote)
                     summary_lines.append(
                         f"{repo.dest}: remote '{remote.name}' set to '{remote.url}'"
                     )
             else:
-                self.add_remote(repo, remote)
+                to_add.append(remote)
                 summary_lines.append(
                     f"{repo.dest}: added remote '{remote.name}' with url: '{remote.url}'"
                 )
+        if to_add:
+            self.add_remotes(repo, to_add)
         return Outcome.from_lines(summary_lines)
 
-    def get_remote(self, repo: Repo, name: str) -> Optional[Remote]:
-        full_path = self.workspace_path / repo.dest
-        rc, url = run_git_captured(full_path, "remote", "get-url", name, check=False)
-        if rc != 0:
-            return None
-        else:
-            return Remote(name=name, url=url)
-
     def set_remote(self, repo: Repo, remote: Remote) -> None:
         full_path = self.workspace_path / repo.dest
         # fmt: off
@@ -70,12 +71,16 @@ class RemoteSetter(Task[Repo]):
         # fmt: on
         run_git(full_path, "remote", "set-url", remote.name, remote.url)
 
-    def add_remote(self, repo: Repo, remote: Remote) -> None:
+    def add_remotes(self, repo: Repo, remotes: List[Remote]) -> None:
         full_path = self.workspace_path / repo.dest
-        # fmt: off
-        self.info_3(
-            repo.dest + ":", "Add remote", ui.reset,
-            ui.bold, remote.name, ui.reset, ui.brown, f"({remote.url})"
-        )
-        # fmt: on
-        self.run_git(full_path, "remote", "add", remote.name, remote.url)
+        for remote in remotes:
+            # fmt: off
+            self.info_3(
+                repo.dest + ":", "Add remote", ui.reset,
+                ui.bold, remote.name, ui.reset, ui.brown, f"({remote.url})"
+            )
+            # fmt: on
+        if add_remotes_to_config(full_path, remotes):
+            return
+        for remote in remotes:
+            self.run_git(full_path, "remote", "add", remote.name, remote.url)
@@ -51,6 +51,8 @@ class Repo:
     sha1_full: Optional[str] = None  # used for RepoGrabber
     tag: Optional[str] = None
     shallow: bool = False
+    # passed as `git clone --filter`, see CLONE_FILTER_RE
+    clone_filter: Optional[str] = None
     ignore_submodules: bool = False
     is_bare: bool = False
     # only used by RepoGrabber
@@ -0,0 +1,270 @@
+"""
+Repo watcher
+
+Tell which repos of the workspace changed on disk, using inotify
+(through ctypes, so this only works on Linux).
+
+For each repo, the following directories are watched:
+
+* the `.git` directory (HEAD, index, config, packed-refs ...)
+  and the directories holding loose refs,
+* the top of the working tree, and every directory containing
+  tracked files, as listed in the index,
+* directories created later on in any of those, so that
+  files added to new untracked directories are noticed.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import functools
+import operator
+import os
+import select
+import struct
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import TracebackType
+from typing import Dict, Iterator, Optional, Set, Tuple, Type
+
+from tsrc.errors import Error
+from tsrc.gitfs import GitDir
+
+# See inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = functools.reduce(
+    operator.or_,
+    [
+        IN_MODIFY,
+        IN_ATTRIB,
+        IN_MOVED_FROM,
+        IN_MOVED_TO,
+        IN_CREATE,
+        IN_DELETE,
+        IN_DELETE_SELF,
+        IN_MOVE_SELF,
+        IN_ONLYDIR,
+    ],
+)
+
+EVENT_HEADER = struct.Struct("iIII")
+
+# How long to wait for more events once one was received, so that
+# a `git checkout` or an editor saving a file triggers only one
+# refresh
+DEBOUNCE_DELAY = 0.2
+MAX_DEBOUNCE_DELAY = 2.0
+
+
+class WatchNotSupported(Error):
+    def __init__(self, reason: str) -> None:
+        super().__init__(f"Cannot watch for changes: {reason}")
+
+
+@dataclass
+class _Watch:
+    path: Path
+    dests: Set[str] = field(default_factory=set)
+    in_git_dir: bool = False
+    # whether new sub-directories must be watched too
+    recursive: bool = False
+
+
+class Inotify:
+    """Thin wrapper around the inotify system calls"""
+
+    def __init__(self) -> None:
+        if not sys.platform.startswith("linux"):
+            raise WatchNotSupported("inotify is only available on Linux")
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        except OSError:
+            raise WatchNotSupported("libc not found")
+        if not hasattr(self._libc, "inotify_init1"):
+            raise WatchNotSupported("inotify functions not found in libc")
+        self.fd: int = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise WatchNotSupported(os.strerror(ctypes.get_errno()))
+
+    def add_watch(self, path: Path, mask: int) -> int:
+        """Return the watch descriptor, raise OSError on failure"""
+        wd: int = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), str(path))
+        return wd
+
+    def read_events(self) -> Iterator[Tuple[int, int, str]]:
+        """Yield (wd, mask, name) for the pending events, without blocking"""
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset + EVENT_HEADER.size <= len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                yield wd, mask, name
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """Return True if events are pending"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        return bool(ready)
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class RepoWatcher:
+    """Usage:
+
+    >>> with RepoWatcher() as watcher:
+    ...     watcher.add_repo("foo", workspace_path / "foo")
+    ...     while True:
+    ...         changed = watcher.wait_for_changes()
+    ...         # changed is {"foo"} when something changed in foo
+
+    `incomplete` is set when some directories could not be watched
+    (usually because the fs.inotify.max_user_watches limit was
+    reached)
+    """
+
+    def __init__(self) -> None:
+        self.inotify = Inotify()
+        self.dests: Set[str] = set()
+        self.incomplete = False
+        self._watches: Dict[int, _Watch] = {}
+
+    def __enter__(self) -> "RepoWatcher":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.inotify.close()
+
+    def add_repo(self, dest: str, working_path: Path) -> None:
+        self.dests.add(dest)
+        git_dir = GitDir.find(working_path)
+        if git_dir:
+            for path in {git_dir.path, git_dir.common_path}:
+                self._add_watch(dest, path, in_git_dir=True)
+            for ref_dir in ("refs/heads", "refs/remotes", "refs/tags"):
+                self._add_tree(dest, git_dir.common_path / ref_dir, in_git_dir=True)
+        worktree_dirs = {working_path}
+        entries = git_dir.read_index_entries() if git_dir else None
+        for entry_path, _ in entries or []:
+            parent = (working_path / entry_path).parent
+            while parent not in worktree_dirs:
+                worktree_dirs.add(parent)
+                parent = parent.parent
+        for path in sorted(worktree_dirs):
+            self._add_watch(dest, path, recursive=True)
+
+    def fileno(self) -> int:
+        """Return a file descriptor that becomes readable when
+        something changed, for use with select()
+        """
+        return self.inotify.fd
+
+    def wait_for_changes(self, timeout: Optional[float] = None) -> Set[str]:
+        """Wait for something to change, and return the dests of the repos
+        where it did. Return an empty set if nothing changed before the
+        timeout expired.
+        """
+        res: Set[str] = set()
+        if not self.inotify.wait(timeout):
+            return res
+        start = time.monotonic()
+        while True:
+            res |= self.read_changes()
+            if time.monotonic() - start > MAX_DEBOUNCE_DELAY:
+                break
+            if not self.inotify.wait(DEBOUNCE_DELAY):
+                break
+        return res
+
+    def read_changes(self) -> Set[str]:
+        """Return the dests of the repos where something changed
+        according to the pending events, without waiting
+        """
+        res: Set[str] = set()
+        for wd, mask, name in self.inotify.read_events():
+            res |= self._handle_event(wd, mask, name)
+        return res
+
+    def _handle_event(self, wd: int, mask: int, name: str) -> Set[str]:
+        if mask & IN_Q_OVERFLOW:
+            # Note: some events were lost, assume everything changed
+            return set(self.dests)
+        watch = self._watches.get(wd)
+        if not watch:
+            return set()
+        if mask & IN_IGNORED:
+            # the directory was removed
+            del self._watches[wd]
+            return set(watch.dests)
+        if watch.in_git_dir and name.endswith(".lock"):
+            # Note: git writes files under `.git` by renaming a .lock
+            # file, which triggers its own event
+            return set()
+        if watch.recursive and mask & IN_CREATE and mask & IN_ISDIR:
+            for dest in watch.dests:
+                self._add_tree(dest, watch.path / name, in_git_dir=watch.in_git_dir)
+        return set(watch.dests)
+
+    def _add_tree(self, dest: str, top: Path, *, in_git_dir: bool = False) -> None:
+        if top.name == ".git":
+            return
+        self._add_watch(dest, top, in_git_dir=in_git_dir, recursive=True)
+        for dir_path, dir_names, _ in os.walk(top):
+            if ".git" in dir_names:
+                dir_names.remove(".git")
+            for name in dir_names:
+                self._add_watch(
+                    dest, Path(dir_path) / name, in_git_dir=in_git_dir, recursive=True
+                )
+
+    def _add_watch(
+        self,
+        dest: str,
+        path: Path,
+        *,
+        in_git_dir: bool = False,
+        recursive: bool = False,
+    ) -> None:
+        try:
+            wd = self.inotify.add_watch(path, WATCH_MASK)
+        except OSError as e:
+            if e.errno != errno.ENOENT:
+                self.incomplete = True
+            return
+        # Note: inotify returns the same descriptor when a directory is
+        # watched twice, for instance when repos are nested
+        watch = self._watches.setdefault(wd, _Watch(path, in_git_dir=in_git_dir))
+        watch.dests.add(dest)
+        watch.recursive = watch.recursive or recursive
@@ -0,0 +1,179 @@
+"""
+Retries
+
+`git fetch` and `git clone` sometimes fail because the connection
+to the server dropped, or because the server was too busy, rather
+than because of what was asked. Such failures are called transient:
+they are recognized by the error messages of git (see TRANSIENT_ERRORS),
+and the command is run again after a delay, instead of making the
+whole repo fail.
+
+The delay doubles after each attempt (up to MAX_DELAY), with some
+randomness, so that repos failing at the same time do not all hit
+the server again at the same time. Transient errors, including the
+last one when giving up, are also reported to tsrc.host_limits, which
+may lower the number of jobs for the server.
+
+Environment variables:
+
+* TSRC_RETRY_ATTEMPTS: how many times a command is run before
+  giving up (default: 3, 1 disables retries)
+* TSRC_RETRY_DELAY: how long to wait before the first retry, in seconds
+  (default: 1)
+"""
+
+import asyncio
+import os
+import random
+import re
+import signal
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from tsrc.errors import Error
+from tsrc.git import GitCommandError
+from tsrc.host_limits import report_transient_error
+
+T = TypeVar("T")
+
+# Note: git exits with 128 on most fatal errors, whether transient or not,
+# so only the messages can tell them apart
+TRANSIENT_ERRORS = re.compile(
+    "|".join(
+        [
+            r"Connection (reset|refused|timed out|closed)",
+            r"Could not resolve host",
+            r"Operation timed out",
+            r"early EOF",
+            r"the remote end hung up unexpectedly",
+            r"unexpected disconnect",
+            r"RPC failed",
+            r"Failed to connect to",
+            r"unable to access '.*': .*(timed out|reset|refused|error: 5\d\d)",
+            r"The requested URL returned error: (429|5\d\d)",
+            r"ssh: connect to host .*: ",
+            r"kex_exchange_identification",
+            r"index-pack failed",
+        ]
+    ),
+    re.IGNORECASE,
+)
+
+# Signals that kill git when the connection drops, for instance SIGPIPE
+# when the server closes it. Other ones (like SIGINT when the user hits
+# Ctrl-C, or SIGTERM) must stop tsrc rather than be retried.
+# Note: SIGPIPE does not exist on Windows
+TRANSIENT_SIGNALS = [getattr(signal, "SIGPIPE", None)]
+
+MAX_DELAY = 30.0
+
+# Called before waiting for the next attempt, with the error
+# and the delay in seconds
+OnRetry = Callable[[GitCommandError, float], None]
+
+
+class InvalidRetrySetting(Error):
+    def __init__(self, name: str, value: str) -> None:
+        super().__init__(f"Invalid {name} value: '{value}'")
+
+
+@dataclass
+class RetryPolicy:
+    attempts: int = 3
+    delay: float = 1.0
+
+    @classmethod
+    def from_env(cls) -> "RetryPolicy":
+        res = cls()
+        attempts = os.environ.get("TSRC_RETRY_ATTEMPTS")
+        if attempts is not None:
+            if not attempts.isdigit() or int(attempts) < 1:
+                raise InvalidRetrySetting("TSRC_RETRY_ATTEMPTS", attempts)
+            res.attempts = int(attempts)
+        delay = os.environ.get("TSRC_RETRY_DELAY")
+        if delay is not None:
+            try:
+                res.delay = float(delay)
+            except ValueError:
+                raise InvalidRetrySetting("TSRC_RETRY_DELAY", delay)
+            if res.delay < 0:
+                raise InvalidRetrySetting("TSRC_RETRY_DELAY", delay)
+        return res
+
+    def get_delay(self, attempt: int) -> float:
+        """Return how long to wait after the given attempt failed
+        (the first one is 1)
+        """
+        delay = min(self.delay * 2.0 ** (attempt - 1), MAX_DELAY)
+        return delay * random.uniform(0.5, 1.0)
+
+
+def is_transient(error: GitCommandError) -> bool:
+    if error.returncode is not None and error.returncode < 0:
+        # Note: git was killed by a signal
+        return -error.returncode in TRANSIENT_SIGNALS
+    text = "\n".join(filter(None, [error.output, error.error]))
+    return bool(TRANSIENT_ERRORS.search(text))
+
+
+def retry(
+    func: Callable[[], T],
+    *,
+    on_retry: Optional[OnRetry] = None,
+    cleanup: Optional[Callable[[], None]] = None,
+    policy: Optional[RetryPolicy] = None,
+) -> T:
+    """Call `func` until it does not raise a transient GitCommandError,
+    or until the number of attempts is reached. `cleanup` is called
+    before each retry, for instance to remove what a failed `git clone`
+    left behind.
+    """
+    policy = policy or RetryPolicy.from_env()
+    attempt = 1
+    while True:
+        try:
+            return func()
+        except GitCommandError as e:
+            if not is_transient(e):
+                raise
+            # Note: also report the last error, so that the limit of the
+            # host is lowered even when giving up (see tsrc.host_limits)
+            report_transient_error()
+            if attempt >= policy.attempts:
+                raise
+            delay = policy.get_delay(attempt)
+            if on_retry:
+                on_retry(e, delay)
+            time.sleep(delay)
+        if cleanup:
+            cleanup()
+        attempt += 1
+
+
+async def retry_async(
+    func: Callable[[], Awaitable[T]],
+    *,
+    on_retry: Optional[OnRetry] = None,
+    cleanup: Optional[Callable[[], None]] = None,
+    policy: Optional[RetryPolicy] = None,
+) -> T:
+    """Same as retry(), for coroutines"""
+    policy = policy or RetryPolicy.from_env()
+    attempt = 1
+    while True:
+        try:
+            return await func()
+        except GitCommandError as e:
+            if not is_transient(e):
+                raise
+            report_transient_error()
+            if attempt >= policy.attempts:
+                raise
+            delay = policy.get_delay(attempt)
+            if on_retry:
+                on_retry(e, delay)
+            await asyncio.sleep(delay)
+        if cleanup:
+            cleanup()
+        attempt += 1
@@ -0,0 +1,435 @@
+"""
+Workspace state database
+
+Record what tsrc learned about each repo of the workspace in
+`<workspace>/.tsrc/state.sqlite`, so that other commands can read
+it instead of running git again:
+
+* result of the last `tsrc status`, and the stamp used to
+  check it is still valid (see tsrc.status_cache),
+* how long each kind of task took, to start the longest
+  jobs first (see tsrc.durations),
+* the manifest entry and HEAD of each repo after the last
+  successful sync (see tsrc.manifest_diff and `sync --incremental`),
+* the progress of the current `init` or `sync` (see tsrc.journal).
+
+This is only a record: it may be missing or out of date (for
+instance if git was used directly in a repo), and failing to read
+or write it is never an error.
+"""
+
+import contextlib
+import json
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any, Collection, Dict, Iterator, List, Optional, Tuple
+
+from tsrc.gitfs import GitDir
+from tsrc.manifest_diff import RepoEntry
+
+# Bump this when the tables change - the previous
+# contents are then discarded
+SCHEMA_VERSION = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS timings (
+    kind TEXT,
+    dest TEXT,
+    seconds REAL,
+    recorded REAL,
+    PRIMARY KEY (kind, dest)
+);
+CREATE TABLE IF NOT EXISTS synced (
+    dest TEXT PRIMARY KEY,
+    entry TEXT,
+    head TEXT
+);
+CREATE TABLE IF NOT EXISTS status_cache (
+    dest TEXT PRIMARY KEY,
+    stamp TEXT,
+    paths TEXT,
+    status TEXT
+);
+CREATE TABLE IF NOT EXISTS journal_runs (
+    command TEXT PRIMARY KEY,
+    started REAL
+);
+CREATE TABLE IF NOT EXISTS journal (
+    command TEXT,
+    dest TEXT,
+    step TEXT,
+    done INTEGER,
+    entry TEXT,
+    head TEXT,
+    PRIMARY KEY (command, dest, step)
+);
+"""
+
+TABLES = ["timings", "synced", "status_cache", "journal_runs", "journal"]
+
+# Tables of previous versions of the schema, dropped along with the others
+OLD_TABLES = ["repos"]
+
+Statement = Tuple[str, Tuple[Any, ...]]
+
+
+@dataclass(frozen=True)
+class CachedStatus:
+    stamp: str
+    # paths of the work tree the stamp was computed from
+    paths: List[str]
+    # see tsrc.status_cache.dump_status()
+    values: Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class JournalStep:
+    done: bool
+    # manifest entry of the repo, and its HEAD, once the step is done
+    entry: Optional[RepoEntry] = None
+    head: Optional[str] = None
+
+
+class StateDB:
+    """Usage:
+
+    >>> state_db = StateDB.for_workspace(workspace_path)
+    >>> state_db.record_timings("fetch", {"foo": 1.5})
+    >>> state_db.get_timings("fetch")
+    {"foo": 1.5}
+
+    Can be used from several threads at once.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.lock = Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._broken = False
+        # statements waiting for the end of batch()
+        self._pending: Optional[List[Statement]] = None
+
+    @classmethod
+    def for_workspace(cls, root_path: Path) -> "StateDB":
+        return cls(root_path / ".tsrc" / "state.sqlite")
+
+    @contextlib.contextmanager
+    def batch(self) -> Iterator[None]:
+        """Write what is recorded in the `with` block in one transaction,
+        once the block is done, instead of one transaction per record
+        """
+        with self.lock:
+            nested = self._pending is not None
+            if not nested:
+                self._pending = []
+        if nested:
+            yield
+            return
+        try:
+            yield
+        finally:
+            with self.lock:
+                statements = self._pending or []
+                self._pending = None
+            self._write(statements)
+
+    def record_cached_status(self, dest: str, cached: CachedStatus) -> None:
+        self._write(
+            [
+                (
+                    "INSERT OR REPLACE INTO status_cache (dest, stamp, paths, status) "
+                    "VALUES (?, ?, ?, ?)",
+                    (
+                        dest,
+                        cached.stamp,
+                        json.dumps(cached.paths),
+                        json.dumps(cached.values, sort_keys=True),
+                    ),
+                )
+            ]
+        )
+
+    def record_timings(self, kind: str, timings: Dict[str, float]) -> None:
+        now = time.time()
+        statements: List[Statement] = [
+            (
+                "INSERT OR REPLACE INTO timings (kind, dest, seconds, recorded) "
+                "VALUES (?, ?, ?, ?)",
+                (kind, dest, seconds, now),
+            )
+            for (dest, seconds) in timings.items()
+        ]
+        self._write(statements)
+
+    def record_synced(
+        self,
+        recorded: Dict[str, Tuple[RepoEntry, str]],
+        *,
+        forgotten: Collection[str] = (),
+    ) -> None:
+        """Record the manifest entry and HEAD of repos that were
+        successfully synchronized, and forget about other ones
+        """
+        statements: List[Statement] = [
+            ("DELETE FROM synced WHERE dest = ?", (dest,)) for dest in forgotten
+        ]
+        for dest, (entry, head) in recorded.items():
+            statements.append(
+                (
+                    "INSERT OR REPLACE INTO synced (dest, entry, head) VALUES (?, ?, ?)",
+                    (dest, json.dumps(entry, sort_keys=True), head),
+                )
+            )
+        self._write(statements)
+
+    def start_journal(self, command: str) -> None:
+        """Forget about the progress of the previous run of the given
+        command, and record that a new one started
+        """
+        self._write(
+            [
+                # Note: clones that never finished are kept, so that
+                # what they left behind can still be removed
+                (
+                    "DELETE FROM journal WHERE command = ? "
+                    "AND (step != 'clone' OR done = 1)",
+                    (command,),
+                ),
+                (
+                    "INSERT OR REPLACE INTO journal_runs (command, started) "
+                    "VALUES (?, ?)",
+                    (command, time.time()),
+                ),
+            ]
+        )
+
+    def clear_journal(self, command: str) -> None:
+        self._write(
+            [
+                ("DELETE FROM journal WHERE command = ?", (command,)),
+                ("DELETE FROM journal_runs WHERE command = ?", (command,)),
+            ]
+        )
+
+    def record_steps(
+        self, command: str, steps: Dict[Tuple[str, str], JournalStep]
+    ) -> None:
+        """Record the given steps, by (dest, step), in one transaction"""
+        statements: List[Statement] = []
+        for (dest, step), value in steps.items():
+            entry = (
+                None if value.entry is None else json.dumps(value.entry, sort_keys=True)
+            )
+            statements.append(
+                (
+                    "INSERT OR REPLACE INTO journal "
+                    "(command, dest, step, done, entry, head) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (command, dest, step, int(value.done), entry, value.head),
+                )
+            )
+        self._write(statements)
+
+    def get_unfinished_clones(self) -> List[str]:
+        """Return the dests of the clones that started but were
+        never done, by any command
+        """
+        rows = self._read(
+            "SELECT DISTINCT dest FROM journal WHERE step = 'clone' AND done = 0", ()
+        )
+        return [dest for (dest,) in rows]
+
+    def forget_unfinished_clones(self, dests: Collection[str]) -> None:
+        self._write(
+            [
+                (
+                    "DELETE FROM journal WHERE dest = ? AND step = 'clone' AND done = 0",
+                    (dest,),
+                )
+                for dest in dests
+            ]
+        )
+
+    def get_journal_start(self, command: str) -> Optional[float]:
+        """Return when the unfinished run of the given command
+        started, if any
+        """
+        rows = self._read(
+            "SELECT started FROM journal_runs WHERE command = ?", (command,)
+        )
+        if not rows:
+            return None
+        started: float = rows[0][0]
+        return started
+
+    def get_journal_steps(self, command: str) -> Dict[Tuple[str, str], JournalStep]:
+        """Return the steps recorded for the given command,
+        by (dest, step)
+        """
+        rows = self._read(
+            "SELECT dest, step, done, entry, head FROM journal WHERE command = ?",
+            (command,),
+        )
+        res = {}
+        for dest, step, done, entry, head in rows:
+            parsed = _load_json(entry)
+            res[(dest, step)] = JournalStep(
+                done=bool(done),
+                entry=parsed if isinstance(parsed, dict) else None,
+                head=head,
+            )
+        return res
+
+    def get_cached_status(self, dest: str) -> Optional[CachedStatus]:
+        """Return the last status recorded for the repo, if any. It is
+        only valid if the stamp of the repo did not change since
+        """
+        rows = self._read(
+            "SELECT stamp, paths, status FROM status_cache WHERE dest = ?", (dest,)
+        )
+        if not rows:
+            return None
+        stamp, paths, values = rows[0]
+        paths = _load_json(paths)
+        values = _load_json(values)
+        if not isinstance(paths, list) or not isinstance(values, dict):
+            return None
+        return CachedStatus(stamp=stamp, paths=paths, values=values)
+
+    def get_timings(self, kind: str) -> Dict[str, float]:
+        rows = self._read("SELECT dest, seconds FROM timings WHERE kind = ?", (kind,))
+        return dict(rows)
+
+    def get_synced_entries(self) -> Dict[str, RepoEntry]:
+        rows = self._read("SELECT dest, entry FROM synced", ())
+        res = {}
+        for dest, entry in rows:
+            parsed = _load_json(entry)
+            if isinstance(parsed, dict):
+                res[dest] = parsed
+        return res
+
+    def get_synced_head(self, dest: str) -> Optional[str]:
+        rows = self._read("SELECT head FROM synced WHERE dest = ?", (dest,))
+        if not rows:
+            return None
+        head: Optional[str] = rows[0][0]
+        return head
+
+    def close(self) -> None:
+        with self.lock:
+            if self._connection:
+                self._connection.close()
+                self._connection = None
+
+    def _write(self, statements: List[Statement]) -> None:
+        if not statements:
+            return
+        with self.lock:
+            if self._pending is not None:
+                self._pending.extend(statements)
+                return
+            connection = self._connect(create=True)
+            if not connection:
+                return
+            try:
+                connection.execute("BEGIN")
+                for sql, params in statements:
+                    connection.execute(sql, params)
+                connection.execute("COMMIT")
+            except sqlite3.Error:
+                _rollback(connection)
+
+    def _read(self, sql: str, params: Tuple[Any, ...]) -> List[Tuple[Any, ...]]:
+        with self.lock:
+            connection = self._connect(create=False)
+            if not connection:
+                return []
+            try:
+                return connection.execute(sql, params).fetchall()
+            except sqlite3.Error:
+                return []
+
+    def _connect(self, *, create: bool) -> Optional[sqlite3.Connection]:
+        # Note: must be called while holding self.lock
+        if self._connection or self._broken:
+            return self._connection
+        if not create and not self.path.exists():
+            return None
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Note: transactions are handled explicitly, see _write()
+            connection = sqlite3.connect(
+                str(self.path),
+                timeout=10,
+                isolation_level=None,
+                check_same_thread=False,
+            )
+            _init_schema(connection)
+        except (sqlite3.Error, OSError):
+            self._broken = True
+            return None
+        self._connection = connection
+        return connection
+
+
+def _init_schema(connection: sqlite3.Connection) -> None:
+    # Note: with a write-ahead log, readers do not block writers, and
+    # commits do not need to wait for the disk with synchronous=NORMAL
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    (version,) = connection.execute("PRAGMA user_version").fetchone()
+    if version == SCHEMA_VERSION:
+        return
+    connection.execute("BEGIN")
+    try:
+        for table in TABLES + OLD_TABLES:
+            connection.execute(f"DROP TABLE IF EXISTS {table}")
+        for statement in SCHEMA.split(";"):
+            if statement.strip():
+                connection.execute(statement)
+        connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        connection.execute("COMMIT")
+    except sqlite3.Error:
+        _rollback(connection)
+        raise
+
+
+def _rollback(connection: sqlite3.Connection) -> None:
+    try:
+        connection.execute("ROLLBACK")
+    except sqlite3.Error:
+        pass
+
+
+def _load_json(value: Optional[str]) -> Any:
+    if value is None:
+        return None
+    try:
+        return json.loads(value)
+    except ValueError:
+        return None
+
+
+def read_head_state(
+    repo_path: Path,
+) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """Return the sha1 of HEAD, the current branch and the sha1 of its
+    upstream, reading the files in the `.git` directory
+    """
+    git_dir = GitDir.find(repo_path)
+    if not git_dir:
+        return None, None, None
+    head = git_dir.resolve_ref("HEAD")
+    branch = None
+    head_branch = git_dir.head_branch()
+    if head_branch and head_branch.startswith("refs/heads/"):
+        branch = head_branch[len("refs/heads/") :]
+    upstream = None
+    upstream_ref = git_dir.upstream_ref()
+    if upstream_ref:
+        upstream = git_dir.resolve_ref(upstream_ref)
+    return head, branch, upstream
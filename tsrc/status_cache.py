@@ -0,0 +1,308 @@
+"""
+Status cache
+
+Most repos of a workspace do not change between two runs of
+`tsrc status`. For each repo, the result of the last one is
+recorded in the state database (see tsrc.state_db), along with
+a *stamp*, computed from:
+
+* the metadata (mtime, size, inode and mode) of HEAD, the index, the
+  config, `info/exclude`, `packed-refs` and loose refs in the `.git`
+  directory,
+* the latest change time (ctime or mtime, whichever is later) of a list
+  of paths of the work tree, along with the number of them that are
+  missing. Writing to a file, or creating or removing a file in a
+  directory, sets its change time to the current time, so no per-path
+  data needs to be kept: this is how modified files and new untracked
+  files are noticed.
+
+The paths are the tracked files, the directories containing them, and
+the untracked directories git does not ignore, with their subdirectories
+(so that a file added to an empty untracked directory is noticed). They
+are recorded along with the stamp: checking the stamp again only takes
+one lstat() per path, without reading the index or running git. Any
+change to that list changes the stamp anyway, through the index or the
+change time of a directory.
+
+If the stamp did not change, the recorded status is used instead
+of running git.
+
+No stamp is computed (and so the cache is not used) for repos
+whose index this module cannot read, for repos containing
+submodules, for repos with more than MAX_STAMPED_PATHS paths to
+check (git, which compares the index with one lstat() per file too,
+is faster there), and when any of those files was modified less than
+RACY_DELAY seconds ago, because a later change in the same
+timestamp granularity could go unnoticed. Repos configured with
+`core.fsmonitor` are not cached either: git already knows which
+files changed there, and `git status` does not need to look at every
+file.
+
+Known limitation: changes to the global excludes file of git
+(`core.excludesFile`) are not noticed. Use `tsrc status --no-cache`
+when in doubt.
+"""
+
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from tsrc.git import GitStatus, get_git_status, run_git_captured
+from tsrc.git_remote import GitRemote, get_git_remotes
+from tsrc.gitfs import GITLINK_MODE, GitConfig, GitDir, get_config_value
+from tsrc.repo import Remote
+from tsrc.state_db import CachedStatus, StateDB
+
+RACY_DELAY = 2.0
+
+# Above this number of paths, checking the stamp takes about as long as
+# running `git status` (see the 'status-cache-hit' benchmark in
+# tsrc.test.benchmark)
+MAX_STAMPED_PATHS = 5000
+
+# Attributes of GitStatus stored in the cache
+STATUS_KEYS = [
+    "empty",
+    "untracked",
+    "staged",
+    "not_staged",
+    "added",
+    "ahead",
+    "behind",
+    "dirty",
+    "tag",
+    "branch",
+    "upstream",
+    "sha1",
+]
+
+# Files of the `.git` directory that may change the status,
+# relative to GitDir.path
+GIT_FILES = ["HEAD", "index", "config.worktree"]
+
+# Same, but relative to GitDir.common_path
+COMMON_FILES = ["config", "packed-refs", "info/exclude"]
+COMMON_REF_DIRS = ["refs/heads", "refs/remotes", "refs/tags"]
+
+
+def get_stamped_paths(working_path: Path) -> Optional[List[str]]:
+    """Return the paths of the work tree the stamp of the repo is
+    computed from, relative to `working_path`, or None if the status
+    should not be cached (see module docstring)
+    """
+    git_dir = GitDir.find(working_path)
+    if not git_dir:
+        return None
+    tracked = get_tracked_paths(git_dir)
+    if tracked is None:
+        return None
+    untracked = get_untracked_dirs(working_path)
+    if untracked is None:
+        return None
+    # Note: "" is the top of the work tree
+    directories = {""}
+    for path in tracked:
+        parent = os.path.dirname(path)
+        while parent not in directories:
+            directories.add(parent)
+            parent = os.path.dirname(parent)
+    res = tracked + sorted(directories) + untracked
+    if len(res) > MAX_STAMPED_PATHS:
+        return None
+    return res
+
+
+def get_repo_stamp(working_path: Path, paths: List[str]) -> Optional[str]:
+    """Return the stamp of the repo, computed from its git directory and
+    from the given paths of its work tree (see get_stamped_paths()),
+    or None if they changed too recently for the status to be cached
+    """
+    git_dir = GitDir.find(working_path)
+    if not git_dir:
+        return None
+    git_paths = [str(git_dir.path / x) for x in GIT_FILES]
+    git_paths += [str(git_dir.common_path / x) for x in COMMON_FILES]
+    for ref_dir in COMMON_REF_DIRS:
+        git_paths += _walk(git_dir.common_path / ref_dir)
+
+    digest = hashlib.sha1()
+    racy_limit = time.time_ns() - int(RACY_DELAY * 1e9)
+    for path in git_paths:
+        try:
+            stat = os.lstat(path)
+        except OSError:
+            digest.update(f"{path}\0missing\0".encode(errors="surrogateescape"))
+            continue
+        if stat.st_mtime_ns >= racy_limit:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size, stat.st_ino, stat.st_mode)
+        digest.update(f"{path}\0{stamp}\0".encode(errors="surrogateescape"))
+
+    latest, missing = get_work_tree_changes(working_path, paths)
+    if latest >= racy_limit:
+        return None
+    digest.update(f"{latest}\0{missing}\0".encode())
+    return digest.hexdigest()
+
+
+def get_tracked_paths(git_dir: GitDir) -> Optional[List[str]]:
+    """Return the paths of the files in the index, or None
+    if the status of the repo should not be cached
+    """
+    config = git_dir.read_config()
+    if config is None or uses_fsmonitor(config):
+        return None
+    entries = git_dir.read_index_entries()
+    if entries is None:
+        return None
+    if any(mode == GITLINK_MODE for (_, mode) in entries):
+        return None
+    return [path for (path, _) in entries]
+
+
+def get_untracked_dirs(working_path: Path) -> Optional[List[str]]:
+    """Return the untracked directories that are not ignored, along with
+    all their subdirectories, or None if git could not list them
+    """
+    returncode, out = run_git_captured(
+        working_path,
+        "ls-files",
+        "--others",
+        "--directory",
+        "--exclude-standard",
+        "-z",
+        check=False,
+    )
+    if returncode != 0:
+        return None
+    res = []
+    top = str(working_path)
+    for entry in out.split("\0"):
+        # Note: untracked files are noticed with the change time
+        # of their directory
+        if not entry.endswith("/"):
+            continue
+        for dir_path, dir_names, file_names in os.walk(os.path.join(top, entry)):
+            res.append(os.path.relpath(dir_path, top))
+            # Note: git does not look into nested repos either
+            if ".git" in dir_names or ".git" in file_names:
+                dir_names.clear()
+            dir_names.sort()
+    return res
+
+
+def uses_fsmonitor(config: GitConfig) -> bool:
+    value = get_config_value(config, "core.fsmonitor")
+    return value is not None and value.lower() not in ("", "false", "no", "off", "0")
+
+
+def get_work_tree_changes(working_path: Path, paths: List[str]) -> Tuple[int, int]:
+    """Return the latest change time of the given paths, in nanoseconds,
+    and the number of them that are missing
+    """
+    # Note: st_ctime is the creation time on Windows, hence st_mtime.
+    # This loop is what cache hits spend their time in, hence the
+    # plain string concatenation and comparisons
+    latest = 0
+    missing = 0
+    prefix = os.path.join(str(working_path), "")
+    for path in paths:
+        try:
+            stat = os.lstat(prefix + path)
+        except OSError:
+            missing += 1
+            continue
+        if stat.st_ctime_ns > latest:
+            latest = stat.st_ctime_ns
+        if stat.st_mtime_ns > latest:
+            latest = stat.st_mtime_ns
+    return latest, missing
+
+
+def _walk(top: Path) -> Iterator[str]:
+    yield str(top)
+    for dir_path, dir_names, file_names in os.walk(top):
+        dir_names.sort()
+        for name in sorted(dir_names + file_names):
+            yield os.path.join(dir_path, name)
+
+
+def get_status(
+    working_path: Path,
+    *,
+    dest: str,
+    state_db: StateDB,
+    with_remote: bool,
+    use_cache: bool = True,
+    known_values: Optional[Dict[str, Any]] = None,
+) -> Tuple[GitStatus, Optional[GitRemote]]:
+    """Return the git status of the repo, and its remotes if `with_remote`
+    is True and a branch is checked out.
+
+    Use `known_values` if given (they come from `tsrc daemon`, see
+    tsrc.daemon), or the results recorded during a previous call if the
+    stamp of the repo did not change, otherwise run git and record
+    the results.
+    """
+    if known_values:
+        loaded = load_status(working_path, known_values, with_remote=with_remote)
+        if loaded:
+            return loaded
+    cached = state_db.get_cached_status(dest) if use_cache else None
+    if cached and get_repo_stamp(working_path, cached.paths) == cached.stamp:
+        loaded = load_status(working_path, cached.values, with_remote=with_remote)
+        if loaded:
+            return loaded
+    paths = get_stamped_paths(working_path) if use_cache else None
+    stamp = get_repo_stamp(working_path, paths) if paths is not None else None
+    git_status = get_git_status(working_path)
+    git_remote = None
+    if with_remote and git_status.branch:
+        git_remote = get_git_remotes(working_path, git_status.branch)
+    if paths is not None and stamp:
+        values = dump_status(git_status, git_remote)
+        cached = CachedStatus(stamp=stamp, paths=paths, values=values)
+        state_db.record_cached_status(dest, cached)
+    return git_status, git_remote
+
+
+def dump_status(
+    git_status: GitStatus, git_remote: Optional[GitRemote]
+) -> Dict[str, Any]:
+    res: Dict[str, Any] = {k: getattr(git_status, k) for k in STATUS_KEYS}
+    res["sha1_full"] = git_status.sha1_full
+    if git_remote:
+        res["remote"] = {
+            "branch": git_remote.branch,
+            "remotes": [{"name": x.name, "url": x.url} for x in git_remote.remotes],
+            "upstreamed": git_remote.upstreamed,
+        }
+    return res
+
+
+def load_status(
+    working_path: Path, values: Dict[str, Any], *, with_remote: bool
+) -> Optional[Tuple[GitStatus, Optional[GitRemote]]]:
+    """Rebuild the results of dump_status(), or return None if
+    they are not suitable
+    """
+    git_status = GitStatus(working_path)
+    for key in STATUS_KEYS + ["sha1_full"]:
+        if key not in values:
+            return None
+        setattr(git_status, key, values[key])
+    if not with_remote or not git_status.branch:
+        return git_status, None
+    # Note: the status may have been recorded with --local-git-only,
+    # without the remotes
+    remote_values = values.get("remote")
+    if not remote_values:
+        return None
+    git_remote = GitRemote(working_path, remote_values["branch"])
+    git_remote.remotes = [
+        Remote(name=x["name"], url=x["url"]) for x in remote_values["remotes"]
+    ]
+    git_remote.upstreamed = remote_values["upstreamed"]
+    return git_status, git_remote
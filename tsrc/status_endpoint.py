@@ -1,16 +1,17 @@
 import collections
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import cli_ui as ui
 
 from tsrc.errors import MissingRepoError
 from tsrc.executor import Outcome, Task
-from tsrc.git import GitBareStatus, GitStatus, get_git_bare_status, get_git_status
-from tsrc.git_remote import GitRemote, get_git_remotes
+from tsrc.git import GitBareStatus, GitStatus, get_git_bare_status
+from tsrc.git_remote import GitRemote
 from tsrc.manifest import Manifest
 from tsrc.manifest_common_data import ManifestsTypeOfData
 from tsrc.repo import Repo
+from tsrc.status_cache import get_status
 from tsrc.utils import erase_last_line
 from tsrc.workspace import Workspace
 
@@ -76,8 +77,13 @@ class StatusCollector(Task[Repo]):
         workspace: Workspace,
         only_full_status: bool = False,
         ignore_group_item: bool = False,
+        use_cache: bool = True,
     ) -> None:
         self.workspace = workspace
+        self.use_cache = use_cache
+        # dest -> values of tsrc.status_cache.dump_status(),
+        # known to be up to date
+        self.known_statuses: Dict[str, Dict[str, Any]] = {}
         if ignore_group_item is True:
             self.manifest = workspace.get_manifest_safe_mode(ManifestsTypeOfData.LOCAL)
         else:
@@ -122,10 +128,14 @@ class StatusCollector(Task[Repo]):
 
     def _process_default(self, full_path: Path, repo: Repo) -> None:
         try:
-            git_status = get_git_status(full_path)
-            git_remote: Union[GitRemote, None] = None
-            if git_status.branch:
-                git_remote = get_git_remotes(full_path, git_status.branch)
+            git_status, git_remote = get_status(
+                full_path,
+                dest=repo.dest,
+                state_db=self.workspace.state_db,
+                with_remote=True,
+                use_cache=self.use_cache,
+                known_values=self.known_statuses.get(repo.dest),
+            )
             manifest_status = ManifestStatus(repo, manifest=self.manifest)
             manifest_status.update(git_status, git_remote)
             status = Status(
@@ -144,8 +154,17 @@ class StatusCollectorLocalOnly(Task[Repo]):
     can be time consuming.
     """
 
-    def __init__(self, workspace: Workspace, ignore_group_item: bool = False) -> None:
+    def __init__(
+        self,
+        workspace: Workspace,
+        ignore_group_item: bool = False,
+        use_cache: bool = True,
+    ) -> None:
         self.workspace = workspace
+        self.use_cache = use_cache
+        # dest -> values of tsrc.status_cache.dump_status(),
+        # known to be up to date
+        self.known_statuses: Dict[str, Dict[str, Any]] = {}
         if ignore_group_item is True:
             self.manifest = workspace.get_manifest_safe_mode(ManifestsTypeOfData.LOCAL)
         else:
@@ -170,7 +189,14 @@ class StatusCollectorLocalOnly(Task[Repo]):
         if not full_path.exists():
             self.statuses[repo.dest] = MissingRepoError(repo.dest)
         try:
-            git_status = get_git_status(full_path)
+            git_status, _ = get_status(
+                full_path,
+                dest=repo.dest,
+                state_db=self.workspace.state_db,
+                with_remote=False,
+                use_cache=self.use_cache,
+                known_values=self.known_statuses.get(repo.dest),
+            )
             manifest_status = ManifestStatus(repo, manifest=self.manifest)
             manifest_status.update(git_status, None)
             status = Status(git=git_status, git_remote=None, manifest=manifest_status)
@@ -1,11 +1,24 @@
 from pathlib import Path
+from threading import Lock
 from typing import List, Optional, Tuple
 
 import cli_ui as ui
 
 from tsrc.errors import Error
-from tsrc.executor import Outcome, Task
-from tsrc.git import get_current_branch, get_git_status, run_git_captured
+from tsrc.executor import Call, GitCommand, Outcome, Steps, Task, run_in_thread
+from tsrc.git import (
+    get_current_branch,
+    get_git_status,
+    has_commit,
+    run_git_captured,
+)
+from tsrc.git_remote import (
+    get_remote_urls,
+    parse_ls_remote,
+    remote_refs_are_fetched,
+)
+from tsrc.host_limits import get_url_host
+from tsrc.object_cache import ObjectCache
 from tsrc.repo import Remote, Repo
 
 
@@ -34,15 +47,33 @@ class Syncer(Task[Repo]):
         force: bool = False,
         remote_name: Optional[str] = None,
         correct_branch: bool = False,
+        skip_unchanged: bool = False,
+        narrow_fetch: bool = False,
+        object_cache: Optional[ObjectCache] = None,
     ) -> None:
         self.workspace_path = workspace_path
         self.force = force
         self.remote_name = remote_name
         self.correct_branch = correct_branch
+        self.skip_unchanged = skip_unchanged
+        self.narrow_fetch = narrow_fetch
+        self.object_cache = object_cache
+        # repos for which no fetch was needed
+        self.skipped: List[str] = []
+        self.lock = Lock()
 
     def describe_item(self, item: Repo) -> str:
         return item.dest
 
+    def get_host(self, item: Repo) -> Optional[str]:
+        # Note: repos fetched from several remotes are only
+        # counted for the first one
+        try:
+            remotes = self.pick_remotes(item)
+        except Error:
+            return None
+        return get_url_host(remotes[0].url) if remotes else None
+
     def describe_process_start(self, item: Repo) -> List[ui.Token]:
         return ["Syncing", item.dest]
 
@@ -60,10 +91,18 @@ class Syncer(Task[Repo]):
         * or try merging the local branch with its upstream (abort if not
           on on the correct branch, or if the merge is not fast-forward).
         """
-        error = None
         self.info_count(index, count, "Synchronizing", repo.dest)
         self.fetch(repo)
+        return self.sync_fetched_repo(repo)
 
+    async def process_async(self, index: int, count: int, repo: Repo) -> Outcome:
+        # Note: only `git fetch` needs to wait for the network, the rest
+        # is quick enough to run in a worker thread
+        await self.fetch_async(repo)
+        return await run_in_thread(self.sync_fetched_repo, repo)
+
+    def sync_fetched_repo(self, repo: Repo) -> Outcome:
+        error = None
         summary_lines = []
         ref = None
         if repo.sha1:
@@ -140,7 +179,10 @@ class Syncer(Task[Repo]):
 
         return current_branch
 
-    def _pick_remotes(self, repo: Repo) -> List[Remote]:
+    def pick_remotes(self, repo: Repo) -> List[Remote]:
+        """Return the remotes to fetch from: the one given
+        on the command line, if any, or all of them
+        """
         if self.remote_name:
             for remote in repo.remotes:
                 if remote.name == self.remote_name:
@@ -150,21 +192,140 @@ class Syncer(Task[Repo]):
 
         return repo.remotes
 
+    def get_fetch_cmd(self, remote: Remote) -> List[str]:
+        cmd = ["fetch", "--tags", "--prune", remote.name]
+        if self.force:
+            cmd.append("--force")
+        return cmd
+
+    def get_narrow_refspecs(self, repo: Repo, remote: Remote) -> List[str]:
+        """Return the refspecs needed to sync the repo: the configured
+        branch and tag, if any. The sha1 is fetched separately, see
+        fetch_missing_sha1()
+        """
+        res = []
+        branch = repo.orig_branch
+        if not repo.sha1 and not repo.tag:
+            branch = repo.branch
+        if branch:
+            res.append(f"+refs/heads/{branch}:refs/remotes/{remote.name}/{branch}")
+        if repo.tag:
+            res.append(f"+refs/tags/{repo.tag}:refs/tags/{repo.tag}")
+        return res
+
+    def get_narrow_fetch_cmd(self, repo: Repo, remote: Remote) -> List[str]:
+        cmd = ["fetch", "--no-tags", remote.name]
+        cmd += self.get_narrow_refspecs(repo, remote)
+        if self.force:
+            cmd.append("--force")
+        return cmd
+
+    def get_ls_remote_cmd(self, repo: Repo, remote: Remote) -> List[str]:
+        cmd = ["ls-remote", remote.name]
+        if self.narrow_fetch:
+            refspecs = self.get_narrow_refspecs(repo, remote)
+            cmd += [x.lstrip("+").split(":")[0] for x in refspecs]
+        return cmd
+
     def fetch(self, repo: Repo) -> None:
+        self.run_steps(self.fetch_steps(repo))
+
+    async def fetch_async(self, repo: Repo) -> None:
+        await self.run_steps_async(self.fetch_steps(repo))
+
+    def fetch_steps(self, repo: Repo) -> Steps[None]:
+        """Fetch the remotes of the repo, see Task.run_steps()"""
         repo_path = self.workspace_path / repo.dest
-        for remote in self._pick_remotes(repo):
+        fetched = False
+        for remote in self.pick_remotes(repo):
+            if self.narrow_fetch and not self.get_narrow_refspecs(repo, remote):
+                # Note: only a sha1 is configured, see fetch_missing_sha1()
+                continue
+            if self.skip_unchanged:
+                _, out = yield GitCommand(
+                    repo_path, self.get_ls_remote_cmd(repo, remote)
+                )
+                if self.is_fetched(repo_path, remote, out):
+                    continue
+            yield Call(self.refresh_object_cache, (repo_path, remote))
+            fetched = True
+            self.info_3("Fetching", remote.name)
+            if self.narrow_fetch:
+                rc, _ = yield GitCommand(
+                    repo_path, self.get_narrow_fetch_cmd(repo, remote)
+                )
+                if rc == 0:
+                    continue
+                # Note: the remote may not have the configured branch or tag,
+                # let a regular `git fetch` decide if this is an error
             try:
-                self.info_3("Fetching", remote.name)
-                cmd = ["fetch", "--tags", "--prune", remote.name]
-                if self.force:
-                    cmd.append("--force")
-                self.run_git(repo_path, *cmd)
+                yield GitCommand(repo_path, self.get_fetch_cmd(remote), with_retry=True)
             except Error:
                 raise Error(f"fetch from '{remote.name}' failed")
+        if self.narrow_fetch:
+            yield Call(self.fetch_missing_sha1, (repo,))
+        self.fetch_done(repo, fetched=fetched)
+
+    def refresh_object_cache(self, repo_path: Path, remote: Remote) -> None:
+        """Update the mirror the repo borrows objects from, if any,
+        so that `git fetch` only has to download what the mirror
+        does not have yet
+        """
+        if not self.object_cache:
+            return
+        if self.object_cache.is_used_by(repo_path, remote.url):
+            self.object_cache.refresh(remote.url)
+
+    def fetch_missing_sha1(self, repo: Repo) -> None:
+        """When fetching only the configured refs, the configured sha1 may
+        not be reachable from them. In this case, fetch it explicitly,
+        and if the server does not allow it, fetch everything.
+        """
+        if not repo.sha1:
+            return
+        repo_path = self.workspace_path / repo.dest
+        if has_commit(repo_path, repo.sha1):
+            return
+        remotes = self.pick_remotes(repo)
+        for remote in remotes:
+            self.info_3("Fetching", repo.sha1, "from", remote.name)
+            rc, _ = run_git_captured(
+                repo_path, "fetch", "--no-tags", remote.name, repo.sha1, check=False
+            )
+            if rc == 0:
+                return
+        for remote in remotes:
+            try:
+                self.run_git_with_retry(repo_path, *self.get_fetch_cmd(remote))
+            except Error:
+                raise Error(f"fetch from '{remote.name}' failed")
+
+    def is_fetched(self, repo_path: Path, remote: Remote, ls_remote_out: str) -> bool:
+        """Return True if the refs listed by `git ls-remote` are
+        the same as the ones we already have, in which case there
+        is no need to run `git fetch`.
+        """
+        remote_refs = parse_ls_remote(ls_remote_out)
+        # Note: when `git ls-remote` fails, the output contains no
+        # ref, and `git fetch` will report the error
+        if not remote_refs:
+            return False
+        # Note: when fetching only some refs, nothing is pruned
+        if not remote_refs_are_fetched(
+            repo_path, remote.name, remote_refs, prune=not self.narrow_fetch
+        ):
+            return False
+        self.info_3("Skipping fetch from", remote.name, "(no changes)")
+        return True
+
+    def fetch_done(self, repo: Repo, *, fetched: bool) -> None:
+        if self.skip_unchanged and not fetched:
+            with self.lock:
+                self.skipped.append(repo.dest)
 
     def sync_repo_to_ref(self, repo: Repo, ref: str) -> None:
         repo_path = self.workspace_path / repo.dest
-        status = get_git_status(repo_path)
+        status = get_git_status(repo_path, with_tag=False)
         if status.dirty:
             raise Error(f"git repo is dirty: cannot sync to ref: {ref}")
         try:
@@ -214,8 +375,7 @@ class Syncer(Task[Repo]):
             # we need to check for match in remotes
 
             # get all possible remotes
-            _, our_remotes = run_git_captured(repo_path, "remote", check=False)
-            for our_remote in our_remotes.splitlines():
+            for our_remote in get_remote_urls(repo_path):
 
                 # check single remote
                 # NOTE: as tsrc's Manifest does not support anything like 'remote branch'
@@ -271,7 +431,7 @@ class Syncer(Task[Repo]):
 
     def checkout_branch(self, repo: Repo) -> None:
         repo_path = self.workspace_path / repo.dest
-        status = get_git_status(repo_path)
+        status = get_git_status(repo_path, with_tag=False)
         if status.dirty:
             raise Error(f"git repo is dirty: cannot checkout: {repo.branch}")
         if repo.branch:
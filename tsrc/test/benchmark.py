@@ -0,0 +1,416 @@
+"""
+Benchmarks
+
+Time tsrc commands on large, synthetic workspaces, so that
+performance regressions can be spotted by comparing the results
+of two versions of tsrc.
+
+For each number of repos, a git server is generated with GitServer
+(see tsrc.test.helpers.git_server), with the given number of commits,
+tags and branches in each repo. Then, for each number of jobs, a new
+workspace is created, and the following commands are timed, in this
+order:
+
+* init
+* sync, with nothing to do ('sync-noop')
+* sync, after a new commit was pushed to some repos ('sync-changes')
+* status, without and with the status cache ('status', 'status-cached')
+* foreach
+* log
+* dump-manifest
+
+Commands run in a new process, as users would run them. Read-only
+commands are run `--repeat` times, and the fastest run is kept (so
+the first 'status-cached' run fills the cache, and the next ones use
+it). Results are written as JSON: see write_results().
+
+Then, for each number of files, a repo with as many tracked files is
+generated, and the time taken to get its status is measured, in the
+same process, with `git status` ('git-status'), and with a hit of the
+status cache ('status-cache-hit', see tsrc.status_cache). The latter
+is measured even above MAX_STAMPED_PATHS, so that this limit can be
+checked, and is reported as failed if the cache was not used.
+
+Usage:
+
+    $ python -m tsrc.test.benchmark --repos 100 1000 5000 --jobs 1 8 \\
+        --files 10000 100000 --output results.json
+
+Note: with 5,000 repos, generating the repos and cloning them takes a while.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import tsrc
+import tsrc.status_cache
+from tsrc import __version__
+from tsrc.git import get_git_status, run_git
+from tsrc.state_db import StateDB
+from tsrc.status_cache import RACY_DELAY, get_repo_stamp, get_status
+from tsrc.test.helpers.git_server import BareRepo, GitServer
+
+# Commands that do not change the workspace, and so can be
+# run several times, keeping the fastest run
+READ_ONLY_COMMANDS = ["sync-noop", "status", "status-cached", "foreach", "log"]
+
+
+@dataclass
+class Parameters:
+    repos: List[int]
+    jobs: List[int]
+    commits: int
+    tags: int
+    branches: int
+    changed_ratio: float
+    repeat: int
+    files: List[int]
+
+
+@dataclass
+class Result:
+    repos: int
+    jobs: int
+    command: str
+    # fastest run, in seconds
+    seconds: float
+    runs: int
+    returncode: int
+    # number of files in the repo, for 'git-status' and 'status-cache-hit'
+    files: int = 0
+
+
+def get_repo_name(index: int) -> str:
+    return f"repo-{index:05d}"
+
+
+def generate_server(path: Path, num_repos: int, parameters: Parameters) -> GitServer:
+    """Create the bare repos and the manifest. Every repo has
+    `commits` commits (on top of the initial one), tags v0,
+    v1 ... on the first commits, and `branches` other branches
+    """
+    git_server = GitServer(path)
+    names_and_urls = []
+    for index in range(num_repos):
+        name = get_repo_name(index)
+        url = git_server.add_repo(name, add_to_manifest=False)
+        for i in range(max(parameters.commits, parameters.tags)):
+            if i < parameters.tags:
+                git_server.tag(name, f"v{i}")
+            if i < parameters.commits:
+                git_server.push_file(name, f"file-{i}.txt", contents=f"{name} {i}\n")
+        bare_repo = BareRepo.open(git_server.bare_path / name)
+        for i in range(parameters.branches):
+            bare_repo.ensure_ref(f"refs/heads/branch-{i}")
+        names_and_urls.append((name, url))
+    git_server.manifest.add_repos(names_and_urls)
+    return git_server
+
+
+def push_changes(
+    git_server: GitServer, num_repos: int, ratio: float, *, contents: str
+) -> None:
+    """Push a new commit to the given ratio of repos, spread
+    evenly among them
+    """
+    num_changed = round(num_repos * ratio)
+    if not num_changed:
+        return
+    step = num_repos / num_changed
+    for i in range(num_changed):
+        name = get_repo_name(int(i * step))
+        git_server.push_file(name, "changed.txt", contents=contents)
+
+
+def generate_files_repo(path: Path, num_files: int) -> None:
+    """Create a repo with `num_files` committed files, 100 per directory"""
+    path.mkdir()
+    run_git(path, "init", "--quiet")
+    for i in range(num_files):
+        dir_path = path / f"dir-{i // 100:04d}"
+        dir_path.mkdir(exist_ok=True)
+        (dir_path / f"file-{i:06d}.txt").write_text(f"{i}\n")
+    run_git(path, "add", ".")
+    run_git(
+        path,
+        "-c",
+        "user.name=tsrc",
+        "-c",
+        "user.email=tsrc@example.com",
+        "commit",
+        "--quiet",
+        "--message",
+        f"add {num_files} files",
+    )
+
+
+def run_tsrc(workspace_path: Path, *args: str) -> int:
+    env = os.environ.copy()
+    # Note: allows cloning file:// URLs, see tsrc.git.get_git_cmd()
+    env["TSRC_TESTING"] = "true"
+    # Note: time the same tsrc sources as the ones imported here,
+    # even if another version is installed
+    sources_path = str(Path(tsrc.__file__).parent.parent)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [sources_path, *filter(None, [env.get("PYTHONPATH")])]
+    )
+    process = subprocess.run(
+        [sys.executable, "-m", "tsrc", *args],
+        cwd=workspace_path,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if process.returncode != 0:
+        print(f"tsrc {' '.join(args)} failed:\n{process.stderr}", file=sys.stderr)
+    return process.returncode
+
+
+class Benchmark:
+    def __init__(self, work_path: Path, parameters: Parameters) -> None:
+        self.work_path = work_path
+        self.parameters = parameters
+        self.results: List[Result] = []
+
+    def run(self) -> None:
+        for num_repos in self.parameters.repos:
+            server_path = self.work_path / f"{num_repos}-repos"
+            server_path.mkdir()
+            print(f"Generating {num_repos} repos", flush=True)
+            git_server = generate_server(server_path, num_repos, self.parameters)
+            for num_jobs in self.parameters.jobs:
+                workspace_path = server_path / f"workspace-j{num_jobs}"
+                workspace_path.mkdir()
+                self.run_commands(git_server, workspace_path, num_repos, num_jobs)
+                shutil.rmtree(workspace_path)
+            shutil.rmtree(server_path)
+        for num_files in self.parameters.files:
+            self.run_status_cache(num_files)
+
+    def run_status_cache(self, num_files: int) -> None:
+        repo_path = self.work_path / f"{num_files}-files"
+        print(f"Generating a repo with {num_files} files", flush=True)
+        generate_files_repo(repo_path, num_files)
+        state_db = StateDB(self.work_path / f"{num_files}-files.sqlite")
+
+        def cache_hit() -> None:
+            get_status(repo_path, dest="repo", state_db=state_db, with_remote=False)
+
+        # Note: the first `git status` refreshes the index, which must
+        # then be left alone for RACY_DELAY to be cached
+        time.sleep(RACY_DELAY)
+        get_git_status(repo_path)
+        time.sleep(RACY_DELAY)
+        max_stamped_paths = tsrc.status_cache.MAX_STAMPED_PATHS
+        tsrc.status_cache.MAX_STAMPED_PATHS = sys.maxsize
+        try:
+            cache_hit()
+            self.measure_call(
+                num_files, "git-status", lambda: get_git_status(repo_path)
+            )
+            self.measure_call(num_files, "status-cache-hit", cache_hit)
+        finally:
+            tsrc.status_cache.MAX_STAMPED_PATHS = max_stamped_paths
+        cached = state_db.get_cached_status("repo")
+        if not cached or get_repo_stamp(repo_path, cached.paths) != cached.stamp:
+            print("status-cache-hit failed: the cache was not used", file=sys.stderr)
+            self.results[-1].returncode = 1
+        shutil.rmtree(repo_path)
+
+    def measure_call(
+        self, num_files: int, command: str, func: Callable[[], Any]
+    ) -> None:
+        durations = []
+        for _ in range(self.parameters.repeat):
+            start = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - start)
+        result = Result(
+            repos=1,
+            jobs=1,
+            command=command,
+            seconds=round(min(durations), 4),
+            runs=self.parameters.repeat,
+            returncode=0,
+            files=num_files,
+        )
+        print(f"{num_files:>6} files, {command:<21} {result.seconds}s")
+        self.results.append(result)
+
+    def run_commands(
+        self, git_server: GitServer, workspace_path: Path, num_repos: int, num_jobs: int
+    ) -> None:
+        jobs = ["-j", str(num_jobs)]
+        log_from = "v0" if self.parameters.tags else "HEAD"
+
+        def measure(command: str, *args: str) -> None:
+            self.measure(workspace_path, num_repos, num_jobs, command, *args)
+
+        measure("init", "init", git_server.manifest_url, *jobs)
+        measure("sync-noop", "sync", *jobs)
+        # Note: each workspace starts from the changes pushed
+        # for the previous one, and gets new ones
+        push_changes(
+            git_server,
+            num_repos,
+            self.parameters.changed_ratio,
+            contents=f"changed before sync -j {num_jobs}\n",
+        )
+        measure("sync-changes", "sync", *jobs)
+        # Note: otherwise the files written by sync are too recent
+        # for their status to be cached (see tsrc.status_cache)
+        time.sleep(RACY_DELAY)
+        measure("status", "status", "--no-cache", *jobs)
+        measure("status-cached", "status", *jobs)
+        measure("foreach", "foreach", *jobs, "--", "git", "rev-parse", "HEAD")
+        measure("log", "log", "--from", log_from, *jobs)
+        measure("dump-manifest", "dump-manifest", "--preview", *jobs)
+
+    def measure(
+        self,
+        workspace_path: Path,
+        num_repos: int,
+        num_jobs: int,
+        command: str,
+        *args: str,
+    ) -> None:
+        runs = self.parameters.repeat if command in READ_ONLY_COMMANDS else 1
+        durations = []
+        returncode = 0
+        for _ in range(runs):
+            start = time.perf_counter()
+            returncode = run_tsrc(workspace_path, *args) or returncode
+            durations.append(time.perf_counter() - start)
+        result = Result(
+            repos=num_repos,
+            jobs=num_jobs,
+            command=command,
+            seconds=round(min(durations), 3),
+            runs=runs,
+            returncode=returncode,
+        )
+        print(f"{num_repos:>6} repos, -j {num_jobs:<3} {command:<14} {result.seconds}s")
+        self.results.append(result)
+
+
+def write_results(
+    path: Path, parameters: Parameters, results: List[Result]
+) -> Dict[str, Any]:
+    """Results look like:
+
+    {
+      "tsrc_version": "3.0.1",
+      "python": "3.11.7",
+      "platform": "Linux-6.1-x86_64",
+      "date": "2024-01-31T12:00:00",
+      "parameters": {"repos": [100], "jobs": [1, 8], "commits": 10, ...},
+      "results": [
+        {"repos": 100, "jobs": 1, "command": "init", "seconds": 4.2,
+         "runs": 1, "returncode": 0, "files": 0},
+        ...
+      ]
+    }
+    """
+    res = {
+        "tsrc_version": __version__,
+        "python": platform.python_version(),
+        "git": subprocess.run(
+            ["git", "--version"], capture_output=True, text=True
+        ).stdout.strip(),
+        "platform": platform.platform(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "parameters": asdict(parameters),
+        "results": [asdict(x) for x in results],
+    }
+    path.write_text(json.dumps(res, indent=2) + "\n")
+    return res
+
+
+def parse_args(args: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m tsrc.test.benchmark",
+        description="Time tsrc commands on large, generated workspaces",
+    )
+    parser.add_argument(
+        "--repos", type=int, nargs="+", default=[100], help="numbers of repos"
+    )
+    parser.add_argument(
+        "--jobs", type=int, nargs="+", default=[1, 8], help="values of -j to use"
+    )
+    parser.add_argument(
+        "--commits", type=int, default=10, help="number of commits in each repo"
+    )
+    parser.add_argument(
+        "--tags", type=int, default=5, help="number of tags in each repo"
+    )
+    parser.add_argument(
+        "--branches", type=int, default=2, help="number of extra branches in each repo"
+    )
+    parser.add_argument(
+        "--changed-ratio",
+        type=float,
+        default=0.1,
+        help="ratio of repos changed before running 'sync-changes'",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="how many times read-only commands are run (the fastest run is kept)",
+    )
+    parser.add_argument(
+        "--files",
+        type=int,
+        nargs="+",
+        default=[1000, 10000],
+        help="numbers of files in the repos used to time the status cache",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("benchmark.json"),
+        help="where to write the results",
+    )
+    parser.add_argument(
+        "--work-dir",
+        type=Path,
+        help="where to generate repos and workspaces (default: a temporary directory)",
+    )
+    return parser.parse_args(args)
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    namespace = parse_args(args)
+    parameters = Parameters(
+        repos=namespace.repos,
+        jobs=namespace.jobs,
+        commits=namespace.commits,
+        tags=namespace.tags,
+        branches=namespace.branches,
+        changed_ratio=namespace.changed_ratio,
+        repeat=namespace.repeat,
+        files=namespace.files,
+    )
+    with tempfile.TemporaryDirectory(
+        prefix="tsrc-bench-", dir=namespace.work_dir
+    ) as tmp:
+        benchmark = Benchmark(Path(tmp), parameters)
+        benchmark.run()
+    write_results(namespace.output, parameters, benchmark.results)
+    print(f"Results written to {namespace.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ from typing import List
 
 import pytest
 
-from tsrc.cli import add_num_jobs_arg, get_num_jobs
+from tsrc.cli import ASYNCIO_AUTO_JOBS, add_num_jobs_arg, get_num_jobs
 
 
 class TestNumJobsParsing:
@@ -22,6 +22,17 @@ class TestNumJobsParsing:
         actual = self.parse_args(["--jobs", "auto"])
         assert actual == cpu_count()
 
+    def test_auto_with_asyncio_executor(
+        self,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setenv("TSRC_EXECUTOR", "asyncio")
+        assert self.parse_args([]) == max(ASYNCIO_AUTO_JOBS, cpu_count())
+        assert self.parse_args(["--jobs", "auto"]) == max(
+            ASYNCIO_AUTO_JOBS, cpu_count()
+        )
+        assert self.parse_args(["--jobs", "3"]) == 3
+
     def test_specify_num_jobs_explicitly(self) -> None:
         actual = self.parse_args(["--jobs", "3"])
         assert actual == 3
@@ -0,0 +1,60 @@
+""" Make sure commands do not run git more often than they used to.
+
+If one of those tests fails after a change that really needs more git
+calls, raise the limit, but consider doing without them first (see
+tsrc.gitfs for instance).
+"""
+
+from cli_ui.tests import MessageRecorder
+
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_calls import GitCalls
+from tsrc.test.helpers.git_server import GitServer
+
+
+def init_workspace(tsrc_cli: CLI, git_server: GitServer) -> None:
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+
+
+def test_status(tsrc_cli: CLI, git_server: GitServer, git_calls: GitCalls) -> None:
+    init_workspace(tsrc_cli, git_server)
+    git_calls.clear()
+    tsrc_cli.run("status", "--no-cache")
+    assert sorted(git_calls.by_repo()) == ["bar", "foo"]
+    git_calls.assert_at_most(2)
+
+
+def test_sync(tsrc_cli: CLI, git_server: GitServer, git_calls: GitCalls) -> None:
+    init_workspace(tsrc_cli, git_server)
+    git_server.push_file("foo", "new.txt")
+    git_calls.clear()
+    # Note: when run in parallel, sync also runs `git log` to compute
+    # the summary of each repo
+    tsrc_cli.run("sync", "-j", "1")
+    git_calls.assert_at_most(3)
+    assert git_calls.by_repo()[".tsrc/manifest"] <= 5
+
+
+def test_foreach(tsrc_cli: CLI, git_server: GitServer, git_calls: GitCalls) -> None:
+    init_workspace(tsrc_cli, git_server)
+    git_calls.clear()
+    tsrc_cli.run("foreach", "ls")
+    git_calls.assert_at_most(2)
+
+
+def test_stats(
+    tsrc_cli: CLI, git_server: GitServer, message_recorder: MessageRecorder
+) -> None:
+    """Scenario:
+    * Create a workspace with two repos
+    * Run `tsrc --stats sync`
+    * Check that git calls are reported, by command and by repo
+    """
+    init_workspace(tsrc_cli, git_server)
+    message_recorder.reset()
+    tsrc_cli.run("--stats", "sync")
+    assert message_recorder.find(r"Git statistics: \d+ call\(s\)")
+    assert message_recorder.find(r"\* fetch +\d+ call\(s\)")
+    assert message_recorder.find(r"\* foo +\d+ call\(s\)")
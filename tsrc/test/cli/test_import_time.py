@@ -0,0 +1,69 @@
+import subprocess
+import sys
+from typing import List
+
+# Note: generous, so that the test does not fail on slow machines.
+# Importing every action module used to take twice as long as
+# importing the foreach one.
+IMPORT_BUDGET = 1.0
+
+
+def get_imported_modules(code: str) -> List[str]:
+    cmd = [sys.executable, "-c", f"{code}\nimport sys\nprint('\\n'.join(sys.modules))"]
+    process = subprocess.run(cmd, check=True, capture_output=True, text=True)
+    return process.stdout.splitlines()
+
+
+def get_cpu_time(*args: str) -> float:
+    """Run `tsrc` with the given args in a new process, and return
+    the CPU time it took, measured in the child process itself
+    """
+    # Note: the `resource` module is not available on Windows
+    code = (
+        "import runpy, sys, time\n"
+        "sys.argv = ['tsrc', *sys.argv[1:]]\n"
+        "start = time.process_time()\n"
+        "try:\n"
+        "    runpy.run_module('tsrc', run_name='__main__')\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(time.process_time() - start, file=sys.stderr)\n"
+    )
+    process = subprocess.run(
+        [sys.executable, "-c", code, *args], check=True, capture_output=True, text=True
+    )
+    return float(process.stderr.splitlines()[-1])
+
+
+def test_main_does_not_import_actions() -> None:
+    modules = get_imported_modules("import tsrc.cli.main")
+    for name in ["tsrc.cli.foreach", "tsrc.cli.status", "tsrc.cli.sync"]:
+        assert name not in modules
+    assert "colored_traceback" not in modules
+
+
+def test_only_selected_action_is_imported() -> None:
+    modules = get_imported_modules(
+        "from tsrc.cli.main import create_parser\n"
+        "create_parser(action='foreach').parse_args(['foreach', 'ls'])"
+    )
+    assert "tsrc.cli.foreach" in modules
+    for name in [
+        "tsrc.cli.status",
+        "tsrc.daemon",
+        "tsrc.dump_manifest",
+        "tsrc.workspace_repos_summary",
+        "colored_traceback",
+    ]:
+        assert name not in modules
+
+
+def test_import_time() -> None:
+    """Scenario:
+    * Run `tsrc foreach --help` in a new process, several times
+    * Check that the fastest run stays within the budget
+    """
+    # Note: measure CPU time rather than wall-clock time, which
+    # depends too much on the load of the machine
+    durations = [get_cpu_time("foreach", "--help") for _ in range(3)]
+    assert min(durations) < IMPORT_BUDGET
@@ -0,0 +1,67 @@
+from pathlib import Path
+
+from tsrc.git import get_sha1, run_git_captured
+from tsrc.object_cache import ObjectCache
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+def test_clones_use_object_cache(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path, tmp_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with a foo repo
+    * Initialize two workspaces from this manifest, sharing an object cache
+    * Check that both clones of foo borrow objects from the same mirror
+    * Push a new file to foo
+    * Run `tsrc sync` in the first workspace
+    * Check that both the mirror and the clone have been updated
+    """
+    git_server.add_repo("foo")
+    foo_url = git_server.get_url("foo")
+    cache_path = tmp_path / "cache"
+    other_workspace_path = tmp_path / "other"
+    other_workspace_path.mkdir()
+
+    tsrc_cli.run("init", "--object-cache", str(cache_path), git_server.manifest_url)
+    tsrc_cli.run(
+        "init",
+        "-w",
+        str(other_workspace_path),
+        "--object-cache",
+        str(cache_path),
+        git_server.manifest_url,
+    )
+
+    object_cache = ObjectCache(cache_path)
+    assert object_cache.is_used_by(workspace_path / "foo", foo_url)
+    assert object_cache.is_used_by(other_workspace_path / "foo", foo_url)
+
+    git_server.push_file("foo", "new.txt")
+    tsrc_cli.run("sync")
+
+    assert (workspace_path / "foo/new.txt").exists()
+    mirror_path = object_cache.get_mirror_path(foo_url)
+    _, mirror_sha1 = run_git_captured(mirror_path, "rev-parse", "refs/heads/master")
+    assert mirror_sha1 == get_sha1(workspace_path / "foo")
+
+
+def test_missing_object_cache_is_not_an_error(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path, tmp_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with a foo repo
+    * Use a file as object cache, so that no mirror can be created in it
+    * Check that `tsrc init` still clones foo, without using the cache
+    """
+    git_server.add_repo("foo")
+    cache_path = tmp_path / "cache"
+    cache_path.write_text("not a directory")
+
+    tsrc_cli.run("init", "--object-cache", str(cache_path), git_server.manifest_url)
+
+    assert (workspace_path / "foo/README").exists()
+    object_cache = ObjectCache(cache_path)
+    assert not object_cache.is_used_by(
+        workspace_path / "foo", git_server.get_url("foo")
+    )
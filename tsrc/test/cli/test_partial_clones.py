@@ -0,0 +1,73 @@
+from pathlib import Path
+
+from tsrc.git import get_sha1, run_git, run_git_captured
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+def allow_filter(git_server: GitServer, repo: str) -> None:
+    run_git(git_server.bare_path / repo, "config", "uploadpack.allowFilter", "true")
+
+
+def assert_partial_clone(workspace_path: Path, repo: str, clone_filter: str) -> None:
+    repo_path = workspace_path / repo
+    _, actual = run_git_captured(
+        repo_path, "config", "remote.origin.partialclonefilter", check=False
+    )
+    assert actual == clone_filter
+
+
+def test_partial_clones(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    git_server.add_repo("foo/bar")
+    git_server.add_repo("spam/eggs")
+    git_server.push_file("foo/bar", "bar.txt", contents="this is bar")
+    allow_filter(git_server, "foo/bar")
+    allow_filter(git_server, "spam/eggs")
+
+    manifest_url = git_server.manifest_url
+    tsrc_cli.run("init", "--clone-filter", "blob:none", manifest_url)
+    assert_partial_clone(workspace_path, "foo/bar", "blob:none")
+    assert_partial_clone(workspace_path, "spam/eggs", "blob:none")
+    assert (workspace_path / "foo/bar/bar.txt").read_text() == "this is bar"
+
+    git_server.add_repo("foo/baz")
+    allow_filter(git_server, "foo/baz")
+    tsrc_cli.run("sync")
+    assert_partial_clone(workspace_path, "foo/baz", "blob:none")
+
+
+def test_partial_clone_with_fix_ref(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with a foo repo frozen at its initial
+      revision, using the 'tree:0' filter
+    * Push a new file to foo
+    * Initialize a workspace from this manifest
+    * Check that foo is a partial clone, reset to the initial revision
+    """
+    git_server.add_repo("foo")
+    git_server.push_file("foo", "one.c")
+    initial_sha1 = git_server.get_sha1("foo")
+    git_server.push_file("foo", "two.c")
+    git_server.manifest.set_repo_sha1("foo", initial_sha1)
+    git_server.manifest.configure_repo("foo", "clone_filter", "tree:0")
+    allow_filter(git_server, "foo")
+
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    foo_path = workspace_path / "foo"
+    assert_partial_clone(workspace_path, "foo", "tree:0")
+    assert get_sha1(foo_path) == initial_sha1
+    assert (foo_path / "one.c").exists()
+    assert not (foo_path / "two.c").exists()
+
+
+def test_invalid_clone_filter(tsrc_cli: CLI, git_server: GitServer) -> None:
+    git_server.add_repo("foo")
+    error = tsrc_cli.run_and_fail(
+        "init", "--clone-filter", "sparse:oid=foo", git_server.manifest_url
+    )
+    assert "Invalid clone filter" in error.message
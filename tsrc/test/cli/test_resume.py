@@ -0,0 +1,190 @@
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+from cli_ui.tests import MessageRecorder
+
+from tsrc.git import run_git
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.failing_git import FailingGit
+from tsrc.test.helpers.git_calls import GitCalls
+from tsrc.test.helpers.git_server import GitServer
+
+
+def make_failing_git(command: str, dest: str, monkeypatch: Any) -> FailingGit:
+    """Make the given git command fail in the given repo, as
+    if tsrc was interrupted while running it
+    """
+
+    def leave_partial_clone(working_path: Path, *cmd: str) -> None:
+        if cmd[0] == "clone":
+            partial_path = working_path / cmd[-1]
+            partial_path.mkdir()
+            run_git(partial_path, "init", "--quiet")
+
+    return FailingGit(
+        command, monkeypatch, dests=[dest], before_failing=leave_partial_clone
+    )
+
+
+def test_init_can_be_resumed(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    monkeypatch: Any,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Create a manifest with foo and bar
+    * Run `tsrc init`, and make it stop while cloning bar,
+      leaving a partial clone behind
+    * Run `tsrc init` again
+    * Check that the partial clone of bar was replaced by a real one,
+      and that foo was not cloned again
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    git_server.push_file("bar", "bar.txt")
+    with monkeypatch.context() as context:
+        make_failing_git("clone", "bar", context)
+        tsrc_cli.run_and_fail("init", git_server.manifest_url)
+    marker = workspace_path / "foo" / "marker.txt"
+    marker.write_text("not cloned again\n")
+
+    message_recorder.reset()
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    assert message_recorder.find("Resuming initialization")
+    assert message_recorder.find("Removing partial clone of bar")
+    assert (workspace_path / "bar" / "bar.txt").exists()
+    assert marker.exists()
+
+
+def test_sync_removes_partial_clones(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path, monkeypatch: Any
+) -> None:
+    """Scenario:
+    * Create a manifest with foo and bar
+    * Run `tsrc init`, and make it stop while cloning bar
+    * Run `tsrc sync`, without `--resume`
+    * Check that the partial clone of bar was replaced by a real one
+    * Check that bar is not removed by the next sync
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    git_server.push_file("bar", "bar.txt")
+    with monkeypatch.context() as context:
+        make_failing_git("clone", "bar", context)
+        tsrc_cli.run_and_fail("init", git_server.manifest_url)
+
+    tsrc_cli.run("sync")
+    assert (workspace_path / "bar" / "bar.txt").exists()
+
+    marker = workspace_path / "bar" / "marker.txt"
+    marker.write_text("not cloned again\n")
+    tsrc_cli.run("sync")
+    assert marker.exists()
+
+
+def test_cannot_resume_init_with_another_manifest(
+    tsrc_cli: CLI, git_server: GitServer, monkeypatch: Any
+) -> None:
+    git_server.add_repo("foo")
+    with monkeypatch.context() as context:
+        make_failing_git("clone", "foo", context)
+        tsrc_cli.run_and_fail("init", git_server.manifest_url)
+    error = tsrc_cli.run_and_fail("init", git_server.get_url("foo"))
+    assert "another manifest_url" in str(error)
+
+
+@pytest.mark.parametrize(
+    "args, option",
+    [
+        (["--shallow"], "shallow_clones"),
+        (["--clone-all-repos"], "clone_all_repos"),
+        (["--group", "default"], "repo_groups"),
+        (["--clone-filter", "blob:none"], "clone_filter"),
+        (["--branch", "devel"], "manifest_branch"),
+    ],
+)
+def test_cannot_resume_init_with_other_options(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    monkeypatch: Any,
+    args: List[str],
+    option: str,
+) -> None:
+    git_server.add_repo("foo")
+    git_server.add_group("default", ["foo"])
+    git_server.manifest.change_branch("devel")
+    git_server.manifest.change_branch("master")
+    with monkeypatch.context() as context:
+        make_failing_git("clone", "foo", context)
+        tsrc_cli.run_and_fail("init", git_server.manifest_url)
+    error = tsrc_cli.run_and_fail("init", git_server.manifest_url, *args)
+    assert f"another {option}" in str(error)
+
+
+@pytest.mark.parametrize("mode", ["", "--pipeline"])
+def test_sync_can_be_resumed(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    monkeypatch: Any,
+    git_calls: GitCalls,
+    message_recorder: MessageRecorder,
+    mode: str,
+) -> None:
+    """Scenario:
+    * Create a workspace with foo, bar and baz
+    * Push a new commit to each repo
+    * Run `tsrc sync`, and make it stop while fetching bar
+    * Move HEAD of foo back, so that it no longer matches
+      the journal
+    * Run `tsrc sync --resume`
+    * Check that bar and foo were synchronized again, but not baz
+    * Check that nothing is left to resume
+    """
+    for name in ["foo", "bar", "baz"]:
+        git_server.add_repo(name)
+    tsrc_cli.run("init", git_server.manifest_url)
+    for name in ["foo", "bar", "baz"]:
+        git_server.push_file(name, "new.txt")
+    sync_args = ["sync", mode] if mode else ["sync"]
+    with monkeypatch.context() as context:
+        make_failing_git("fetch", "bar", context)
+        tsrc_cli.run_and_fail(*sync_args)
+    assert (workspace_path / "baz" / "new.txt").exists()
+    assert not (workspace_path / "bar" / "new.txt").exists()
+    run_git(workspace_path / "foo", "reset", "--hard", "HEAD~1")
+
+    git_calls.clear()
+    message_recorder.reset()
+    tsrc_cli.run(*sync_args, "--resume")
+
+    assert message_recorder.find("Resuming the interrupted sync")
+    for name in ["foo", "bar"]:
+        assert (workspace_path / name / "new.txt").exists()
+    assert "baz" not in git_calls.by_repo()
+
+    message_recorder.reset()
+    tsrc_cli.run("sync", "--resume")
+    assert message_recorder.find("No interrupted sync to resume")
+
+
+def test_sync_without_resume_starts_over(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    monkeypatch: Any,
+    git_calls: GitCalls,
+) -> None:
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+    with monkeypatch.context() as context:
+        make_failing_git("fetch", "bar", context)
+        tsrc_cli.run_and_fail("sync")
+
+    git_calls.clear()
+    tsrc_cli.run("sync")
+    assert "foo" in git_calls.by_repo()
@@ -0,0 +1,96 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.failing_git import FailingGit
+from tsrc.test.helpers.git_server import GitServer
+
+TRANSIENT_ERROR = "fatal: the remote end hung up unexpectedly"
+
+
+def make_flaky_git(command: str, monkeypatch: Any, **kwargs: Any) -> FailingGit:
+    """Make the first run of the given git command in each repo
+    fail with a transient error
+    """
+    monkeypatch.setenv("TSRC_RETRY_DELAY", "0")
+    return FailingGit(
+        command, monkeypatch, times=1, error=TRANSIENT_ERROR, returncode=128, **kwargs
+    )
+
+
+@pytest.mark.parametrize("executor", ["threads", "asyncio"])
+def test_sync_retries_fetch(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    monkeypatch: Any,
+    executor: str,
+) -> None:
+    """Scenario:
+    * Create a workspace with two repos
+    * Push a new commit to foo
+    * Make the first `git fetch` of each repo fail with a transient error
+    * Check that `tsrc sync` succeeds, and that foo is up to date
+    """
+    monkeypatch.setenv("TSRC_EXECUTOR", executor)
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "new.txt")
+    flaky_git = make_flaky_git("fetch", monkeypatch)
+
+    tsrc_cli.run("sync", "-j", "2")
+
+    assert sorted(flaky_git.failures) == [
+        workspace_path / "bar",
+        workspace_path / "foo",
+    ]
+    assert (workspace_path / "foo/new.txt").exists()
+
+
+def test_sync_gives_up(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path, monkeypatch: Any
+) -> None:
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    monkeypatch.setenv("TSRC_RETRY_ATTEMPTS", "1")
+    make_flaky_git("fetch", monkeypatch)
+
+    tsrc_cli.run_and_fail("sync")
+
+
+@pytest.mark.parametrize("executor", ["threads", "asyncio"])
+def test_clone_cleans_up_before_retrying(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    monkeypatch: Any,
+    executor: str,
+) -> None:
+    """Scenario:
+    * Make the first `git clone` leave a half-written clone
+      behind, and fail with a transient error
+    * Check that `tsrc init` succeeds
+    """
+    monkeypatch.setenv("TSRC_EXECUTOR", executor)
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+
+    def leave_partial_clone(working_path: Path, *cmd: str) -> None:
+        partial_path = working_path / cmd[-1]
+        (partial_path / ".git").mkdir(parents=True)
+        (partial_path / "half-written").write_text("")
+
+    flaky_git = make_flaky_git("clone", monkeypatch, before_failing=leave_partial_clone)
+
+    tsrc_cli.run("init", git_server.manifest_url, "-j", "2")
+
+    assert sorted(flaky_git.failures) == [
+        workspace_path / "bar",
+        workspace_path / "foo",
+    ]
+    for dest in ["foo", "bar"]:
+        assert not (workspace_path / dest / "half-written").exists()
+        assert (workspace_path / dest / "README").exists()
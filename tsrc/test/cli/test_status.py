@@ -1,12 +1,16 @@
 import shutil
 from pathlib import Path
+from typing import Any, Iterator, List, Optional, Set
 
 from cli_ui.tests import MessageRecorder
 
 # import pytest
-from tsrc.git import run_git
+import tsrc.status_cache
+from tsrc.git import GitStatus, run_git
+from tsrc.repo_watcher import RepoWatcher
 from tsrc.test.helpers.cli import CLI
 from tsrc.test.helpers.git_server import GitServer
+from tsrc.workspace_repos_summary import WorkspaceReposSummary
 
 
 def test_status_happy(
@@ -256,3 +260,101 @@ def test_correct_missing_upstream(
     tsrc_cli.run("status")
     assert message_recorder.find(r"\* repo1 heads/dev on dev \(expected: master\)")
     assert not message_recorder.find(r"\(missing upstream\)")
+
+
+def test_status_cache(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+    monkeypatch: Any,
+) -> None:
+    """Scenario:
+    * Create a workspace with one repo
+    * Run `tsrc status` twice, so that the status of the repo is cached
+    * Create an untracked file
+    * Check that `tsrc status` shows the repo as dirty
+    * Check that `tsrc status --no-cache` runs git
+    """
+    git_calls: List[Path] = []
+    original_get_git_status = tsrc.status_cache.get_git_status
+
+    def get_git_status(working_path: Path) -> GitStatus:
+        git_calls.append(working_path)
+        return original_get_git_status(working_path)
+
+    monkeypatch.setattr(tsrc.status_cache, "get_git_status", get_git_status)
+    monkeypatch.setattr(tsrc.status_cache, "RACY_DELAY", 0)
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("status")
+    tsrc_cli.run("status")
+
+    (workspace_path / "foo/untracked.txt").write_text("")
+    message_recorder.reset()
+    tsrc_cli.run("status")
+    assert message_recorder.find(r"\* foo master \(dirty\)")
+
+    git_calls.clear()
+    tsrc_cli.run("status", "--no-cache")
+    assert git_calls == [workspace_path / "foo"]
+
+
+def test_status_watch(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+    monkeypatch: Any,
+) -> None:
+    """Scenario:
+    * Create a workspace with two repos
+    * Run `tsrc status --watch`
+    * Make foo dirty, on a longer branch, while it is watching
+    * Check that the summary is displayed again, with foo dirty,
+      and that the columns have the same widths as with
+      a new `tsrc status`
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+    widths = []
+    original_summary = WorkspaceReposSummary.summary
+
+    def summary(self: WorkspaceReposSummary) -> None:
+        original_summary(self)
+        widths.append(
+            (
+                self.max_dest,
+                self.max_dm_desc,
+                self.max_fm_desc,
+                self.max_desc,
+                self.max_a_block,
+            )
+        )
+
+    monkeypatch.setattr(WorkspaceReposSummary, "summary", summary)
+
+    def make_changes() -> Iterator[Set[str]]:
+        (workspace_path / "foo/untracked.txt").write_text("")
+        run_git(workspace_path / "foo", "checkout", "-b", "longer-branch")
+        message_recorder.reset()
+        yield {"foo"}
+        raise KeyboardInterrupt
+
+    changes = make_changes()
+
+    def wait_for_changes(
+        self: RepoWatcher, timeout: Optional[float] = None
+    ) -> Set[str]:
+        return next(changes)
+
+    monkeypatch.setattr(RepoWatcher, "wait_for_changes", wait_for_changes)
+    tsrc_cli.run("status", "--watch")
+
+    assert message_recorder.find(r"\* foo longer-branch \(dirty\)")
+    assert message_recorder.find(r"\* bar master")
+    tsrc_cli.run("status")
+    first, redrawn, expected = widths
+    assert redrawn != first
+    assert redrawn == expected
@@ -8,9 +8,10 @@ from ruamel.yaml import YAML
 from tsrc.errors import Error
 from tsrc.git import get_sha1, run_git, run_git_captured
 from tsrc.groups import GroupNotFound
+from tsrc.state_db import StateDB
 from tsrc.test.helpers.cli import CLI
 from tsrc.test.helpers.git_server import GitServer
-from tsrc.workspace import SyncError
+from tsrc.workspace import SyncError, Workspace
 from tsrc.workspace_config import WorkspaceConfig
 
 
@@ -34,6 +35,111 @@ def test_sync_happy(tsrc_cli: CLI, git_server: GitServer, workspace_path: Path)
     assert new_txt_path.exists(), "foo should have been updated"
 
 
+def test_sync_with_asyncio_executor(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path, monkeypatch: Any
+) -> None:
+    """Scenario:
+    * Use the asyncio executor
+    * Create a manifest with two repos (foo and bar)
+    * Initialize a workspace from this manifest, using 2 jobs
+    * Push a new file to the foo repo
+    * Run `tsrc sync` with 2 jobs
+    * Check that the foo clone has been updated
+    """
+    monkeypatch.setenv("TSRC_EXECUTOR", "asyncio")
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url, "-j", "2")
+    git_server.push_file("foo", "new.txt", contents="new file")
+
+    tsrc_cli.run("sync", "-j", "2")
+
+    assert (workspace_path / "foo/new.txt").exists()
+
+
+def test_sync_records_durations(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with two repos (foo and bar)
+    * Initialize a workspace from this manifest
+    * Run `tsrc sync`
+    * Check that clone and fetch durations have been recorded
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("sync")
+
+    state_db = StateDB.for_workspace(workspace_path)
+    assert sorted(state_db.get_timings("clone")) == ["bar", "foo"]
+    assert sorted(state_db.get_timings("fetch")) == ["bar", "foo"]
+
+
+def test_sync_records_state(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with one repo (foo)
+    * Initialize a workspace from this manifest
+    * Push a new commit to foo, and run `tsrc sync`
+    * Check that what tsrc learned about foo is in the state database
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "new.txt")
+    tsrc_cli.run("sync")
+
+    state_db = StateDB.for_workspace(workspace_path)
+    assert state_db.get_synced_head("foo") == git_server.get_sha1("foo")
+    assert "branch" in state_db.get_synced_entries()["foo"]
+    assert sorted(state_db.get_timings("fetch")) == ["foo"]
+
+
+def test_sync_skip_unchanged(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+) -> None:
+    """Scenario:
+    * Create a manifest with two repos (foo and bar)
+    * Initialize a workspace from this manifest
+    * Push a new file to foo, and a new tag to bar
+    * Create a remote-tracking branch in foo that does not exist upstream
+    * Run `tsrc sync --skip-unchanged` several times, checking that
+      new commits and tags are fetched, stale remote-tracking branches
+      are pruned, and that fetch is skipped when nothing changed
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+    foo_path = workspace_path / "foo"
+    bar_path = workspace_path / "bar"
+
+    git_server.push_file("foo", "new.txt")
+    git_server.tag("bar", "v0.1")
+    message_recorder.reset()
+    tsrc_cli.run("sync", "--skip-unchanged")
+    assert (foo_path / "new.txt").exists()
+    _, tags = run_git_captured(bar_path, "tag", "--list")
+    assert tags == "v0.1"
+    assert not message_recorder.find("Skipped fetching")
+
+    run_git(foo_path, "update-ref", "refs/remotes/origin/gone", "HEAD")
+    tsrc_cli.run("sync", "--skip-unchanged")
+    rc, _ = run_git_captured(
+        foo_path, "rev-parse", "--verify", "refs/remotes/origin/gone", check=False
+    )
+    assert rc != 0, "stale remote-tracking branch should have been pruned"
+
+    message_recorder.reset()
+    tsrc_cli.run("sync", "--skip-unchanged")
+    assert message_recorder.find("Skipped fetching")
+    assert message_recorder.find(r"\* foo")
+    assert message_recorder.find(r"\* bar")
+
+
 def test_sync_sequential(
     tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
 ) -> None:
@@ -85,6 +191,59 @@ def test_sync_with_errors(
     tsrc_cli.run_and_fail_with(Error, "sync")
 
 
+def test_sync_pipelined(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with the foo repo
+    * Initialize a workspace from this manifest
+    * Push a new file to the foo repo
+    * Add a bar repo to the manifest, with a copy from bar/bar.txt to top.txt
+    * Run `tsrc sync --pipeline` with 2 jobs
+    * Check that foo has been updated, bar cloned and top.txt copied
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "new.txt", contents="new file")
+    git_server.add_repo("bar")
+    git_server.push_file("bar", "bar.txt", contents="bar")
+    git_server.manifest.set_file_copy("bar", "bar.txt", "top.txt")
+
+    tsrc_cli.run("sync", "--pipeline", "-j", "2")
+
+    assert (workspace_path / "foo/new.txt").exists()
+    assert (workspace_path / "top.txt").read_text() == "bar"
+
+
+def test_sync_pipelined_with_errors(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with two repos (foo and bar), and
+      a copy from foo/foo.txt to top.txt
+    * Initialize a workspace from this manifest
+    * Create a merge conflict in the foo repo
+    * Push a new file to the bar repo
+    * Run `tsrc sync --pipeline`
+    * Check that it fails, that bar is still updated, and that
+      the copy depending on foo was skipped
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    git_server.push_file("foo", "foo.txt", contents="v1")
+    git_server.manifest.set_file_copy("foo", "foo.txt", "top.txt")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "conflict.txt", contents="this is red")
+    (workspace_path / "foo/conflict.txt").write_text("this is green")
+    git_server.push_file("foo", "foo.txt", contents="v2")
+    git_server.push_file("bar", "new.txt")
+
+    tsrc_cli.run_and_fail_with(Error, "sync", "--pipeline")
+
+    assert (workspace_path / "bar/new.txt").exists()
+    assert (workspace_path / "top.txt").read_text() == "v1"
+
+
 def test_sync_on_bare_repo(
     tsrc_cli: CLI,
     git_server: GitServer,
@@ -269,6 +428,37 @@ def test_sync_discards_local_manifest_changes(
     assert not bar_path.exists(), "bar should not have been synced"
 
 
+def test_sync_loads_unchanged_manifest_once(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path, monkeypatch: Any
+) -> None:
+    """Scenario:
+    * Initialize a workspace from a manifest with one repo
+    * Update the manifest while it did not change upstream
+    * Check that it was loaded only once, and that no changes are reported
+    * Push a change to the manifest and update it again
+    * Check that the change is reported
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    workspace = Workspace(workspace_path)
+    loads = []
+    original_get_manifest = workspace.local_manifest.get_manifest
+
+    def counting_get_manifest() -> Any:
+        loads.append(True)
+        return original_get_manifest()
+
+    monkeypatch.setattr(workspace.local_manifest, "get_manifest", counting_get_manifest)
+
+    diff = workspace.update_manifest()
+    assert diff and diff.is_empty()
+    assert len(loads) == 1
+
+    git_server.add_repo("bar")
+    diff = workspace.update_manifest()
+    assert diff and diff.added == ["bar"]
+
+
 def test_sync_with_no_update_manifest_flag_leaves_changes(
     tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
 ) -> None:
@@ -565,6 +755,72 @@ def test_sha1s_are_updated_when_clean(
     ).exists(), f"foo should have been updated to the {new_sha1} revision"
 
 
+def test_narrow_fetch(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with a foo repo on master
+    * Initialize a workspace from this manifest
+    * Push a new file to master, a new branch, and a new tag
+    * Run `tsrc sync --narrow-fetch`
+    * Check that master has been updated, but that neither
+      the new branch nor the new tag have been fetched
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    git_server.push_file("foo", "new.txt")
+    git_server.push_file("foo", "other.txt", branch="other")
+    git_server.tag("foo", "v0.1")
+
+    tsrc_cli.run("sync", "--narrow-fetch")
+
+    foo_path = workspace_path / "foo"
+    assert (foo_path / "new.txt").exists()
+    _, branches = run_git_captured(foo_path, "branch", "--remotes")
+    assert "origin/other" not in branches
+    _, tags = run_git_captured(foo_path, "tag", "--list")
+    assert not tags
+
+
+def test_narrow_fetch_with_refs(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Create a manifest with a foo repo frozen at the initial
+      revision, and a bar repo on master
+    * Initialize a workspace from this manifest
+    * Push a new commit to a new branch of foo
+    * Freeze foo at this commit, and freeze bar at a new tag,
+      while keeping the branch of bar in the manifest
+    * Run `tsrc sync --narrow-fetch`
+    * Check that foo has been updated to a commit that is not
+      part of any fetched branch, and that bar is at the new tag
+      and still on master
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    git_server.manifest.set_repo_sha1("foo", git_server.get_sha1("foo"))
+    tsrc_cli.run("init", git_server.manifest_url)
+    foo_path = workspace_path / "foo"
+    bar_path = workspace_path / "bar"
+
+    git_server.push_file("foo", "other.txt", branch="other")
+    _, out = run_git_captured(foo_path, "ls-remote", "origin", "refs/heads/other")
+    other_sha1 = out.split()[0]
+    git_server.manifest.set_repo_sha1("foo", other_sha1)
+    git_server.push_file("bar", "new.txt")
+    git_server.tag("bar", "v0.1")
+    git_server.manifest.configure_repo("bar", "branch", "master")
+    git_server.manifest.set_repo_tag("bar", "v0.1")
+
+    tsrc_cli.run("sync", "--narrow-fetch")
+
+    assert get_sha1(foo_path) == other_sha1
+    assert (bar_path / "new.txt").exists()
+    _, branch = run_git_captured(bar_path, "branch", "--show-current")
+    assert branch == "master"
+
+
 def test_tags_are_skipped_when_not_clean_tags(
     tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
 ) -> None:
@@ -972,3 +1228,44 @@ def test_ignored_submodules(
     tsrc_cli.run("sync")
     assert sub1_readme.exists(), "sub1 was not cloned"
     assert sub1_new_txt.exists(), "sub1 was not cloned"
+
+
+def test_sync_with_host_limits(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    """Scenario:
+    * Initialize a workspace with foo and bar
+    * Set host limits and adaptive jobs in the workspace configuration
+    * Push a new file to foo and bar
+    * Run `tsrc sync -j 4`
+    * Check that both repos have been updated
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+    cfg_path = workspace_path / ".tsrc" / "config.yml"
+    config = WorkspaceConfig.from_file(cfg_path)
+    config.host_limits = {"localhost": 1}
+    config.adaptive_jobs = True
+    config.save_to_file(cfg_path)
+    git_server.push_file("foo", "new.txt")
+    git_server.push_file("bar", "new.txt")
+
+    tsrc_cli.run("sync", "-j", "4")
+
+    for name in ["foo", "bar"]:
+        assert (workspace_path / name / "new.txt").exists()
+
+
+def test_sync_with_invalid_host_limits(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> None:
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    cfg_path = workspace_path / ".tsrc" / "config.yml"
+    config = WorkspaceConfig.from_file(cfg_path)
+    config.host_limits = {"localhost": 0}
+    config.save_to_file(cfg_path)
+
+    error = tsrc_cli.run_and_fail("sync")
+    assert "Invalid limit for host 'localhost'" in str(error)
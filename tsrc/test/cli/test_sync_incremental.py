@@ -0,0 +1,118 @@
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+from cli_ui.tests import MessageRecorder
+
+from tsrc.executor import Outcome
+from tsrc.git import get_current_branch, run_git
+from tsrc.repo import Repo
+from tsrc.syncer import Syncer
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+
+@pytest.fixture
+def synced(monkeypatch: Any) -> List[str]:
+    """Return the list of the repos processed by the syncer"""
+    res: List[str] = []
+    original_process = Syncer.process
+
+    def process(self: Syncer, index: int, count: int, repo: Repo) -> Outcome:
+        res.append(repo.dest)
+        return original_process(self, index, count, repo)
+
+    monkeypatch.setattr(Syncer, "process", process)
+    return res
+
+
+def test_sync_incremental(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    message_recorder: MessageRecorder,
+    synced: List[str],
+) -> None:
+    """Scenario:
+    * Create a manifest with three repos (foo, bar and baz)
+    * Initialize a workspace from this manifest, and synchronize it
+    * Push a new file to foo, and change the branch of bar in the manifest
+    * Run `tsrc sync --incremental`
+    * Check that only foo and bar were synchronized
+    * Run `tsrc sync --incremental` again
+    * Check that nothing was synchronized
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    git_server.add_repo("baz")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("sync")
+
+    git_server.push_file("foo", "new.txt")
+    git_server.push_file("bar", "devel.txt", branch="devel")
+    git_server.manifest.set_repo_branch("bar", "devel")
+    synced.clear()
+    message_recorder.reset()
+    tsrc_cli.run("sync", "--incremental")
+    assert sorted(synced) == ["bar", "foo"]
+    assert message_recorder.find(r"bar \(branch changed\)")
+    assert (workspace_path / "foo/new.txt").exists()
+    assert get_current_branch(workspace_path / "bar") == "devel"
+
+    synced.clear()
+    message_recorder.reset()
+    tsrc_cli.run("sync", "--incremental")
+    assert synced == []
+    assert message_recorder.find("No repo changed")
+
+
+def test_sync_incremental_after_local_changes(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path, synced: List[str]
+) -> None:
+    """Scenario:
+    * Create a manifest with two repos (foo and bar)
+    * Initialize a workspace from this manifest, and synchronize it
+    * Reset foo to its previous commit
+    * Run `tsrc sync --incremental`
+    * Check that foo was synchronized again
+    """
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    git_server.push_file("foo", "new.txt")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("sync")
+
+    foo_path = workspace_path / "foo"
+    run_git(foo_path, "reset", "--hard", "HEAD~1")
+    synced.clear()
+    tsrc_cli.run("sync", "--incremental")
+    assert synced == ["foo"]
+    assert (foo_path / "new.txt").exists()
+
+
+def test_sync_incremental_after_failure(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path, synced: List[str]
+) -> None:
+    """Scenario:
+    * Create a manifest with one repo (foo)
+    * Initialize a workspace from this manifest, and synchronize it
+    * Push a new file to foo, and make the local repo dirty
+    * Check that `tsrc sync --incremental` fails
+    * Clean the local repo
+    * Check that `tsrc sync --incremental` synchronizes foo again,
+      even though its new commit has already been fetched
+    """
+    git_server.add_repo("foo")
+    tsrc_cli.run("init", git_server.manifest_url)
+    tsrc_cli.run("sync")
+
+    git_server.push_file("foo", "new.txt")
+    foo_path = workspace_path / "foo"
+    (foo_path / "new.txt").write_text("local changes")
+    tsrc_cli.run_and_fail("sync", "--incremental")
+
+    (foo_path / "new.txt").unlink()
+    synced.clear()
+    tsrc_cli.run("sync", "--incremental")
+    assert synced == ["foo"]
+    assert (foo_path / "new.txt").exists()
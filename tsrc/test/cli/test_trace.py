@@ -0,0 +1,75 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+Event = Dict[str, Any]
+
+
+def read_spans(trace_path: Path) -> List[Event]:
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    return [x for x in events if x["ph"] == "X"]
+
+
+def contains(outer: Event, inner: Event) -> bool:
+    if outer["tid"] != inner["tid"]:
+        return False
+    end, inner_end = outer["ts"] + outer["dur"], inner["ts"] + inner["dur"]
+    return bool(outer["ts"] <= inner["ts"] and inner_end <= end)
+
+
+@pytest.mark.parametrize("executor", ["threads", "asyncio"])
+def test_trace_sync(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    workspace_path: Path,
+    tmp_path: Path,
+    monkeypatch: Any,
+    executor: str,
+) -> None:
+    """Scenario:
+    * Create a workspace with two repos
+    * Run `tsrc --trace trace.json sync -j 2`
+    * Check that there is a span for each repo, containing
+      the spans of the git commands run in it
+    """
+    monkeypatch.setenv("TSRC_EXECUTOR", executor)
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    tsrc_cli.run("init", git_server.manifest_url)
+    trace_path = tmp_path / "trace.json"
+
+    tsrc_cli.run("--trace", str(trace_path), "sync", "-j", "2")
+
+    spans = read_spans(trace_path)
+    for dest in ["foo", "bar"]:
+        (repo_span,) = [x for x in spans if x["cat"] == "Syncer" and x["name"] == dest]
+        git_spans = [
+            x
+            for x in spans
+            if x["args"].get("working_path") == str(workspace_path / dest)
+        ]
+        assert {x["name"] for x in git_spans} >= {"git fetch"}
+        for git_span in git_spans:
+            assert git_span["args"]["returncode"] == 0
+            assert contains(repo_span, git_span)
+
+
+def test_trace_from_env(
+    tsrc_cli: CLI,
+    git_server: GitServer,
+    tmp_path: Path,
+    monkeypatch: Any,
+) -> None:
+    git_server.add_repo("foo")
+    trace_path = tmp_path / "trace.json"
+    monkeypatch.setenv("TSRC_TRACE", str(trace_path))
+
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    spans = read_spans(trace_path)
+    assert any(x["name"] == "git clone" for x in spans)
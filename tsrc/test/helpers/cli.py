@@ -10,16 +10,19 @@ from typing import Any, List, Type
 import cli_ui as ui
 import pytest
 
-from tsrc.cli.main import testable_main
+from tsrc.cli.main import ACTIONS, testable_main
 from tsrc.errors import Error
 
 
 def append_jobs_option(*args: str) -> List[str]:
     jobs = os.environ.get("TSRC_TEST_JOBS")
     if jobs:
-        action, *rest = args
-        if action not in ["apply-manifest", "version"]:
-            return [action, "-j", jobs, *rest]
+        # Note: global options (like `--trace PATH`) come before the action
+        for index, action in enumerate(args):
+            if action in ACTIONS:
+                if action in ["apply-manifest", "version"]:
+                    break
+                return [*args[: index + 1], "-j", jobs, *args[index + 1 :]]
     return [*args]
 
 
@@ -0,0 +1,71 @@
+""" Helper to make the git commands run by tsrc fail. """
+
+from pathlib import Path
+from typing import Any, Callable, List, Optional
+
+import tsrc.executor
+from tsrc.git import GitCommandError
+
+
+class FailingGit:
+    """Make the given git command fail, as if the connection
+    dropped or tsrc was interrupted while running it:
+
+    * `dests`: only fail in these repos (by default, in all of them)
+    * `times`: how many times the command fails in each repo
+      (by default, every time)
+    * `error` and `returncode`: those of the GitCommandError raised
+    * `before_failing`: called with the arguments of the command
+      before raising, for instance to leave a partial clone behind
+
+    `failures` lists the path of the repo each time the command failed
+    """
+
+    def __init__(
+        self,
+        command: str,
+        monkeypatch: Any,
+        *,
+        dests: Optional[List[str]] = None,
+        times: Optional[int] = None,
+        error: str = "interrupted",
+        returncode: int = 1,
+        before_failing: Optional[Callable[..., None]] = None,
+    ) -> None:
+        self.command = command
+        self.dests = dests
+        self.times = times
+        self.error = error
+        self.returncode = returncode
+        self.before_failing = before_failing
+        self.failures: List[Path] = []
+        self.original_run_git = tsrc.executor.run_git
+        self.original_run_git_async = tsrc.executor.run_git_async
+        # Note: tasks run git through the helpers of tsrc.executor
+        # (see Task.run_steps())
+        monkeypatch.setattr(tsrc.executor, "run_git", self.run_git)
+        monkeypatch.setattr(tsrc.executor, "run_git_async", self.run_git_async)
+
+    def maybe_fail(self, working_path: Path, *cmd: str) -> None:
+        if cmd[0] != self.command:
+            return
+        # Note: clones all run from the top of the workspace
+        target = working_path / cmd[-1] if cmd[0] == "clone" else working_path
+        if self.dests is not None and target.name not in self.dests:
+            return
+        if self.times is not None and self.failures.count(target) >= self.times:
+            return
+        self.failures.append(target)
+        if self.before_failing:
+            self.before_failing(working_path, *cmd)
+        raise GitCommandError(
+            working_path, cmd, error=self.error, returncode=self.returncode
+        )
+
+    def run_git(self, working_path: Path, *cmd: str, **kwargs: Any) -> None:
+        self.maybe_fail(working_path, *cmd)
+        self.original_run_git(working_path, *cmd, **kwargs)
+
+    async def run_git_async(self, working_path: Path, *cmd: str, **kwargs: Any) -> Any:
+        self.maybe_fail(working_path, *cmd)
+        return await self.original_run_git_async(working_path, *cmd, **kwargs)
@@ -0,0 +1,55 @@
+""" Helper to check how many git commands tsrc runs.
+
+Used by the `git_calls` fixture.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterator
+
+import pytest
+
+from tsrc.git_stats import STATS
+
+
+class GitCalls:
+    def __init__(self, workspace_path: Path) -> None:
+        self.workspace_path = workspace_path
+
+    def clear(self) -> None:
+        STATS.clear()
+
+    def by_repo(self) -> Dict[str, int]:
+        """Return the number of git calls for each repo of the workspace,
+        by dest. Calls made from the top of the workspace (like `git
+        clone`) are counted under ""
+        """
+        res = {}
+        for path, (count, _) in STATS.by_repo().items():
+            try:
+                dest = path.resolve().relative_to(self.workspace_path.resolve())
+            except ValueError:
+                continue
+            res[dest.as_posix() if dest.parts else ""] = count
+        return res
+
+    def assert_at_most(self, max_calls: int) -> None:
+        """Check that no repo of the workspace needed more than
+        `max_calls` git calls since the last call to clear().
+
+        Calls made from the top of the workspace, or in the
+        manifest clone under `.tsrc`, are not checked.
+        """
+        too_many = {
+            k: v
+            for (k, v) in self.by_repo().items()
+            if k and not k.startswith(".tsrc/") and v > max_calls
+        }
+        assert not too_many, f"More than {max_calls} git call(s) for: {too_many}"
+
+
+@pytest.fixture
+def git_calls(workspace_path: Path) -> Iterator[GitCalls]:
+    res = GitCalls(workspace_path)
+    res.clear()
+    yield res
+    res.clear()
@@ -188,6 +188,12 @@ class ManifestHandler:
         self.data["repos"].append(repo_config)
         self.write_changes(message=f"add {name}")
 
+    def add_repos(self, names_and_urls: List[Tuple[str, str]]) -> None:
+        """Same as add_repo() for each repo, but with only one commit"""
+        for name, url in names_and_urls:
+            self.data["repos"].append({"url": str(url), "dest": name})
+        self.write_changes(message=f"add {len(names_and_urls)} repos")
+
     def configure_group(
         self, name: str, repos: List[str], includes: Optional[List[str]] = None
     ) -> None:
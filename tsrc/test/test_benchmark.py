@@ -0,0 +1,41 @@
+import json
+from pathlib import Path
+
+from tsrc.test.benchmark import main
+
+
+def test_benchmark(tmp_path: Path) -> None:
+    """Make sure the benchmark still runs, on a tiny workspace"""
+    output = tmp_path / "results.json"
+    main(
+        [
+            "--repos",
+            "2",
+            "--jobs",
+            "1",
+            "--commits",
+            "1",
+            "--repeat",
+            "1",
+            "--files",
+            "10",
+            "--work-dir",
+            str(tmp_path),
+            "--output",
+            str(output),
+        ]
+    )
+    results = json.loads(output.read_text())["results"]
+    assert [x["command"] for x in results] == [
+        "init",
+        "sync-noop",
+        "sync-changes",
+        "status",
+        "status-cached",
+        "foreach",
+        "log",
+        "dump-manifest",
+        "git-status",
+        "status-cache-hit",
+    ]
+    assert all(x["returncode"] == 0 for x in results)
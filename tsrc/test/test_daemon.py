@@ -0,0 +1,181 @@
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import pytest
+
+import tsrc.cli
+import tsrc.status_cache
+from tsrc.daemon import Daemon
+from tsrc.daemon_client import DaemonClient, get_socket_path
+from tsrc.executor import Outcome
+from tsrc.git import GitStatus
+from tsrc.repo import Repo
+from tsrc.status_endpoint import StatusCollector
+from tsrc.test.helpers.cli import CLI
+from tsrc.test.helpers.git_server import GitServer
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is only available on Linux"
+)
+
+
+@pytest.fixture
+def daemon_thread(
+    tsrc_cli: CLI, git_server: GitServer, workspace_path: Path
+) -> Iterator[threading.Thread]:
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    git_server.add_group("group1", ["foo"])
+    git_server.push_file("foo", "foo.txt")
+    git_server.manifest.set_file_copy("foo", "foo.txt", "top.txt")
+    tsrc_cli.run("init", git_server.manifest_url)
+
+    daemon = Daemon(workspace_path)
+    res = threading.Thread(target=daemon.serve, name="tsrc-daemon")
+    res.start()
+    client = None
+    while res.is_alive() and not client:
+        time.sleep(0.01)
+        client = DaemonClient.connect(workspace_path)
+    if client:
+        wait_for_statuses(client, ["bar", "foo"])
+    yield res
+    if client:
+        client.stop()
+        client.close()
+    res.join()
+
+
+def wait_for_statuses(client: DaemonClient, dests: List[str]) -> Dict[str, Any]:
+    """Wait until the daemon knows the up-to-date statuses of the given repos"""
+    for _ in range(1000):
+        statuses = client.get_statuses(dests)
+        if sorted(statuses) == sorted(dests):
+            return statuses
+        time.sleep(0.01)
+    raise AssertionError(f"statuses of {dests} not refreshed")
+
+
+def test_queries(workspace_path: Path, daemon_thread: threading.Thread) -> None:
+    client = DaemonClient.connect(workspace_path)
+    assert client
+
+    statuses = client.get_statuses()
+    assert sorted(statuses) == ["bar", "foo"]
+    assert statuses["foo"]["branch"] == "master"
+    assert statuses["foo"]["dirty"] is False
+
+    # Note: the daemon must take the change into account
+    # before answering
+    (workspace_path / "foo/untracked.txt").write_text("")
+    response = client.query({"query": "status", "dests": ["foo"]})
+    assert response
+    assert response["stale"] == ["foo"] or response["statuses"]["foo"]["untracked"]
+    statuses = wait_for_statuses(client, ["foo"])
+    assert statuses["foo"]["untracked"] == 1
+
+    response = client.query({"query": "repos", "groups": ["group1"]})
+    assert response
+    assert response["repos"] == ["foo"]
+
+    response = client.query({"query": "manifest"})
+    assert response
+    assert sorted(response["repos"]) == ["bar", "foo"]
+    assert response["repos"]["foo"]["copy"] == [["foo.txt", "top.txt"]]
+
+    assert client.query({"query": "no-such-query"}) is None
+    client.close()
+
+
+def test_answers_while_refreshing(
+    workspace_path: Path, daemon_thread: threading.Thread, monkeypatch: Any
+) -> None:
+    """Check that the daemon serves the last known statuses,
+    marked as stale, while it computes the new ones
+    """
+    client = DaemonClient.connect(workspace_path)
+    assert client
+    refreshed = threading.Event()
+    original_process = StatusCollector.process
+
+    def process(self: StatusCollector, index: int, count: int, repo: Repo) -> Outcome:
+        refreshed.wait()
+        return original_process(self, index, count, repo)
+
+    monkeypatch.setattr(StatusCollector, "process", process)
+
+    try:
+        (workspace_path / "foo/untracked.txt").write_text("")
+        response = client.query({"query": "status"})
+        assert response
+        assert response["stale"] == ["foo"]
+        assert response["statuses"]["foo"]["untracked"] == 0
+        assert client.get_statuses() == {"bar": response["statuses"]["bar"]}
+    finally:
+        refreshed.set()
+
+    statuses = wait_for_statuses(client, ["foo"])
+    assert statuses["foo"]["untracked"] == 1
+    client.close()
+
+
+def test_stop(
+    tsrc_cli: CLI, workspace_path: Path, daemon_thread: threading.Thread
+) -> None:
+    tsrc_cli.run("daemon", "--stop")
+    daemon_thread.join()
+    assert not get_socket_path(workspace_path).exists()
+    assert DaemonClient.connect(workspace_path) is None
+
+
+def test_status_uses_daemon(
+    tsrc_cli: CLI,
+    workspace_path: Path,
+    daemon_thread: threading.Thread,
+    monkeypatch: Any,
+) -> None:
+    """Check that `tsrc status` does not run git when a daemon is running"""
+    git_calls: List[Path] = []
+    original_get_git_status = tsrc.status_cache.get_git_status
+
+    def get_git_status(working_path: Path) -> GitStatus:
+        if threading.current_thread() is not daemon_thread:
+            git_calls.append(working_path)
+        return original_get_git_status(working_path)
+
+    monkeypatch.setattr(tsrc.status_cache, "get_git_status", get_git_status)
+
+    tsrc_cli.run("status")
+    assert not git_calls
+
+    tsrc_cli.run("status", "--no-cache")
+    assert sorted(git_calls) == [workspace_path / "bar", workspace_path / "foo"]
+
+
+def test_repos_selected_by_daemon(
+    tsrc_cli: CLI,
+    workspace_path: Path,
+    daemon_thread: threading.Thread,
+    monkeypatch: Any,
+) -> None:
+    """Check that tsrc commands let the daemon select the repos"""
+    selected: List[Optional[List[str]]] = []
+    original_get_daemon_repos = tsrc.cli.get_daemon_repos
+
+    def get_daemon_repos(*args: Any, **kwargs: Any) -> Optional[List[str]]:
+        res = original_get_daemon_repos(*args, **kwargs)
+        selected.append(res)
+        return res
+
+    monkeypatch.setattr(tsrc.cli, "get_daemon_repos", get_daemon_repos)
+
+    tsrc_cli.run("status", "--group", "group1")
+    assert selected == [["foo"]]
+
+    # Note: the daemon fails to select the repos, so
+    # tsrc does it by itself and reports the error
+    tsrc_cli.run_and_fail("status", "--group", "no-such-group")
+    assert selected[1:] == [None]
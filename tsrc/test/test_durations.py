@@ -0,0 +1,52 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from tsrc.durations import InvalidJobOrder, JobDurations
+from tsrc.state_db import StateDB
+
+
+def test_unknown_items_go_first(tmp_path: Path) -> None:
+    state_db = StateDB(tmp_path / "state.sqlite")
+    state_db.record_timings("fetch", {"foo": 1.0, "bar": 10.0})
+    durations = JobDurations(state_db, "fetch")
+
+    actual = durations.sort(["foo", "bar", "new", "other"], lambda x: x)
+
+    assert actual == ["new", "other", "bar", "foo"]
+
+
+def test_save_and_smooth(tmp_path: Path) -> None:
+    state_db = StateDB(tmp_path / ".tsrc" / "state.sqlite")
+    durations = JobDurations(state_db, "clone")
+    durations.record("foo", 4.0)
+    durations.save()
+    assert state_db.get_timings("clone") == {"foo": 4.0}
+
+    durations = JobDurations(state_db, "clone")
+    durations.record("foo", 2.0)
+    durations.save()
+    assert state_db.get_timings("clone") == {"foo": 3.0}
+
+
+def test_other_kinds_are_kept(tmp_path: Path) -> None:
+    state_db = StateDB(tmp_path / "state.sqlite")
+    fetch_durations = JobDurations(state_db, "fetch")
+    status_durations = JobDurations(state_db, "status")
+    fetch_durations.record("foo", 1.0)
+    status_durations.record("foo", 0.5)
+    fetch_durations.save()
+    status_durations.save()
+
+    assert state_db.get_timings("fetch") == {"foo": 1.0}
+    assert state_db.get_timings("status") == {"foo": 0.5}
+
+
+def test_disabled_with_env_var(tmp_path: Path, monkeypatch: Any) -> None:
+    state_db = StateDB(tmp_path / "state.sqlite")
+    monkeypatch.setenv("TSRC_JOB_ORDER", "manifest")
+    assert JobDurations.from_state_db(state_db, "fetch") is None
+    monkeypatch.setenv("TSRC_JOB_ORDER", "nope")
+    with pytest.raises(InvalidJobOrder):
+        JobDurations.from_state_db(state_db, "fetch")
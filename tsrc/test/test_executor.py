@@ -1,15 +1,31 @@
-from typing import List
+import asyncio
+import time
+from pathlib import Path
+from threading import Lock, Thread, current_thread, main_thread
+from typing import Any, Dict, List, Optional, Tuple
 
 import cli_ui as ui
+import pytest
 
+from tsrc.durations import JobDurations
 from tsrc.errors import Error
 from tsrc.executor import (
+    Call,
+    ExecutorFailed,
+    FollowUpQueue,
+    GitCommand,
+    HostScheduler,
     Outcome,
+    ParallelExecutor,
+    Steps,
     Task,
+    TaskChain,
     process_items,
     process_items_parallel,
     process_items_sequence,
 )
+from tsrc.host_limits import HostLimits
+from tsrc.state_db import StateDB
 
 
 class Kaboom(Error):
@@ -84,3 +100,249 @@ def test_parallel_sad() -> None:
     actual = process_items(["foo", "bar", "failing", "baz", "quux"], task, num_jobs=2)
     errors = actual.errors
     assert errors["failing"].message == "Kaboom"
+
+
+class FakeAsyncTask(FakeTask):
+    """Same as FakeTask, but never uses a worker thread"""
+
+    async def process_async(self, index: int, count: int, item: str) -> Outcome:
+        await asyncio.sleep(0)
+        return self.process(index, count, item)
+
+
+def test_asyncio_happy(monkeypatch: Any) -> None:
+    monkeypatch.setenv("TSRC_EXECUTOR", "asyncio")
+    task = FakeTask()
+    actual = process_items_parallel(["foo", "bar", "baz", "quux"], task, num_jobs=2)
+    assert list(actual) == ["foo", "bar", "baz", "quux"]
+    for outcome in actual.values():
+        assert outcome.success()
+
+
+def test_asyncio_sad(monkeypatch: Any) -> None:
+    monkeypatch.setenv("TSRC_EXECUTOR", "asyncio")
+    task = FakeAsyncTask()
+    actual = process_items(["foo", "bar", "failing", "baz", "quux"], task, num_jobs=2)
+    errors = actual.errors
+    assert errors["failing"].message == "Kaboom"
+
+
+def get_steps(working_path: Path, calls: List[str]) -> Steps[str]:
+    result: Tuple[int, str] = yield GitCommand(working_path, ["--version"])
+    rc, out = result
+    assert rc == 0
+    value = yield Call(calls.append, ("called",))
+    assert value is None
+    try:
+        yield GitCommand(working_path, ["no-such-command"], with_retry=True)
+    except Error:
+        calls.append("failed")
+    return out
+
+
+@pytest.mark.parametrize("executor", ["threads", "asyncio"])
+def test_run_steps(tmp_path: Path, executor: str) -> None:
+    """Scenario:
+    * Run steps running git and calling a function, with both
+      run_steps() and run_steps_async()
+    * Check that each step gets its result back, and that errors
+      are raised in the steps
+    """
+    task = FakeTask()
+    task.parallel = True
+    calls: List[str] = []
+    steps = get_steps(tmp_path, calls)
+    if executor == "asyncio":
+        actual = asyncio.run(task.run_steps_async(steps))
+    else:
+        actual = task.run_steps(steps)
+    assert actual.startswith("git version")
+    assert calls == ["called", "failed"]
+
+
+def test_invalid_executor(monkeypatch: Any) -> None:
+    monkeypatch.setenv("TSRC_EXECUTOR", "nope")
+    task = FakeTask()
+    with pytest.raises(ExecutorFailed):
+        process_items(["foo", "bar"], task, num_jobs=2)
+
+
+class RecordingTask(FakeTask):
+    """Same as FakeTask, but record the processed items"""
+
+    def __init__(self, name: str, processed: List[str]) -> None:
+        self.name = name
+        self.processed = processed
+
+    def process(self, index: int, count: int, item: str) -> Outcome:
+        self.processed.append(f"{self.name}:{item}")
+        return super().process(index, count, item)
+
+
+def test_chain_stops_at_first_error() -> None:
+    processed: List[str] = []
+    first = RecordingTask("first", processed)
+    second = RecordingTask("second", processed)
+
+    def get_steps(item: str) -> List[Task[str]]:
+        if item == "skipped":
+            return [second]
+        return [first, second]
+
+    chain = TaskChain(get_steps, description="Chaining")
+    actual = process_items(["foo", "failing", "skipped"], chain)
+
+    assert processed == ["first:foo", "second:foo", "first:failing", "second:skipped"]
+    assert actual.errors["failing"].message == "Kaboom"
+
+
+def test_follow_ups_in_declared_order() -> None:
+    """Scenario:
+    * Chain tasks on 'foo', 'bar' and 'failing'
+    * Declare follow-ups depending on 'bar', then 'foo', then 'failing'
+      then 'foo' again
+    * Check that follow-ups are processed in this order, and the one
+      depending on the failing item is skipped
+    """
+    processed: List[str] = []
+    follow_ups = FollowUpQueue(
+        RecordingTask("follow-up", processed),
+        [("bar", "one"), ("foo", "two"), ("failing", "three"), ("foo", "four")],
+    )
+    chain = TaskChain(
+        lambda item: [FakeTask()], description="Chaining", follow_ups=follow_ups
+    )
+    process_items(["foo", "bar", "failing"], chain, num_jobs=2)
+
+    assert processed == ["follow-up:one", "follow-up:two", "follow-up:four"]
+    assert list(follow_ups.outcomes) == ["one", "two", "four"]
+
+
+class ThreadRecordingTask(FakeTask):
+    """Same as FakeTask, but record the thread processing each item,
+    and whether the lock of `follow_ups` was held meanwhile
+    """
+
+    def __init__(self) -> None:
+        self.follow_ups: Optional[FollowUpQueue[str]] = None
+        self.threads: List[Thread] = []
+        self.locked: List[bool] = []
+
+    def process(self, index: int, count: int, item: str) -> Outcome:
+        assert self.follow_ups
+        self.threads.append(current_thread())
+        self.locked.append(self.follow_ups.lock.locked())
+        return super().process(index, count, item)
+
+
+@pytest.mark.parametrize("executor", ["threads", "asyncio"])
+def test_follow_ups_outside_of_lock(monkeypatch: Any, executor: str) -> None:
+    """Scenario:
+    * Chain tasks on 'foo' and 'bar', with follow-ups, using
+      the given executor
+    * Check that follow-ups are not processed while holding the
+      lock of the queue, nor in the thread of the event loop
+    """
+    monkeypatch.setenv("TSRC_EXECUTOR", executor)
+    task = ThreadRecordingTask()
+    follow_ups = FollowUpQueue(task, [("foo", "one"), ("bar", "two")])
+    task.follow_ups = follow_ups
+    chain = TaskChain(
+        lambda item: [FakeTask()], description="Chaining", follow_ups=follow_ups
+    )
+    process_items(["foo", "bar"], chain, num_jobs=2)
+
+    assert list(follow_ups.outcomes) == ["one", "two"]
+    assert task.locked == [False, False]
+    assert main_thread() not in task.threads
+
+
+def test_longest_jobs_first(tmp_path: Path) -> None:
+    """Scenario:
+    * Record that 'bar' took longer than 'foo' last time
+    * Process 'foo', 'bar' and 'new' in parallel, with only one worker
+    * Check that 'new' (for which nothing is known) is processed first,
+      then 'bar', then 'foo'
+    * Check that durations have been recorded for all the items
+    """
+    state_db = StateDB(tmp_path / "state.sqlite")
+    state_db.record_timings("test", {"foo": 1.0, "bar": 2.0})
+    durations = JobDurations(state_db, "test")
+    processed: List[str] = []
+    task = RecordingTask("test", processed)
+
+    ParallelExecutor(task, num_jobs=1, durations=durations).process(
+        ["foo", "bar", "new"]
+    )
+
+    assert processed == ["test:new", "test:bar", "test:foo"]
+    assert sorted(durations.measured) == ["bar", "foo", "new"]
+
+
+class HostTask(FakeTask):
+    """Same as FakeTask, but items look like '<host>-<n>', and the
+    highest number of items processed at the same time is recorded
+    for each host
+    """
+
+    def __init__(self) -> None:
+        self.lock = Lock()
+        self.running: Dict[str, int] = {}
+        self.max_running: Dict[str, int] = {}
+
+    def get_host(self, item: str) -> Optional[str]:
+        return item.split("-")[0]
+
+    def process(self, index: int, count: int, item: str) -> Outcome:
+        host = self.get_host(item)
+        assert host
+        with self.lock:
+            self.running[host] = self.running.get(host, 0) + 1
+            self.max_running[host] = max(
+                self.max_running.get(host, 0), self.running[host]
+            )
+        time.sleep(0.05)
+        with self.lock:
+            self.running[host] -= 1
+        return Outcome.empty()
+
+
+@pytest.mark.parametrize("executor", ["threads", "asyncio"])
+def test_host_limits(monkeypatch: Any, executor: str) -> None:
+    """Scenario:
+    * Process items of a 'slow' host limited to one job, and
+      of a 'fast' host without limit, with 4 jobs
+    * Check that 'slow' items were processed one at a time,
+      while 'fast' items were processed concurrently
+    """
+    monkeypatch.setenv("TSRC_EXECUTOR", executor)
+    task = HostTask()
+    items = [f"{host}-{i}" for i in range(4) for host in ["slow", "fast"]]
+    host_limits = HostLimits({"slow": 1}, adaptive=False)
+
+    actual = process_items(items, task, num_jobs=4, host_limits=host_limits)
+
+    assert not actual.errors
+    assert task.max_running["slow"] == 1
+    assert task.max_running["fast"] > 1
+
+
+def test_host_scheduler() -> None:
+    """Scenario:
+    * Schedule items of a 'slow' host limited to one job, and
+      of a 'fast' host without limit
+    * Check that items are handed out in order, at most `max_count`
+      at a time, and that 'slow' items wait for a slot to be released
+    """
+    items = ["slow-0", "fast-0", "slow-1", "fast-1", "fast-2"]
+    host_limits = HostLimits({"slow": 1}, adaptive=False)
+    scheduler = HostScheduler(HostTask(), items, num_jobs=4, host_limits=host_limits)
+
+    assert scheduler.pop_ready(2) == [(0, "slow-0", "slow"), (1, "fast-0", "fast")]
+    assert scheduler.pop_ready(4) == [(3, "fast-1", "fast"), (4, "fast-2", "fast")]
+    assert scheduler.pending == 1
+    assert scheduler.pop_ready(4) == []
+
+    scheduler.release("slow", 1.0, success=True)
+    assert scheduler.pop_ready(4) == [(2, "slow-1", "slow")]
+    assert scheduler.pending == 0
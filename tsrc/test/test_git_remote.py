@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import pytest
+
+from tsrc.git import run_git_captured
+from tsrc.git_remote import add_remotes_to_config, get_remote_urls
+from tsrc.repo import Remote
+
+
+def git(working_path: Path, *cmd: str) -> str:
+    _, out = run_git_captured(working_path, *cmd)
+    return out
+
+
+@pytest.fixture
+def repo_path(tmp_path: Path) -> Path:
+    res = tmp_path / "foo"
+    res.mkdir()
+    git(res, "init", "--initial-branch", "master")
+    git(res, "remote", "add", "origin", "git@example.com:foo.git")
+    git(res, "remote", "add", "upstream", "https://example.com/foo.git")
+    return res
+
+
+def test_get_remote_urls(repo_path: Path) -> None:
+    assert get_remote_urls(repo_path) == {
+        "origin": "git@example.com:foo.git",
+        "upstream": "https://example.com/foo.git",
+    }
+
+
+def test_get_remote_urls_with_includes(repo_path: Path, tmp_path: Path) -> None:
+    other_config = tmp_path / "other.config"
+    other_config.write_text('[remote "other"]\n\turl = /path/to/other\n')
+    git(repo_path, "config", "include.path", str(other_config))
+
+    actual = get_remote_urls(repo_path)
+
+    assert actual["origin"] == "git@example.com:foo.git"
+    assert actual["other"] == "/path/to/other"
+
+
+def test_add_remotes(repo_path: Path) -> None:
+    remotes = [
+        Remote(name="fork", url="git@example.com:me/foo.git"),
+        Remote(name="local", url="/path/with spaces;and#comment"),
+    ]
+
+    assert add_remotes_to_config(repo_path, remotes)
+
+    assert git(repo_path, "remote", "get-url", "fork") == "git@example.com:me/foo.git"
+    assert git(repo_path, "remote", "get-url", "local") == remotes[1].url
+    fetch_refspec = git(repo_path, "config", "remote.fork.fetch")
+    assert fetch_refspec == "+refs/heads/*:refs/remotes/fork/*"
+    assert get_remote_urls(repo_path)["local"] == remotes[1].url
+
+
+def test_add_remotes_while_config_is_locked(repo_path: Path) -> None:
+    (repo_path / ".git/config.lock").write_text("")
+    remotes = [Remote(name="fork", url="git@example.com:me/foo.git")]
+    assert not add_remotes_to_config(repo_path, remotes)
+
+
+def test_add_existing_remote(repo_path: Path) -> None:
+    remotes = [Remote(name="origin", url="git@example.com:other.git")]
+    assert not add_remotes_to_config(repo_path, remotes)
@@ -0,0 +1,22 @@
+from pathlib import Path
+
+from tsrc.git_stats import GitStats, get_command_name
+
+
+def test_get_command_name() -> None:
+    assert get_command_name(["fetch", "--all"]) == "fetch"
+    assert get_command_name(["-c", "core.bare=false", "status"]) == "status"
+    assert get_command_name(["--version"]) == "git"
+
+
+def test_totals() -> None:
+    stats = GitStats()
+    stats.record(Path("foo"), ["fetch"], 2.0)
+    stats.record(Path("foo"), ["status"], 1.0)
+    stats.record(Path("bar"), ["fetch"], 0.5)
+
+    assert stats.by_command() == {"fetch": (2, 2.5), "status": (1, 1.0)}
+    assert stats.by_repo() == {Path("foo"): (2, 3.0), Path("bar"): (1, 0.5)}
+
+    stats.clear()
+    assert stats.by_repo() == {}
@@ -128,6 +128,59 @@ def test_on_tag(git_project: GitProject) -> None:
     assert actual.tag == "v0.1"
 
 
+def test_worktree_counts(git_project: GitProject) -> None:
+    git_project.make_initial_commit()
+    git_project.write_file("README", "changed README")
+    git_project.write_file("added.txt", "added file")
+    git_project.run_git("add", "added.txt")
+    git_project.write_file("untracked.txt", "untracked file")
+
+    actual = git_project.get_status()
+    assert actual.dirty
+    assert actual.added == 1
+    assert actual.not_staged == 1
+    assert actual.untracked == 1
+
+
+def test_upstream(git_project: GitProject) -> None:
+    git_project.make_initial_commit()
+    git_project.run_git("push", "-u", "origin", "master")
+
+    actual = git_project.get_status()
+    assert actual.upstream == "origin/master"
+
+
+def test_skip_tag_lookup(git_project: GitProject) -> None:
+    git_project.make_initial_commit()
+    git_project.run_git("tag", "v0.1")
+
+    actual = GitStatus(git_project.path)
+    actual.update(with_tag=False)
+    assert actual.tag is None
+    assert actual.branch == "master"
+
+
+def test_parse_porcelain_with_renames() -> None:
+    status = GitStatus(Path("src"))
+    sha1 = "b6cfd80" + "0" * 33
+    output = "\0".join(
+        [
+            f"# branch.oid {sha1}",
+            "# branch.head (detached)",
+            "2 R. N... 100644 100644 100644 1234567 1234567 R100 new.txt",
+            "old.txt",
+            "? untracked.txt",
+            "",
+        ]
+    )
+
+    status.update_from_porcelain(output)
+    assert status.sha1 == "b6cfd80"
+    assert status.branch is None
+    assert status.staged == 1
+    assert status.untracked == 1
+
+
 class TestDescribe:
     dummy_path = Path("src")
 
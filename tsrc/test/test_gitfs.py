@@ -0,0 +1,164 @@
+import subprocess
+import textwrap
+from pathlib import Path
+
+import pytest
+
+from tsrc.git import (
+    get_current_branch,
+    get_sha1,
+    get_tracking_ref,
+    is_git_repository,
+    is_shallow,
+)
+from tsrc.gitfs import GitDir, map_refspecs, parse_git_config
+
+
+def run_git(working_path: Path, *cmd: str) -> str:
+    process = subprocess.run(
+        ["git", *cmd],
+        check=True,
+        cwd=working_path,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    return process.stdout.strip()
+
+
+@pytest.fixture
+def repo_path(tmp_path: Path) -> Path:
+    srv_path = tmp_path / "srv.git"
+    run_git(tmp_path, "init", "--bare", "--initial-branch", "master", str(srv_path))
+    res = tmp_path / "src"
+    res.mkdir()
+    run_git(res, "init", "--initial-branch", "master")
+    (res / "README").write_text("This is the README")
+    run_git(res, "add", ".")
+    run_git(res, "commit", "-m", "initial commit")
+    run_git(res, "remote", "add", "origin", str(srv_path))
+    run_git(res, "push", "-u", "origin", "master")
+    return res
+
+
+def test_head_on_branch(repo_path: Path) -> None:
+    git_dir = GitDir.find(repo_path)
+    assert git_dir
+    assert git_dir.head_branch() == "refs/heads/master"
+    assert git_dir.resolve_ref("HEAD") == run_git(repo_path, "rev-parse", "HEAD")
+    assert get_current_branch(repo_path) == "master"
+
+
+def test_packed_refs(repo_path: Path) -> None:
+    run_git(repo_path, "tag", "-a", "v0.1", "-m", "v0.1")
+    run_git(repo_path, "pack-refs", "--all")
+    assert not (repo_path / ".git/refs/heads/master").exists()
+
+    git_dir = GitDir.find(repo_path)
+    assert git_dir
+    assert git_dir.resolve_ref("HEAD") == run_git(repo_path, "rev-parse", "HEAD")
+    assert git_dir.ref_exists("refs/tags/v0.1")
+    assert get_tracking_ref(repo_path) == "origin/master"
+
+
+def test_detached_head(repo_path: Path) -> None:
+    sha1 = run_git(repo_path, "rev-parse", "HEAD")
+    run_git(repo_path, "checkout", sha1)
+
+    git_dir = GitDir.find(repo_path)
+    assert git_dir
+    assert git_dir.head_branch() is None
+    assert get_sha1(repo_path) == sha1
+
+
+def test_branch_with_same_name_as_tag(repo_path: Path) -> None:
+    run_git(repo_path, "checkout", "-b", "dev")
+    run_git(repo_path, "tag", "dev")
+
+    expected = run_git(repo_path, "rev-parse", "--abbrev-ref", "HEAD")
+    assert expected == "heads/dev"
+    assert get_current_branch(repo_path) == expected
+
+
+def test_worktree(repo_path: Path, tmp_path: Path) -> None:
+    worktree_path = tmp_path / "worktree"
+    run_git(repo_path, "worktree", "add", "-b", "other", str(worktree_path))
+
+    assert is_git_repository(worktree_path)
+    git_dir = GitDir.find(worktree_path)
+    assert git_dir
+    assert git_dir.common_path.resolve() == (repo_path / ".git").resolve()
+    assert get_current_branch(worktree_path) == "other"
+    assert git_dir.resolve_ref("HEAD") == run_git(repo_path, "rev-parse", "HEAD")
+
+
+def test_not_a_repository(tmp_path: Path) -> None:
+    assert GitDir.find(tmp_path) is None
+    assert not is_git_repository(tmp_path / "no-such-dir")
+
+
+def test_shallow(repo_path: Path, tmp_path: Path) -> None:
+    assert not is_shallow(repo_path)
+    (repo_path / "other").write_text("other")
+    run_git(repo_path, "add", ".")
+    run_git(repo_path, "commit", "-m", "other")
+    run_git(repo_path, "push")
+    clone_path = tmp_path / "clone"
+    run_git(
+        tmp_path, "clone", "--depth", "1", f"file://{repo_path}/../srv.git", "clone"
+    )
+    assert is_shallow(clone_path)
+
+
+def test_parse_git_config() -> None:
+    contents = textwrap.dedent(
+        """\
+        [core]
+            bare = false
+            logAllRefUpdates
+        # a comment
+        [remote "origin"]
+            url = "git@example.com:foo.git" ; another comment
+            fetch = +refs/heads/*:refs/remotes/origin/*
+        [branch "Feature"]
+            remote = origin
+            merge = refs/heads/Feature
+        """
+    )
+    config = parse_git_config(contents)
+    assert config
+    assert config["core.bare"] == ["false"]
+    assert config["core.logallrefupdates"] == ["true"]
+    assert config["remote.origin.url"] == ["git@example.com:foo.git"]
+    assert config["branch.Feature.merge"] == ["refs/heads/Feature"]
+
+
+def test_parse_git_config_with_includes() -> None:
+    contents = textwrap.dedent(
+        """\
+        [include]
+            path = other.config
+        """
+    )
+    assert parse_git_config(contents) is None
+
+
+def test_map_refspecs() -> None:
+    refspecs = ["+refs/heads/*:refs/remotes/origin/*"]
+    assert map_refspecs(refspecs, "refs/heads/master") == "refs/remotes/origin/master"
+    assert map_refspecs(refspecs, "refs/tags/v0.1") is None
+
+
+def test_list_refs(repo_path: Path) -> None:
+    run_git(repo_path, "branch", "packed")
+    run_git(repo_path, "pack-refs", "--all")
+    run_git(repo_path, "branch", "loose")
+    sha1 = run_git(repo_path, "rev-parse", "HEAD")
+
+    git_dir = GitDir.find(repo_path)
+    assert git_dir
+    assert git_dir.list_refs("refs/heads/") == {
+        "refs/heads/master": sha1,
+        "refs/heads/packed": sha1,
+        "refs/heads/loose": sha1,
+    }
@@ -73,3 +73,33 @@ def test_unknown_group() -> None:
         group_list.get_elements(groups=["no-such-group"])
     assert e.value.parent_group is None
     assert e.value.group_name == "no-such-group"
+
+
+def test_groups_seen_with_several_groups() -> None:
+    """Check that groups sharing includes give the same result
+    whatever the order they are resolved in, while each group is
+    only processed once
+    """
+    group_list = GroupList(elements=["a", "b", "c", "d"])
+    group_list.add("common", ["a"])
+    group_list.add("one", ["b"], includes=["common"])
+    group_list.add("two", ["c"], includes=["common"])
+    group_list.add("three", ["d"], includes=["two"])
+
+    # Resolve single groups first, so that their includes are known
+    assert group_list.get_elements(groups=["three"]) == ["a", "c", "d"]
+    assert group_list.get_groups_seen() == ["three", "two", "common"]
+
+    actual = group_list.get_elements(groups=["one", "three"])
+    assert actual == ["a", "b", "c", "d"]
+    assert group_list.get_groups_seen() == ["one", "common", "three", "two"]
+
+
+def test_changing_groups() -> None:
+    group_list = GroupList(elements=["a", "b"])
+    group_list.add("default", ["a"])
+    group_list.add("other", ["b"], includes=["default"])
+    assert group_list.get_elements(groups=["other"]) == ["a", "b"]
+
+    group_list.add("default", ["b"])
+    assert group_list.get_elements(groups=["other"]) == ["b"]
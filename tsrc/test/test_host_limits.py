@@ -0,0 +1,88 @@
+from typing import Any, Optional
+
+import pytest
+
+from tsrc.host_limits import (
+    HostLimits,
+    InvalidHostLimit,
+    get_url_host,
+    report_transient_error,
+)
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("https://GitLab.example.com/group/foo.git", "gitlab.example.com"),
+        ("ssh://git@example.com:2222/foo.git", "example.com"),
+        ("git@github.com:org/foo.git", "github.com"),
+        ("github.com:org/foo.git", "github.com"),
+        ("file:///srv/git/foo.git", None),
+        ("/srv/git/foo.git", None),
+        ("C:\\git\\foo.git", None),
+    ],
+)
+def test_get_url_host(url: str, expected: Optional[str]) -> None:
+    assert get_url_host(url) == expected
+
+
+def test_configured_limit() -> None:
+    host_limits = HostLimits({"Slow.example.com": 2}, adaptive=False)
+    for _ in range(2):
+        assert host_limits.try_acquire("slow.example.com", num_jobs=8)
+    assert not host_limits.try_acquire("slow.example.com", num_jobs=8)
+    host_limits.release("slow.example.com", 1.0, success=False)
+    assert host_limits.try_acquire("slow.example.com", num_jobs=8)
+
+    # Note: other hosts can use all the jobs
+    for _ in range(8):
+        assert host_limits.try_acquire("fast.example.com", num_jobs=8)
+    assert not host_limits.try_acquire("fast.example.com", num_jobs=8)
+
+
+@pytest.mark.parametrize("value", [0, -1, "four", True])
+def test_invalid_limit(value: Any) -> None:
+    with pytest.raises(InvalidHostLimit):
+        HostLimits({"example.com": value}, adaptive=False)
+
+
+def test_adaptive_limit() -> None:
+    """Scenario:
+    * Use 4 jobs for a host, with adaptive limits
+    * Check that the limit is left alone when an item fails,
+      and halved when a transient error is reported
+    * Check that it goes back up after rounds of successful items,
+      but not above the initial limit
+    """
+    host_limits = HostLimits({}, adaptive=True)
+    assert host_limits.try_acquire("example.com", num_jobs=4)
+    limit = host_limits.limits["example.com"]
+    host_limits.release("example.com", 1.0, success=False)
+    assert limit.limit == 4
+
+    assert host_limits.try_acquire("example.com", num_jobs=4)
+    with host_limits.use("example.com"):
+        report_transient_error()
+        report_transient_error()
+    assert limit.limit == 1
+    host_limits.release("example.com", 1.0, success=True)
+    assert limit.limit == 2
+
+    for _ in range(10):
+        assert host_limits.try_acquire("example.com", num_jobs=4)
+        host_limits.release("example.com", 1.0, success=True)
+    assert limit.limit == 4
+
+
+def test_adaptive_limit_when_slow() -> None:
+    host_limits = HostLimits({"example.com": 2}, adaptive=True)
+    limit = host_limits.get_limit("example.com", num_jobs=8)
+    for seconds in [1.0, 1.0, 10.0, 10.0]:
+        assert host_limits.try_acquire("example.com", num_jobs=8)
+        host_limits.release("example.com", seconds, success=True)
+    assert limit.limit == 1
+
+
+def test_report_transient_error_outside_items() -> None:
+    # Note: nothing to report to, this must not fail
+    report_transient_error()
@@ -1,11 +1,12 @@
 import textwrap
 from io import StringIO
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, List, Optional
 
 import pytest
 import ruamel.yaml
 
+import tsrc.manifest
 from tsrc.errors import Error, InvalidConfigError, LoadManifestSwitchConfigGroupsError
 from tsrc.file_system import Copy, Link
 from tsrc.manifest import Manifest, RepoNotFound, load_manifest
@@ -351,3 +352,68 @@ groups:
     repos_getter.contents = contents
     assert repos_getter.get_repos(all_=False) == ["one"]
     assert repos_getter.get_repos(all_=True) == ["one", "two"]
+
+
+def test_parsed_manifests_are_cached(tmp_path: Path, monkeypatch: Any) -> None:
+    """Scenario:
+    * Load the same manifest twice
+    * Check that it was parsed only once, and that each
+      call to get_repos() returns a new list
+    * Change the manifest and load it again
+    * Check that the new contents are used
+    """
+    calls: List[Path] = []
+    original_parse = tsrc.manifest.parse_config_contents
+
+    def counting_parse(file_path: Path, contents: str, **kwargs: Any) -> Any:
+        calls.append(file_path)
+        return original_parse(file_path, contents, **kwargs)
+
+    monkeypatch.setattr(tsrc.manifest, "parse_config_contents", counting_parse)
+    manifest_path = tmp_path / "manifest.yml"
+    manifest_path.write_text(
+        "repos:\n  - dest: foo\n    url: git@example.com:foo.git\n"
+    )
+
+    first = load_manifest(manifest_path)
+    second = load_manifest(manifest_path)
+    assert len(calls) == 1
+    assert first is second
+    assert first.get_repos() is not second.get_repos()
+
+    manifest_path.write_text(
+        "repos:\n  - dest: bar\n    url: git@example.com:bar.git\n"
+    )
+    third = load_manifest(manifest_path)
+    assert len(calls) == 2
+    assert [x.dest for x in third.get_repos()] == ["bar"]
+
+
+def test_get_repo_after_changes() -> None:
+    """Scenario:
+    * Remove a repo from the list returned by get_repos()
+    * Check that the manifest still has it
+    * Check that get_repo() keeps the first repo with a given dest,
+      and fails for unknown ones
+    """
+    manifest = parse_manifest(
+        """
+repos:
+  - dest: foo
+    url: git@example.com:foo.git
+  - dest: bar
+    url: git@example.com:bar.git
+  - dest: foo
+    url: git@example.com:other.git
+"""
+    )
+    assert manifest.get_repo("foo").dest == "foo"
+
+    repos = manifest.get_repos(all_=True)
+    repos.remove(manifest.get_repo("foo"))
+    assert manifest.get_repo("foo").dest == "foo"
+    assert len(manifest.get_repos(all_=True)) == 3
+
+    assert manifest.get_repo("foo").clone_url == "git@example.com:foo.git"
+    with pytest.raises(RepoNotFound):
+        manifest.get_repo("baz")
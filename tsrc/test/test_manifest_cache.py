@@ -0,0 +1,104 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+import tsrc.manifest
+from tsrc.git import run_git_captured
+from tsrc.manifest import load_manifest
+from tsrc.manifest_cache import (
+    get_blob_sha,
+    read_compiled_manifest,
+    write_compiled_manifest,
+)
+
+MANIFEST = """
+repos:
+  - dest: foo
+    url: git@example.com:foo.git
+groups:
+  default:
+    repos: [foo]
+"""
+
+
+@pytest.fixture(autouse=True)
+def parsed_manifests(monkeypatch: Any) -> None:
+    monkeypatch.setattr(tsrc.manifest, "_PARSED_MANIFESTS", {})
+
+
+def forget_parsed_manifests() -> None:
+    """Forget about the manifests parsed by this process,
+    as if the next load came from a new tsrc process
+    """
+    tsrc.manifest._PARSED_MANIFESTS.clear()
+
+
+def test_blob_sha_matches_git(tmp_path: Path) -> None:
+    run_git_captured(tmp_path, "init", "--quiet")
+    file_path = tmp_path / "manifest.yml"
+    file_path.write_text(MANIFEST)
+    _, expected = run_git_captured(tmp_path, "hash-object", "manifest.yml")
+    assert get_blob_sha(file_path.read_bytes()) == expected
+
+
+def test_uses_compiled_manifest(tmp_path: Path, monkeypatch: Any) -> None:
+    """Scenario:
+    * Load a manifest with a cache path
+    * Make YAML parsing fail
+    * Check that the manifest can still be loaded, from the cache
+    """
+    manifest_path = tmp_path / "manifest.yml"
+    manifest_path.write_text(MANIFEST)
+    cache_path = tmp_path / "manifest.cache"
+    expected = load_manifest(manifest_path, cache_path=cache_path)
+    assert cache_path.exists()
+
+    def parse_config_contents(*args: Any, **kwargs: Any) -> Any:
+        raise AssertionError("manifest should not be parsed")
+
+    monkeypatch.setattr(tsrc.manifest, "parse_config_contents", parse_config_contents)
+    forget_parsed_manifests()
+    actual = load_manifest(manifest_path, cache_path=cache_path)
+    assert actual.get_repos() == expected.get_repos()
+    assert actual.group_list is not None
+    assert actual.group_list.get_group("default") is not None
+
+
+def test_manifest_changed(tmp_path: Path) -> None:
+    """Scenario:
+    * Load a manifest with a cache path
+    * Change the manifest
+    * Check that the new contents are used
+    """
+    manifest_path = tmp_path / "manifest.yml"
+    manifest_path.write_text(MANIFEST)
+    cache_path = tmp_path / "manifest.cache"
+    load_manifest(manifest_path, cache_path=cache_path)
+
+    manifest_path.write_text(MANIFEST.replace("foo", "bar"))
+    forget_parsed_manifests()
+    manifest = load_manifest(manifest_path, cache_path=cache_path)
+    assert [x.dest for x in manifest.get_repos()] == ["bar"]
+
+
+def test_stale_or_broken_cache(tmp_path: Path) -> None:
+    cache_path = tmp_path / "manifest.cache"
+    config: Any = {"repos": []}
+    write_compiled_manifest(cache_path, config, blob_sha="abc", validation="strict")
+    actual = read_compiled_manifest(cache_path, blob_sha="abc", validation="strict")
+    assert actual == config
+
+    # Manifest changed
+    actual = read_compiled_manifest(cache_path, blob_sha="def", validation="strict")
+    assert actual is None
+
+    # Other kind of validation
+    actual = read_compiled_manifest(
+        cache_path, blob_sha="abc", validation="no-remote-required"
+    )
+    assert actual is None
+
+    cache_path.write_text("{ not json")
+    actual = read_compiled_manifest(cache_path, blob_sha="abc", validation="strict")
+    assert actual is None
@@ -0,0 +1,82 @@
+from io import StringIO
+
+import ruamel.yaml
+
+from tsrc.manifest import Manifest
+from tsrc.manifest_diff import diff_manifests
+
+
+def parse_manifest(contents: str) -> Manifest:
+    manifest = Manifest()
+    yaml = ruamel.yaml.YAML(typ="safe", pure=True)
+    parsed = yaml.load(StringIO(contents))
+    manifest.apply_config(parsed)
+    return manifest
+
+
+OLD_MANIFEST = """
+repos:
+  - dest: foo
+    url: git@example.com:foo.git
+  - dest: bar
+    url: git@example.com:bar.git
+    copy:
+      - file: top.cmake
+        dest: CMakeLists.txt
+  - dest: spam
+    url: git@example.com:spam.git
+    branch: devel
+  - dest: old
+    url: git@example.com:old.git
+"""
+
+
+NEW_MANIFEST = """
+repos:
+  - dest: foo
+    url: git@example.com:foo.git
+  - dest: bar
+    url: git@example.com:bar.git
+    copy:
+      - file: top.cmake
+        dest: top/CMakeLists.txt
+  - dest: spam
+    remotes:
+      - name: origin
+        url: git@example.com:spam.git
+      - name: upstream
+        url: git@example.com:upstream/spam.git
+    tag: v1.0
+  - dest: new
+    url: git@example.com:new.git
+"""
+
+
+def test_diff_manifests() -> None:
+    old = parse_manifest(OLD_MANIFEST)
+    new = parse_manifest(NEW_MANIFEST)
+
+    diff = diff_manifests(old, new)
+    assert diff.added == ["new"]
+    assert diff.removed == ["old"]
+    assert diff.changed == {"bar": ["copy"], "spam": ["branch", "remotes", "tag"]}
+    assert diff.describe() == [
+        "new (added)",
+        "old (removed)",
+        "bar (copy changed)",
+        "spam (branch, remotes, tag changed)",
+    ]
+
+
+def test_no_changes() -> None:
+    old = parse_manifest(OLD_MANIFEST)
+    new = parse_manifest(OLD_MANIFEST)
+    assert diff_manifests(old, new).is_empty()
+
+
+def test_no_old_manifest() -> None:
+    new = parse_manifest(NEW_MANIFEST)
+    diff = diff_manifests(None, new)
+    assert diff.added == ["foo", "bar", "spam", "new"]
+    assert not diff.removed
+    assert not diff.changed
@@ -0,0 +1,58 @@
+import sys
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+from tsrc.git import run_git
+from tsrc.repo_watcher import RepoWatcher
+from tsrc.test.helpers.git_server import GitServer
+
+pytestmark = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify is only available on Linux"
+)
+
+
+@pytest.fixture
+def watcher(tmp_path: Path, git_server: GitServer) -> Iterator[RepoWatcher]:
+    git_server.add_repo("foo")
+    git_server.add_repo("bar")
+    run_git(tmp_path, "clone", git_server.get_url("foo"), "foo")
+    run_git(tmp_path, "clone", git_server.get_url("bar"), "bar")
+    foo_path = tmp_path / "foo"
+    (foo_path / "src").mkdir()
+    (foo_path / "src/foo.c").write_text("")
+    run_git(foo_path, "add", "src/foo.c")
+    run_git(foo_path, "commit", "--message", "add foo.c")
+    with RepoWatcher() as res:
+        res.add_repo("foo", foo_path)
+        res.add_repo("bar", tmp_path / "bar")
+        yield res
+
+
+def test_nothing_changed(watcher: RepoWatcher) -> None:
+    assert watcher.wait_for_changes(timeout=0.1) == set()
+
+
+def test_tracked_file_changed(tmp_path: Path, watcher: RepoWatcher) -> None:
+    (tmp_path / "foo/src/foo.c").write_text("modified")
+    assert watcher.wait_for_changes(timeout=5) == {"foo"}
+
+
+def test_new_untracked_directory(tmp_path: Path, watcher: RepoWatcher) -> None:
+    """Check that files added to directories created after
+    the watch started are noticed
+    """
+    (tmp_path / "bar/new").mkdir()
+    assert watcher.wait_for_changes(timeout=5) == {"bar"}
+
+    (tmp_path / "bar/new/untracked.txt").write_text("")
+    assert watcher.wait_for_changes(timeout=5) == {"bar"}
+
+
+def test_git_commands(tmp_path: Path, watcher: RepoWatcher) -> None:
+    run_git(tmp_path / "bar", "checkout", "-b", "feature/one")
+    assert watcher.wait_for_changes(timeout=5) == {"bar"}
+
+    run_git(tmp_path / "bar", "commit", "--allow-empty", "--message", "empty")
+    assert watcher.wait_for_changes(timeout=5) == {"bar"}
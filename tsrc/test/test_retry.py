@@ -0,0 +1,123 @@
+import signal
+import sys
+from pathlib import Path
+from typing import Any, List
+
+import pytest
+
+from tsrc.git import GitCommandError, run_git
+from tsrc.host_limits import HostLimits
+from tsrc.retry import (
+    InvalidRetrySetting,
+    RetryPolicy,
+    is_transient,
+    retry,
+)
+
+
+def make_error(error: str, returncode: int = 128) -> GitCommandError:
+    return GitCommandError(
+        Path("foo"), ["fetch"], output=None, error=error, returncode=returncode
+    )
+
+
+TRANSIENT = make_error("fatal: the remote end hung up unexpectedly")
+PERMANENT = make_error("fatal: repository 'https://example.com/foo' not found")
+
+
+def test_is_transient() -> None:
+    assert is_transient(TRANSIENT)
+    assert is_transient(make_error("error: RPC failed; curl 56 Recv failure"))
+    assert not is_transient(PERMANENT)
+    assert not is_transient(make_error("fatal: couldn't find remote ref nope"))
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="no SIGPIPE on Windows")
+def test_is_transient_when_killed() -> None:
+    assert is_transient(make_error("", returncode=-signal.SIGPIPE))
+    # Note: the user hit Ctrl-C, or tsrc is being stopped
+    for signum in [signal.SIGINT, signal.SIGTERM]:
+        assert not is_transient(make_error(TRANSIENT.error or "", returncode=-signum))
+
+
+def test_policy_from_env(monkeypatch: Any) -> None:
+    monkeypatch.setenv("TSRC_RETRY_ATTEMPTS", "5")
+    monkeypatch.setenv("TSRC_RETRY_DELAY", "0.5")
+    assert RetryPolicy.from_env() == RetryPolicy(attempts=5, delay=0.5)
+
+    monkeypatch.setenv("TSRC_RETRY_ATTEMPTS", "0")
+    with pytest.raises(InvalidRetrySetting):
+        RetryPolicy.from_env()
+
+
+def test_delays_grow() -> None:
+    policy = RetryPolicy(attempts=10, delay=1.0)
+    assert 0.5 <= policy.get_delay(1) <= 1.0
+    assert 2.0 <= policy.get_delay(3) <= 4.0
+    assert policy.get_delay(20) <= 30.0
+
+
+def test_retry() -> None:
+    errors = [TRANSIENT, TRANSIENT]
+    cleanups: List[int] = []
+
+    def func() -> str:
+        if errors:
+            raise errors.pop()
+        return "ok"
+
+    policy = RetryPolicy(attempts=3, delay=0)
+    res = retry(func, cleanup=lambda: cleanups.append(1), policy=policy)
+    assert res == "ok"
+    assert len(cleanups) == 2
+
+
+def test_retry_gives_up() -> None:
+    calls: List[int] = []
+
+    def fail_with(error: GitCommandError) -> None:
+        calls.append(1)
+        raise error
+
+    with pytest.raises(GitCommandError):
+        retry(lambda: fail_with(PERMANENT), policy=RetryPolicy(attempts=3, delay=0))
+    assert len(calls) == 1
+
+    calls.clear()
+    with pytest.raises(GitCommandError):
+        retry(lambda: fail_with(TRANSIENT), policy=RetryPolicy(attempts=3, delay=0))
+    assert len(calls) == 3
+
+
+def test_retry_lowers_host_limit() -> None:
+    """Scenario:
+    * Run a command that talks to a host with an adaptive limit of 8
+    * Make it fail with a permanent error
+    * Check that the limit is left alone
+    * Make it fail with a transient error, without retrying
+    * Check that the limit is halved
+    """
+
+    def fail_with(error: GitCommandError) -> None:
+        raise error
+
+    host_limits = HostLimits({}, adaptive=True)
+    assert host_limits.try_acquire("example.com", num_jobs=8)
+    limit = host_limits.limits["example.com"]
+    policy = RetryPolicy(attempts=1, delay=0)
+    with host_limits.use("example.com"):
+        with pytest.raises(GitCommandError):
+            retry(lambda: fail_with(PERMANENT), policy=policy)
+        assert limit.limit == 8
+        with pytest.raises(GitCommandError):
+            retry(lambda: fail_with(TRANSIENT), policy=policy)
+        assert limit.limit == 4
+
+
+def test_run_git_keeps_error(tmp_path: Path) -> None:
+    run_git(tmp_path, "init", "--quiet")
+    with pytest.raises(GitCommandError) as e:
+        run_git(tmp_path, "fetch", "no-such-remote", keep_error=True)
+    assert e.value.error
+    assert "no-such-remote" in e.value.error
+    assert not is_transient(e.value)
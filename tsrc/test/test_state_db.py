@@ -0,0 +1,93 @@
+import sqlite3
+from pathlib import Path
+
+from tsrc.state_db import SCHEMA_VERSION, JournalStep, StateDB
+
+
+def test_nothing_recorded(tmp_path: Path) -> None:
+    state_db = StateDB(tmp_path / "state.sqlite")
+    assert state_db.get_timings("fetch") == {}
+    assert state_db.get_synced_entries() == {}
+    assert not state_db.path.exists(), "reading should not create the database"
+
+
+def test_record_timings_and_synced(tmp_path: Path) -> None:
+    state_db = StateDB(tmp_path / "state.sqlite")
+    state_db.record_timings("fetch", {"foo": 1.5, "bar": 0.5})
+    state_db.record_timings("fetch", {"foo": 2.0})
+    assert state_db.get_timings("fetch") == {"foo": 2.0, "bar": 0.5}
+    assert state_db.get_timings("clone") == {}
+
+    state_db.record_synced({"foo": ({"branch": "master"}, "abc")})
+    state_db.record_synced({"bar": ({"branch": "devel"}, "def")}, forgotten=["foo"])
+    assert state_db.get_synced_entries() == {"bar": {"branch": "devel"}}
+    assert state_db.get_synced_head("bar") == "def"
+    assert state_db.get_synced_head("foo") is None
+
+
+def test_batch(tmp_path: Path) -> None:
+    state_db = StateDB(tmp_path / "state.sqlite")
+    with state_db.batch():
+        state_db.record_timings("fetch", {"foo": 1.0})
+        with state_db.batch():
+            state_db.record_timings("fetch", {"bar": 2.0})
+        # Note: nothing is written until the outer block is done
+        assert state_db.get_timings("fetch") == {}
+    assert state_db.get_timings("fetch") == {"foo": 1.0, "bar": 2.0}
+
+
+def test_journal(tmp_path: Path) -> None:
+    state_db = StateDB(tmp_path / "state.sqlite")
+    assert state_db.get_journal_start("sync") is None
+
+    state_db.start_journal("sync")
+    state_db.record_steps(
+        "sync",
+        {
+            ("foo", "sync"): JournalStep(done=True, entry={"sha1": None}, head="abc"),
+            ("bar", "sync"): JournalStep(done=False),
+            ("baz", "clone"): JournalStep(done=False),
+        },
+    )
+    assert state_db.get_journal_start("sync")
+    assert state_db.get_journal_start("init") is None
+    steps = state_db.get_journal_steps("sync")
+    assert steps[("foo", "sync")] == JournalStep(
+        done=True, entry={"sha1": None}, head="abc"
+    )
+    assert steps[("bar", "sync")] == JournalStep(done=False)
+
+    # Note: unfinished clones are kept until they are forgotten
+    state_db.start_journal("sync")
+    assert state_db.get_journal_steps("sync") == {
+        ("baz", "clone"): JournalStep(done=False)
+    }
+    assert state_db.get_unfinished_clones() == ["baz"]
+    state_db.forget_unfinished_clones(["baz"])
+    assert state_db.get_journal_steps("sync") == {}
+    state_db.clear_journal("sync")
+    assert state_db.get_journal_start("sync") is None
+
+
+def test_schema_change(tmp_path: Path) -> None:
+    """Check that recorded data is discarded when the
+    database was created with another schema version
+    """
+    db_path = tmp_path / "state.sqlite"
+    state_db = StateDB(db_path)
+    state_db.record_timings("fetch", {"foo": 1.5})
+    state_db.close()
+
+    connection = sqlite3.connect(str(db_path))
+    connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+    connection.close()
+
+    assert StateDB(db_path).get_timings("fetch") == {}
+
+
+def test_broken_database(tmp_path: Path) -> None:
+    db_path = tmp_path / "state.sqlite"
+    db_path.write_text("this is not a database")
+    state_db = StateDB(db_path)
+    state_db.record_timings("fetch", {"foo": 1.5})
+    assert state_db.get_timings("fetch") == {}
@@ -0,0 +1,186 @@
+import os
+import time
+from pathlib import Path
+from typing import Any, List, Optional
+
+import pytest
+
+import tsrc.status_cache
+from tsrc.git import GitStatus, run_git
+from tsrc.gitfs import GitDir
+from tsrc.state_db import StateDB
+from tsrc.status_cache import get_repo_stamp, get_stamped_paths, get_status
+from tsrc.test.helpers.git_server import GitServer
+
+
+@pytest.fixture
+def repo_path(tmp_path: Path, git_server: GitServer, monkeypatch: Any) -> Path:
+    # Note: files are always modified less than 2 seconds ago in tests
+    monkeypatch.setattr(tsrc.status_cache, "RACY_DELAY", 0)
+    git_server.add_repo("foo")
+    run_git(tmp_path, "clone", git_server.get_url("foo"), "foo")
+    res = tmp_path / "foo"
+    (res / "src").mkdir()
+    (res / "src/foo.c").write_text("")
+    run_git(res, "add", "src/foo.c")
+    run_git(res, "commit", "--message", "add foo.c")
+    return res
+
+
+def test_read_index_entries(repo_path: Path) -> None:
+    git_dir = GitDir.find(repo_path)
+    assert git_dir
+    for version in ("2", "3", "4"):
+        run_git(repo_path, "update-index", "--index-version", version)
+        entries = git_dir.read_index_entries()
+        assert entries
+        assert [path for (path, _) in entries] == ["README", "src/foo.c"]
+
+
+def get_stamp(repo_path: Path, paths: Optional[List[str]] = None) -> Optional[str]:
+    """Compute the stamp from `paths` (as when checking the cache),
+    or from the current paths of the repo (as when recording it)
+    """
+    if paths is None:
+        paths = get_stamped_paths(repo_path)
+    if paths is None:
+        return None
+    return get_repo_stamp(repo_path, paths)
+
+
+def get_next_stamp(repo_path: Path, paths: Optional[List[str]] = None) -> Optional[str]:
+    # Note: RACY_DELAY is 0 here, so make sure the next change
+    # does not happen within the same timestamp granularity
+    res = get_stamp(repo_path, paths)
+    time.sleep(0.05)
+    return res
+
+
+def test_stamp_changes(repo_path: Path) -> None:
+    stamps = [get_next_stamp(repo_path)]
+
+    (repo_path / "src/foo.c").write_text("modified contents")
+    stamps.append(get_next_stamp(repo_path))
+
+    (repo_path / "src/untracked.c").write_text("")
+    stamps.append(get_next_stamp(repo_path))
+
+    run_git(repo_path, "add", "src/untracked.c")
+    stamps.append(get_next_stamp(repo_path))
+
+    run_git(repo_path, "tag", "v1")
+    stamps.append(get_next_stamp(repo_path))
+
+    assert None not in stamps
+    assert len(set(stamps)) == len(stamps)
+    assert get_stamp(repo_path) == stamps[-1]
+
+
+def test_stamp_changes_in_untracked_dirs(repo_path: Path) -> None:
+    """Scenario:
+    * Create an empty untracked directory, in a directory that only
+      contains other directories, and an ignored directory
+    * Record the stamped paths
+    * Check that the stamp computed from them changes when files are
+      added to the empty directory, or to the parent directory, but not
+      when they are added to the ignored directory
+    """
+    (repo_path / "src/lib/sub").mkdir(parents=True)
+    (repo_path / "src/lib/sub/bar.c").write_text("")
+    run_git(repo_path, "add", "src/lib/sub/bar.c")
+    (repo_path / ".gitignore").write_text("build/\n")
+    run_git(repo_path, "add", ".gitignore")
+    run_git(repo_path, "commit", "--message", "add bar.c")
+    (repo_path / "empty/nested").mkdir(parents=True)
+    (repo_path / "build").mkdir()
+    paths = get_stamped_paths(repo_path)
+    assert paths
+    assert "empty/nested" in paths
+    assert "build" not in paths
+
+    before = get_next_stamp(repo_path, paths)
+    (repo_path / "build/out.o").write_text("")
+    assert get_next_stamp(repo_path, paths) == before
+
+    (repo_path / "empty/nested/new.c").write_text("")
+    after_untracked = get_next_stamp(repo_path, paths)
+    assert after_untracked != before
+
+    (repo_path / "src/lib/new.c").write_text("")
+    assert get_next_stamp(repo_path, paths) != after_untracked
+
+
+def test_stamp_changes_when_mtime_is_restored(repo_path: Path) -> None:
+    foo_path = repo_path / "src/foo.c"
+    an_hour_ago = time.time() - 3600
+    os.utime(foo_path, (an_hour_ago, an_hour_ago))
+    before = get_next_stamp(repo_path)
+
+    # Note: the change time cannot be set back
+    foo_path.write_text("modified")
+    os.utime(foo_path, (an_hour_ago, an_hour_ago))
+    assert get_stamp(repo_path) != before
+
+
+def test_no_stamp_with_fsmonitor(repo_path: Path) -> None:
+    run_git(repo_path, "config", "core.fsmonitor", "false")
+    assert get_stamp(repo_path)
+    run_git(repo_path, "config", "core.fsmonitor", "true")
+    assert get_stamped_paths(repo_path) is None
+
+
+def test_no_stamp_for_recent_changes(repo_path: Path, monkeypatch: Any) -> None:
+    monkeypatch.setattr(tsrc.status_cache, "RACY_DELAY", 2.0)
+    assert get_stamp(repo_path) is None
+
+
+def test_get_status_uses_cache(
+    tmp_path: Path, repo_path: Path, monkeypatch: Any
+) -> None:
+    """Check that git is only run again when the repo changed, that
+    the work tree is not listed again otherwise, and that cached results
+    are the same as fresh ones
+    """
+    git_calls: List[Path] = []
+    original_get_git_status = tsrc.status_cache.get_git_status
+    original_get_stamped_paths = tsrc.status_cache.get_stamped_paths
+
+    def get_git_status(working_path: Path) -> GitStatus:
+        git_calls.append(working_path)
+        return original_get_git_status(working_path)
+
+    def get_stamped_paths(working_path: Path) -> Optional[List[str]]:
+        git_calls.append(working_path)
+        return original_get_stamped_paths(working_path)
+
+    monkeypatch.setattr(tsrc.status_cache, "get_git_status", get_git_status)
+    monkeypatch.setattr(tsrc.status_cache, "get_stamped_paths", get_stamped_paths)
+    state_db = StateDB(tmp_path / "state.sqlite")
+
+    def get_statuses() -> Any:
+        git_status, git_remote = get_status(
+            repo_path, dest="foo", state_db=state_db, with_remote=True
+        )
+        assert git_remote
+        return vars(git_status), git_remote.remotes, git_remote.upstreamed
+
+    # Note: otherwise git considers files as racily clean, and
+    # refreshes the index every time
+    an_hour_ago = time.time() - 3600
+    for path in [
+        repo_path,
+        repo_path / "README",
+        repo_path / "src",
+        repo_path / "src/foo.c",
+    ]:
+        os.utime(path, (an_hour_ago, an_hour_ago))
+    fresh = get_statuses()
+    # Note: the first `git status` refreshes the index
+    get_statuses()
+    git_calls.clear()
+    assert get_statuses() == fresh
+    assert not git_calls
+
+    (repo_path / "new.txt").write_text("")
+    assert get_statuses()[0]["untracked"] == 1
+    assert git_calls
@@ -0,0 +1,40 @@
+import json
+from pathlib import Path
+from typing import Any
+
+from tsrc.tracing import get_trace_path, set_track, span, start_tracing, stop_tracing
+
+
+def test_spans(tmp_path: Path) -> None:
+    trace_path = tmp_path / "trace.json"
+    start_tracing()
+    with span("outer", category="test", value=1) as args:
+        args["returncode"] = 0
+        with span("inner", category="test"):
+            pass
+    with set_track("slot 1"):
+        with span("on a track", category="test"):
+            pass
+    stop_tracing(trace_path)
+
+    with span("not traced", category="test"):
+        pass
+
+    events = json.loads(trace_path.read_text())["traceEvents"]
+    thread_names = {x["tid"]: x["args"]["name"] for x in events if x["ph"] == "M"}
+    spans = {x["name"]: x for x in events if x["ph"] == "X"}
+    assert sorted(spans) == ["inner", "on a track", "outer"]
+    assert spans["outer"]["args"] == {"value": 1, "returncode": 0}
+    assert thread_names[spans["outer"]["tid"]] == "MainThread"
+    assert thread_names[spans["on a track"]["tid"]] == "slot 1"
+    outer, inner = spans["outer"], spans["inner"]
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+
+
+def test_get_trace_path(monkeypatch: Any) -> None:
+    monkeypatch.delenv("TSRC_TRACE", raising=False)
+    assert get_trace_path(None) is None
+    monkeypatch.setenv("TSRC_TRACE", "from-env.json")
+    assert get_trace_path(None) == Path("from-env.json")
+    assert get_trace_path(Path("option.json")) == Path("option.json")
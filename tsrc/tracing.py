@@ -0,0 +1,149 @@
+"""
+Tracing
+
+Record what tsrc spends its time on, as a file in the Chrome Trace
+Event format, which can be opened with https://ui.perfetto.dev or
+chrome://tracing.
+
+Tracing is enabled with the `--trace PATH` global option, or by
+setting the `TSRC_TRACE` environment variable to a path.
+
+The executor records a span for each item processed by a task (see
+tsrc.executor), and tsrc.git records a span for each git command,
+with its arguments and exit code. Spans are displayed on the track
+of the thread they ran in, so idle workers and long poles are easy
+to spot.
+
+When the asyncio executor is used, items are processed concurrently
+from the same thread, so each of its `num_jobs` slots gets a track
+of its own instead (see set_track()).
+"""
+
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+Event = Dict[str, Any]
+
+# Name of the track the current span goes to, when not the one
+# of the current thread
+_TRACK: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "tsrc_trace_track", default=None
+)
+
+
+class Tracer:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.events: List[Event] = []
+        self.pid = os.getpid()
+        self.start = time.perf_counter()
+        # track name -> tid
+        self.tids: Dict[str, int] = {}
+
+    def now(self) -> float:
+        """Return the time elapsed since the tracer was created,
+        in microseconds
+        """
+        return (time.perf_counter() - self.start) * 1_000_000
+
+    def get_tid(self) -> int:
+        track = _TRACK.get() or threading.current_thread().name
+        with self.lock:
+            tid = self.tids.get(track)
+            if tid is None:
+                tid = len(self.tids) + 1
+                self.tids[track] = tid
+                self.events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": self.pid,
+                        "tid": tid,
+                        "args": {"name": track},
+                    }
+                )
+        return tid
+
+    def add_span(
+        self, name: str, category: str, start: float, args: Dict[str, Any]
+    ) -> None:
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round(start, 1),
+            "dur": round(self.now() - start, 1),
+            "pid": self.pid,
+            "tid": self.get_tid(),
+            "args": args,
+        }
+        with self.lock:
+            self.events.append(event)
+
+    def save(self, path: Path) -> None:
+        with self.lock:
+            events = list(self.events)
+        contents = {"traceEvents": events, "displayTimeUnit": "ms"}
+        path.write_text(json.dumps(contents))
+
+
+_TRACER: Optional[Tracer] = None
+
+
+def start_tracing() -> None:
+    global _TRACER
+    _TRACER = Tracer()
+
+
+def stop_tracing(path: Path) -> None:
+    """Write the trace file, and stop recording spans"""
+    global _TRACER
+    tracer = _TRACER
+    _TRACER = None
+    if tracer:
+        tracer.save(path)
+
+
+def get_trace_path(option: Optional[Path]) -> Optional[Path]:
+    """Return where to write the trace, if tracing is enabled"""
+    if option:
+        return option
+    from_env = os.environ.get("TSRC_TRACE")
+    return Path(from_env) if from_env else None
+
+
+@contextlib.contextmanager
+def span(name: str, *, category: str, **args: Any) -> Iterator[Dict[str, Any]]:
+    """Record the time spent in the `with` block.
+
+    Yield the arguments of the span, so that values known at the end
+    (like an exit code) can be added to it. This is a no-op when
+    tracing is disabled.
+    """
+    tracer = _TRACER
+    if not tracer:
+        yield args
+        return
+    start = tracer.now()
+    try:
+        yield args
+    finally:
+        tracer.add_span(name, category, start, args)
+
+
+@contextlib.contextmanager
+def set_track(name: str) -> Iterator[None]:
+    """Record spans started in the `with` block on the track
+    with the given name, instead of the one of the current thread
+    """
+    token = _TRACK.set(name)
+    try:
+        yield
+    finally:
+        _TRACK.reset(token)
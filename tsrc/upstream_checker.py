@@ -0,0 +1,71 @@
+from pathlib import Path
+from threading import Lock
+from typing import List, Optional
+
+import cli_ui as ui
+
+from tsrc.executor import Outcome, Task
+from tsrc.git import run_git_captured
+from tsrc.git_remote import parse_ls_remote, remote_refs_are_fetched
+from tsrc.repo import Repo
+from tsrc.state_db import StateDB, read_head_state
+from tsrc.syncer import Syncer
+
+
+class UpstreamChecker(Task[Repo]):
+    """
+    For each repository, check whether a sync would change anything
+    since the last successful one:
+
+      * HEAD must still be at the sha1 recorded after that sync,
+      * and `git ls-remote` must list the same refs as the ones
+        already fetched, for every remote the syncer would fetch.
+
+    Repos for which this is the case are listed in `up_to_date`.
+    """
+
+    def __init__(self, workspace_path: Path, *, syncer: Syncer, state_db: StateDB):
+        self.workspace_path = workspace_path
+        self.syncer = syncer
+        self.state_db = state_db
+        self.up_to_date: List[str] = []
+        self.lock = Lock()
+
+    def describe_item(self, item: Repo) -> str:
+        return item.dest
+
+    def get_host(self, item: Repo) -> Optional[str]:
+        return self.syncer.get_host(item)
+
+    def describe_process_start(self, item: Repo) -> List[ui.Token]:
+        return ["Checking", item.dest]
+
+    def describe_process_end(self, item: Repo) -> List[ui.Token]:
+        return [ui.green, "ok", ui.reset, item.dest]
+
+    def process(self, index: int, count: int, repo: Repo) -> Outcome:
+        self.info_count(index, count, "Checking", repo.dest)
+        if self.is_up_to_date(repo):
+            with self.lock:
+                self.up_to_date.append(repo.dest)
+        return Outcome.empty()
+
+    def is_up_to_date(self, repo: Repo) -> bool:
+        repo_path = self.workspace_path / repo.dest
+        synced_head = self.state_db.get_synced_head(repo.dest)
+        head, _, _ = read_head_state(repo_path)
+        if not synced_head or head != synced_head:
+            return False
+        for remote in self.syncer.pick_remotes(repo):
+            cmd = self.syncer.get_ls_remote_cmd(repo, remote)
+            rc, out = run_git_captured(repo_path, *cmd, check=False)
+            remote_refs = parse_ls_remote(out)
+            if rc != 0 or not remote_refs:
+                return False
+            # Note: when fetching only some refs, nothing is pruned
+            prune = not self.syncer.narrow_fetch
+            if not remote_refs_are_fetched(
+                repo_path, remote.name, remote_refs, prune=prune
+            ):
+                return False
+        return True
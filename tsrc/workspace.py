@@ -2,23 +2,42 @@
 """
 
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import Collection, List, Optional, Union
 
 import cli_ui as ui
 import ruamel.yaml
 
 from tsrc.cleaner import Cleaner
 from tsrc.cloner import Cloner
+from tsrc.durations import JobDurations
 from tsrc.errors import Error
-from tsrc.executor import process_items
+from tsrc.executor import (
+    FollowUpQueue,
+    OutcomeCollection,
+    Task,
+    TaskChain,
+    process_items,
+)
+from tsrc.file_system import FileSystemOperation
 from tsrc.file_system_operator import FileSystemOperator
 from tsrc.git import is_git_repository
+from tsrc.host_limits import HostLimits
+from tsrc.journal import Journal, remove_partial_clones
 from tsrc.local_manifest import LocalManifest
 from tsrc.manifest import Manifest
 from tsrc.manifest_common_data import ManifestsTypeOfData
+from tsrc.manifest_diff import (
+    ManifestDiff,
+    diff_entries,
+    diff_manifests,
+    get_repo_entries,
+)
+from tsrc.object_cache import ObjectCache
 from tsrc.remote_setter import RemoteSetter
 from tsrc.repo import Repo
+from tsrc.state_db import StateDB, read_head_state
 from tsrc.syncer import Syncer
+from tsrc.upstream_checker import UpstreamChecker
 from tsrc.workspace_config import WorkspaceConfig
 
 
@@ -45,12 +64,24 @@ class Workspace:
         local_manifest_path = root_path / ".tsrc" / "manifest"
         self.cfg_path = root_path / ".tsrc" / "config.yml"
         self.root_path = root_path
-        self.local_manifest = LocalManifest(local_manifest_path)
+        self.local_manifest = LocalManifest(
+            local_manifest_path, cache_path=root_path / ".tsrc" / "manifest.cache"
+        )
         copy_cfg_path_if_needed(root_path)
         if not self.cfg_path.exists():
             raise WorkspaceNotConfigured(root_path)
 
         self.config = WorkspaceConfig.from_file(self.cfg_path)
+        self.state_db = StateDB.for_workspace(root_path)
+        self.object_cache: Optional[ObjectCache] = None
+        if self.config.object_cache:
+            object_cache_path = Path(self.config.object_cache).expanduser()
+            self.object_cache = ObjectCache(object_cache_path)
+        self.host_limits: Optional[HostLimits] = None
+        if self.config.host_limits or self.config.adaptive_jobs:
+            self.host_limits = HostLimits(
+                self.config.host_limits or {}, adaptive=self.config.adaptive_jobs
+            )
 
         # Note: at this point the repositories on which the user wishes to
         # execute an action is unknown. This list will be set after processing
@@ -64,6 +95,8 @@ class Workspace:
         # have configured a workspace with a `backend` group, but using
         # a disjoint `front-end` group on the command line.
         self.repos: List[Repo] = []
+        # Note: only set while running `init` or `sync`, see start_journal()
+        self.journal: Optional[Journal] = None
 
     def get_manifest(self) -> Manifest:
         return self.local_manifest.get_manifest()
@@ -73,13 +106,34 @@ class Workspace:
             mtod,
         )
 
-    def update_manifest(self) -> None:
+    def update_manifest(self) -> Optional[ManifestDiff]:
+        """Update the local manifest, and return what changed in it,
+        or None if either version of the manifest could not be loaded.
+        """
         manifest_url = self.config.manifest_url
         manifest_branch = self.config.manifest_branch
         self.config.manifest_branch_0 = manifest_branch
         self.config.save_to_file(self.cfg_path)
 
+        old_sha = self.local_manifest.get_manifest_sha()
+        old_manifest = self._load_manifest_if_possible()
         self.local_manifest.update(url=manifest_url, branch=manifest_branch)
+        if old_manifest and old_sha == self.local_manifest.get_manifest_sha():
+            # Note: the manifest did not change, so there is no need
+            # to parse it again just to compare it with itself
+            return ManifestDiff()
+        new_manifest = self._load_manifest_if_possible()
+        if not old_manifest or not new_manifest:
+            return None
+        return diff_manifests(old_manifest, new_manifest)
+
+    def _load_manifest_if_possible(self) -> Optional[Manifest]:
+        # Note: errors in the manifest are reported later on,
+        # when using it to find the repos to process
+        try:
+            return self.get_manifest()
+        except Error:
+            return None
 
     def _must_match_all_group_items(
         self, manifest: Manifest, groups: List[str], found_groups: List[str]
@@ -181,19 +235,106 @@ class Workspace:
 
                 self.config.save_to_file(self.cfg_path)
 
-    def clone_missing(self, *, num_jobs: int = 1) -> None:
-        to_clone = []
-        for repo in self.repos:
-            repo_path = self.root_path / repo.dest
-            if not is_git_repository(repo_path):
-                to_clone.append(repo)
-        cloner = Cloner(
+    def get_durations(self, kind: str) -> Optional[JobDurations]:
+        """Return the durations recorded for the given kind of task,
+        or None if jobs should be processed in the manifest order.
+        """
+        return JobDurations.from_state_db(self.state_db, kind)
+
+    def start_journal(
+        self, command: str, *, resume: bool = False, ignore_group_item: bool = False
+    ) -> bool:
+        """Record the progress of the given command, repo by repo
+        (see tsrc.journal).
+
+        When `resume` is True and the previous run of the command did not
+        finish, steps it already did are skipped. Return whether the
+        previous run is resumed.
+        """
+        operations = self.get_filesystem_operations(ignore_group_item=ignore_group_item)
+        entries = get_repo_entries(self.repos, operations)
+        journal = None
+        if resume:
+            journal = Journal.resume(self.root_path, self.state_db, command, entries)
+        if journal:
+            self.journal = journal
+        else:
+            self.journal = Journal.start(
+                self.root_path, self.state_db, command, entries
+            )
+        return journal is not None
+
+    def finish_journal(self) -> None:
+        if self.journal:
+            self.journal.finish()
+            self.journal = None
+
+    def journaled(self, task: Task[Repo], step: str) -> Task[Repo]:
+        if not self.journal:
+            return task
+        return self.journal.wrap(task, step)
+
+    def process_repos(
+        self,
+        repos: List[Repo],
+        task: Task[Repo],
+        *,
+        num_jobs: int = 1,
+        durations: Optional[JobDurations] = None,
+    ) -> OutcomeCollection:
+        """Same as process_items(), writing the steps recorded in
+        the journal once the task is done, even if it failed
+        """
+        try:
+            return process_items(
+                repos,
+                task,
+                num_jobs=num_jobs,
+                durations=durations,
+                host_limits=self.host_limits,
+            )
+        finally:
+            if self.journal:
+                self.journal.flush()
+
+    def is_done(self, repo: Repo, step: str) -> bool:
+        """Whether the step was done for the repo by the run
+        of the command being resumed
+        """
+        return self.journal is not None and self.journal.is_done(repo.dest, step)
+
+    def skip_done(self, repos: List[Repo], step: str) -> List[Repo]:
+        """Return the repos for which the step still has to be done"""
+        res = [x for x in repos if not self.is_done(x, step)]
+        if len(res) < len(repos):
+            ui.info_2(
+                "Skipping", len(repos) - len(res), "repo(s) done by the previous run"
+            )
+        return res
+
+    def get_cloner(self) -> Cloner:
+        return Cloner(
             self.root_path,
             shallow=self.config.shallow_clones,
+            clone_filter=self.config.clone_filter,
+            object_cache=self.object_cache,
             remote_name=self.config.singular_remote,
         )
+
+    def get_missing_repos(self) -> List[Repo]:
+        """Return the repos that have to be cloned, after removing
+        the partial clones an interrupted run left behind
+        """
+        remove_partial_clones(self.root_path, self.state_db, self.repos)
+        return [x for x in self.repos if not is_git_repository(self.root_path / x.dest)]
+
+    def clone_missing(self, *, num_jobs: int = 1) -> None:
+        to_clone = self.get_missing_repos()
+        cloner = self.journaled(self.get_cloner(), "clone")
         ui.info_2("Cloning missing repos")
-        collection = process_items(to_clone, cloner, num_jobs=num_jobs)
+        collection = self.process_repos(
+            to_clone, cloner, num_jobs=num_jobs, durations=self.get_durations("clone")
+        )
         if collection.summary:
             ui.info_2("Cloned repos:")
             for summary in collection.summary:
@@ -208,7 +349,10 @@ class Workspace:
             return
         ui.info_2("Configuring remotes")
         remote_setter = RemoteSetter(self.root_path)
-        collection = process_items(self.repos, remote_setter, num_jobs=num_jobs)
+        repos = self.skip_done(self.repos, "remotes")
+        collection = self.process_repos(
+            repos, self.journaled(remote_setter, "remotes"), num_jobs=num_jobs
+        )
         collection.print_summary()
         if collection.errors:
             ui.error("Failed to set remotes for the following repos:")
@@ -220,49 +364,147 @@ class Workspace:
         manifest: Optional[Manifest] = None,
         ignore_group_item: bool = False,
     ) -> None:
-        repos = self.repos
-        if not manifest:
-            if ignore_group_item is True:
-                manifest = self.get_manifest_safe_mode(ManifestsTypeOfData.LOCAL)
-            else:
-                manifest = self.get_manifest()
-        operator = FileSystemOperator(self.root_path, repos)
-        operations = manifest.file_system_operations
-        known_repos = [x.dest for x in repos]
-        operations = [x for x in operations if x.get_repo() in known_repos]
+        operator = FileSystemOperator(self.root_path, self.repos)
+        operations = self.get_filesystem_operations(
+            manifest, ignore_group_item=ignore_group_item
+        )
         if operations:
             ui.info_2("Performing filesystem operations")
             # Not sure it's a good idea to have FileSystemOperations running in parallel
             collection = process_items(operations, operator, num_jobs=1)
             collection.print_summary()
             if collection.errors:
+                self.state_db.record_synced(
+                    {},
+                    forgotten=get_failed_operations_repos(
+                        self.root_path, operations, collection
+                    ),
+                )
                 ui.error("Failed to perform the following file system operations")
                 collection.print_errors()
                 raise FileSystemOperatorError
 
-    def sync(
+    def get_filesystem_operations(
+        self,
+        manifest: Optional[Manifest] = None,
+        ignore_group_item: bool = False,
+    ) -> List[FileSystemOperation]:
+        if not manifest:
+            if ignore_group_item is True:
+                manifest = self.get_manifest_safe_mode(ManifestsTypeOfData.LOCAL)
+            else:
+                manifest = self.get_manifest()
+        operations = manifest.file_system_operations
+        known_repos = [x.dest for x in self.repos]
+        return [x for x in operations if x.get_repo() in known_repos]
+
+    def save_sync_state(
+        self, *, failed: Collection[str], ignore_group_item: bool = False
+    ) -> None:
+        """Remember the manifest entry and HEAD of the repos that were
+        synchronized, and forget about the ones that failed
+        """
+        operations = self.get_filesystem_operations(ignore_group_item=ignore_group_item)
+        entries = get_repo_entries(self.repos, operations)
+        recorded = {}
+        forgotten = []
+        for repo in self.repos:
+            head = None
+            if repo.dest not in failed:
+                head, _, _ = read_head_state(self.root_path / repo.dest)
+            if head:
+                recorded[repo.dest] = (entries[repo.dest], head)
+            else:
+                forgotten.append(repo.dest)
+        self.state_db.record_synced(recorded, forgotten=forgotten)
+
+    def select_changed_repos(
         self,
         *,
         singular_remote: str = "",
-        correct_branch: bool = False,
-        force: bool = False,
+        narrow_fetch: bool = False,
+        ignore_group_item: bool = False,
         num_jobs: int = 1,
     ) -> None:
+        """Only keep the repos that changed since they were last
+        synchronized: either their entry in the manifest changed,
+        or a sync would bring new commits.
+        """
+        operations = self.get_filesystem_operations(ignore_group_item=ignore_group_item)
+        entries = get_repo_entries(self.repos, operations)
+        diff = diff_entries(self.state_db.get_synced_entries(), entries)
+        to_sync = set(diff.added) | set(diff.changed)
+        to_check = [x for x in self.repos if x.dest not in to_sync]
+        to_check = [x for x in to_check if is_git_repository(self.root_path / x.dest)]
+        syncer = self.get_syncer(
+            singular_remote=singular_remote, narrow_fetch=narrow_fetch
+        )
+        checker = UpstreamChecker(self.root_path, syncer=syncer, state_db=self.state_db)
+        ui.info_2("Looking for changed repos")
+        process_items(
+            to_check, checker, num_jobs=num_jobs, host_limits=self.host_limits
+        )
+        if diff.changed:
+            ui.info_2("Repos changed in the manifest since the last sync:")
+            for dest, keys in diff.changed.items():
+                ui.info(ui.green, "*", ui.reset, f"{dest} ({', '.join(keys)})")
+        self.repos = [x for x in self.repos if x.dest not in checker.up_to_date]
+
+    def get_syncer(
+        self,
+        *,
+        singular_remote: str = "",
+        correct_branch: bool = False,
+        force: bool = False,
+        skip_unchanged: bool = False,
+        narrow_fetch: bool = False,
+    ) -> Syncer:
         remote_name = ""
         if singular_remote:
             remote_name = singular_remote
         elif self.config.singular_remote:
             remote_name = self.config.singular_remote
-        syncer = Syncer(
+        return Syncer(
             self.root_path,
             force=force,
             remote_name=remote_name,
             correct_branch=correct_branch,
+            skip_unchanged=skip_unchanged,
+            narrow_fetch=narrow_fetch or self.config.narrow_fetch,
+            object_cache=self.object_cache,
+        )
+
+    def sync(
+        self,
+        *,
+        singular_remote: str = "",
+        correct_branch: bool = False,
+        force: bool = False,
+        skip_unchanged: bool = False,
+        narrow_fetch: bool = False,
+        ignore_group_item: bool = False,
+        num_jobs: int = 1,
+    ) -> None:
+        syncer = self.get_syncer(
+            singular_remote=singular_remote,
+            correct_branch=correct_branch,
+            force=force,
+            skip_unchanged=skip_unchanged,
+            narrow_fetch=narrow_fetch,
         )
 
-        repos = self.repos
         ui.info_2("Synchronizing repos")
-        collection = process_items(repos, syncer, num_jobs=num_jobs)
+        repos = self.skip_done(self.repos, "sync")
+        collection = self.process_repos(
+            repos,
+            self.journaled(syncer, "sync"),
+            num_jobs=num_jobs,
+            durations=self.get_durations("fetch"),
+        )
+        self.save_sync_state(
+            failed=collection.errors.keys(), ignore_group_item=ignore_group_item
+        )
+        report_skipped_fetches(syncer)
         if collection.summary:
             ui.info_2("Updated repos:")
             for summary in collection.summary:
@@ -281,6 +523,15 @@ class Workspace:
         WARNING: this may lead to data loss of files that are not under the
         version control
         """
+        cleaner = self.get_cleaner(do_clean=do_clean, do_hard_clean=do_hard_clean)
+        if cleaner:
+            repos = self.repos
+            ui.info_2("Cleaning repos:")
+            process_items(repos, cleaner, num_jobs=num_jobs)
+
+    def get_cleaner(
+        self, *, do_clean: bool = False, do_hard_clean: bool = False
+    ) -> Optional[Cleaner]:
         if do_clean is True and do_hard_clean is True:
             ui.warning(
                 "'--hard-clean' also performs '--clean', no need for extra option"
@@ -298,10 +549,120 @@ class Workspace:
             if clean_mode == 2:
                 this_hard = True
 
-            cleaner = Cleaner(self.root_path, do_hard_clean=this_hard)
-            repos = self.repos
-            ui.info_2("Cleaning repos:")
-            process_items(repos, cleaner, num_jobs=num_jobs)
+            return Cleaner(self.root_path, do_hard_clean=this_hard)
+        return None
+
+    def sync_pipelined(
+        self,
+        *,
+        singular_remote: str = "",
+        correct_branch: bool = False,
+        force: bool = False,
+        skip_unchanged: bool = False,
+        narrow_fetch: bool = False,
+        do_clean: bool = False,
+        do_hard_clean: bool = False,
+        ignore_group_item: bool = False,
+        num_jobs: int = 1,
+    ) -> None:
+        """Same as calling clone_missing(), set_remotes(), sync(), clean()
+        and perform_filesystem_operations() in a row, except each repo goes
+        through all these steps without waiting for the other repos.
+
+        Filesystem operations of a given repo are performed as soon as
+        the repo is synchronized, still in the order they were declared.
+        """
+        to_clone = [x.dest for x in self.get_missing_repos()]
+        cloner = self.get_cloner()
+        remote_setter = RemoteSetter(self.root_path)
+        syncer = self.get_syncer(
+            singular_remote=singular_remote,
+            correct_branch=correct_branch,
+            force=force,
+            skip_unchanged=skip_unchanged,
+            narrow_fetch=narrow_fetch,
+        )
+        cleaner = self.get_cleaner(do_clean=do_clean, do_hard_clean=do_hard_clean)
+
+        # Note: the repo is only synchronized once the last step is done
+        sync_steps: List[Task[Repo]] = [syncer, cleaner] if cleaner else [syncer]
+        sync_steps[-1] = self.journaled(sync_steps[-1], "sync")
+
+        def get_steps(repo: Repo) -> List[Task[Repo]]:
+            steps: List[Task[Repo]] = []
+            if repo.dest in to_clone:
+                steps.append(self.journaled(cloner, "clone"))
+            if not self.config.singular_remote and not self.is_done(repo, "remotes"):
+                steps.append(self.journaled(remote_setter, "remotes"))
+            steps.extend(sync_steps)
+            return steps
+
+        operations = self.get_filesystem_operations(ignore_group_item=ignore_group_item)
+        operator = FileSystemOperator(self.root_path, self.repos)
+        follow_ups = FollowUpQueue(operator, [(x.get_repo(), x) for x in operations])
+        chain = TaskChain(get_steps, description="Synchronizing", follow_ups=follow_ups)
+
+        ui.info_2("Synchronizing repos")
+        repos = self.skip_done(self.repos, "sync")
+        skip_follow_ups(follow_ups, [x for x in self.repos if x not in repos])
+        collection = self.process_repos(
+            repos, chain, num_jobs=num_jobs, durations=self.get_durations("sync")
+        )
+        operations_collection = OutcomeCollection(follow_ups.outcomes)
+        failed = set(collection.errors)
+        failed.update(
+            get_failed_operations_repos(
+                self.root_path, operations, operations_collection
+            )
+        )
+        self.save_sync_state(failed=failed, ignore_group_item=ignore_group_item)
+        report_skipped_fetches(syncer)
+        if collection.summary:
+            ui.info_2("Updated repos:")
+            collection.print_summary()
+        operations_collection.print_summary()
+        if collection.errors:
+            ui.error("Failed to synchronize the following repos:")
+            collection.print_errors()
+        if operations_collection.errors:
+            ui.error("Failed to perform the following file system operations")
+            operations_collection.print_errors()
+        if collection.errors:
+            raise SyncError
+        if operations_collection.errors:
+            raise FileSystemOperatorError
+
+
+def skip_follow_ups(
+    follow_ups: FollowUpQueue[FileSystemOperation], skipped: List[Repo]
+) -> None:
+    """Perform the file system operations of repos that are skipped
+    right away, instead of waiting for them to be processed
+    """
+    follow_ups.task.parallel = False
+    for repo in skipped:
+        follow_ups.item_done(repo.dest, success=True)
+
+
+def get_failed_operations_repos(
+    workspace_path: Path,
+    operations: List[FileSystemOperation],
+    collection: OutcomeCollection,
+) -> List[str]:
+    """Return the repos of the file system operations that failed"""
+    return [
+        x.get_repo()
+        for x in operations
+        if x.describe(workspace_path) in collection.errors
+    ]
+
+
+def report_skipped_fetches(syncer: Syncer) -> None:
+    if not syncer.skipped:
+        return
+    ui.info_2("Skipped fetching repos with no remote changes:")
+    for dest in sorted(syncer.skipped):
+        ui.info(ui.green, "*", ui.reset, dest)
 
 
 class SyncError(Error):
@@ -1,7 +1,7 @@
 from collections import OrderedDict
 from dataclasses import asdict, dataclass, fields
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional
 
 import ruamel.yaml
 
@@ -21,7 +21,13 @@ class WorkspaceConfig:
     repo_groups: List[str]
 
     shallow_clones: bool = False
+    clone_filter: Optional[str] = None
+    object_cache: Optional[str] = None
     clone_all_repos: bool = False
+    narrow_fetch: bool = False
+    # host -> maximum number of jobs, see tsrc.host_limits
+    host_limits: Optional[Dict[str, int]] = None
+    adaptive_jobs: bool = False
 
     singular_remote: Optional[str] = None
 
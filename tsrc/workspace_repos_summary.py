@@ -11,7 +11,7 @@ change any data, just to display it properly
 """
 
 from collections import OrderedDict
-from copy import deepcopy
+from copy import copy, deepcopy
 from typing import Dict, List, Optional, Tuple, Union, cast
 
 import cli_ui as ui
@@ -161,7 +161,49 @@ class WorkspaceReposSummary:
         if self.workspace.config.clone_all_repos is True:
             self.clone_all_repos = True
 
+    def update_statuses(
+        self,
+        statuses: Dict[str, Union[StatusOrError, BareStatusOrError]],
+    ) -> None:
+        """
+        Replace the statuses of some Repos (Workspace Repos or
+        leftovers), once 'separate_statuses' was called.
+        Used to refresh only the Repos that have changed
+        """
+        for dest, status in statuses.items():
+            if dest in self.leftover_statuses:
+                if isinstance(status, (Status, Exception)) is True:
+                    self.leftover_statuses[dest] = cast(StatusOrError, status)
+            elif dest in self.statuses:
+                self.statuses[dest] = status
+
+    def copy_for_display(self) -> "WorkspaceReposSummary":
+        """
+        'summary' and 'check_for_leftovers' consume some of the data
+        (leftovers are eliminated from the lists of Repos as they are
+        matched), so display a copy when the same summary has to be
+        displayed more than once
+        """
+        res = copy(self)
+        res.gtf = deepcopy(self.gtf)
+        res.deep_manifest = deepcopy(self.deep_manifest)
+        res.d_m_repos = deepcopy(self.d_m_repos)
+        res.f_m_repos = deepcopy(self.f_m_repos)
+        res.statuses = copy(self.statuses)
+        res.leftover_statuses = copy(self.leftover_statuses)
+        return res
+
     def calculate_fields_len(self) -> None:
+        """
+        Compute the widths of the columns from scratch, so that
+        they fit the current statuses when the summary is redrawn
+        """
+        self.max_dest = 0
+        self.max_dm_desc = 0
+        self.max_fm_desc = 0
+        self.max_desc = 0
+        self.max_a_block = 0
+
         # calculate Future Manifest Repos max desc
         if self.f_m_repos:
             self.max_fm_desc = self._calculate_max_fm_desc(self.f_m_repos)
@@ -300,8 +342,7 @@ class WorkspaceReposSummary:
             self.max_dest = self._check_max_dest(self.d_m_repos, self.f_m_repos)
 
             # calculate max DM desc
-            if self.max_dm_desc == 0:
-                self.max_dm_desc = self._calculate_max_dm_desc()
+            self.max_dm_desc = self._calculate_max_dm_desc()
 
             # calculate max FM desc
             if self.f_m_repos: